@@ -0,0 +1,284 @@
+"""
+Webhook throughput and latency benchmark.
+
+Posts TradingView payloads to /webhook/tradingview through the Flask test client against
+accounts on the simulated exchange ('sim'), in a throwaway SQLite database. Every
+scenario enters and exits one position per bot and reports, per signal action:
+
+    - HTTP latency of the webhook (p50/p95/p99) and DB queries per request
+    - end-to-end latency from job creation to position update (p50/p95/p99)
+    - throughput in signals per second and DB queries per signal
+
+Usage:
+    python benchmarks/webhook_benchmark.py --bots 1,10,50 --accounts 1,5 --concurrency 1,8 \
+        --output bench_results.json
+
+Results are written as JSON so runs of different versions can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The database must be configured before main creates the app
+DATABASE_FILE = os.path.join(tempfile.mkdtemp(prefix='easymarket-bench-'), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DATABASE_FILE}'
+
+from sqlalchemy import event  # noqa: E402
+from main import app, db, executor  # noqa: E402
+from classes.models import User, ExchangeModels, Accounts, Bots, BotFees  # noqa: E402
+from classes.bot_cache import bot_cache  # noqa: E402
+from classes.client_pool import client_pool  # noqa: E402
+from classes.fill_tracker import fill_trackers  # noqa: E402
+from classes.order_batcher import order_batchers  # noqa: E402
+from classes.simulated_exchange import SimulatedExchange  # noqa: E402
+
+SIDES = {'long': ('ENTER-LONG', 'EXIT-LONG'), 'short': ('ENTER-SHORT', 'EXIT-SHORT')}
+
+
+class QueryCounter(object):
+    """Counts SQL statements in total and for the calling thread."""
+
+    def __init__(self):
+        self.total = 0
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        with self.lock:
+            self.total += 1
+        self.local.count = getattr(self.local, 'count', 0) + 1
+
+    def thread_count(self):
+        return getattr(self.local, 'count', 0)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(pct / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'mean': sum(values) / len(values) if values else None,
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values) if values else None,
+    }
+
+
+def reset_process_state():
+    """
+    Forget what the previous scenario left in the process-wide caches. Ids restart with the
+    recreated schema and the bot config version counter restarts at 0, so nothing there
+    tells the caches that bot 1 or account 1 is now a different row.
+    """
+    bot_cache.invalidate()
+    for account_id in list(client_pool.clients):
+        client_pool.invalidate(account_id)
+    # Evicted accounts are no longer pooled but may still have a tracker or batcher
+    for account_id in list(fill_trackers.trackers):
+        fill_trackers.release(account_id)
+    for account_id in list(order_batchers.batchers):
+        order_batchers.release(account_id)
+    with SimulatedExchange.accounts_lock:
+        SimulatedExchange.accounts.clear()
+
+
+def sim_orders():
+    """Every order placed on the simulated exchange, by id."""
+    with SimulatedExchange.accounts_lock:
+        accounts = list(SimulatedExchange.accounts.values())
+    orders = {}
+    for account in accounts:
+        with account.lock:
+            orders.update(account.orders)
+    return orders
+
+
+def setup_database(bot_count, account_count, order_type, latency):
+    """Recreate the schema with `bot_count` bots spread over `account_count` sim accounts."""
+    db.drop_all()
+    db.create_all()
+    user = User(email='bench@example.com', active=True)
+    user.set_password('bench')
+    exchange = ExchangeModels(name='Simulated Exchange', short='sim')
+    db.session.add_all([user, exchange])
+    db.session.flush()
+
+    accounts = []
+    for i in range(account_count):
+        # A large balance keeps sizing valid, a zero spread lets limit orders at the last price fill
+        options = {'latency': latency, 'balance': 1e12, 'spread': 0.0}
+        account = Accounts(name=f'bench-{i}', exchange_id=exchange.id, api_key=f'bench-key-{i}',
+                           api_secret='bench-secret', password='', testnet=False, options=options, user_id=user.id)
+        accounts.append(account)
+    db.session.add_all(accounts)
+    db.session.flush()
+
+    bots = []
+    for i in range(bot_count):
+        account = accounts[i % account_count]
+        bots.append(Bots(name=f'bench-bot-{i}', enabled=True, order_type=order_type, base_order_size=0.001,
+                         leverage=1, exchange='sim', symbol='BTC/USDT', stop_loss=0.0, take_profit=0.0,
+                         description='', time_interval='1m', type=order_type, exchange_id=exchange.id,
+                         account_id=account.id, user_id=user.id))
+    db.session.add_all(bots)
+    db.session.flush()
+    db.session.add_all([BotFees(bot_id=bot.id, maker_fee=0.0002, taker_fee=0.0004) for bot in bots])
+    db.session.commit()
+    return [bot.id for bot in bots]
+
+
+def post_signal(counter, message):
+    client = app.test_client()
+    before = counter.thread_count()
+    started = time.perf_counter()
+    response = client.post('/webhook/tradingview', data=json.dumps({'message': message}),
+                           content_type='application/json')
+    elapsed = time.perf_counter() - started
+    return response.status_code, response.get_json(), elapsed, counter.thread_count() - before
+
+
+def wait_for_jobs(job_ids, timeout):
+    deadline = time.time() + timeout
+    jobs = [executor.get(job_id) for job_id in job_ids]
+    while time.time() < deadline:
+        if all(job is None or job.finished for job in jobs):
+            break
+        time.sleep(0.01)
+    return jobs
+
+
+def run_phase(counter, action, bot_ids, concurrency, timeout):
+    """Post `action` for every bot and wait until all jobs finished."""
+    queries_before = counter.total
+    orders_before = set(sim_orders())
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        responses = list(pool.map(lambda bot_id: post_signal(counter, f'{action}_{bot_id}'), bot_ids))
+    accepted = [r for r in responses if r[0] == 202]
+    jobs = wait_for_jobs([r[1]['job_id'] for r in accepted], timeout)
+    wall_time = time.perf_counter() - started
+
+    finished = [job for job in jobs if job is not None and job.finished]
+    done = [job for job in finished if job.status == 'done']
+    errors = sorted({job.error for job in finished if job.status == 'failed'})
+    order_types = sorted({order['type'] for order_id, order in sim_orders().items() if order_id not in orders_before})
+    return {
+        'action': action,
+        'signals': len(bot_ids),
+        'accepted': len(accepted),
+        'completed': len(done),
+        'failed': len(finished) - len(done),
+        'timed_out': len(jobs) - len(finished),
+        'errors': errors[:5],
+        'order_types': order_types,
+        'wall_time': wall_time,
+        'throughput': len(done) / wall_time if wall_time else None,
+        'http_latency': summarize([r[2] for r in responses]),
+        'end_to_end_latency': summarize([job.finished_at - job.created_at for job in done]),
+        'http_queries_per_request': summarize([r[3] for r in responses]),
+        'queries_per_signal': (counter.total - queries_before) / len(bot_ids) if bot_ids else None,
+    }
+
+
+def run_scenario(counter, side, order_type, bot_count, account_count, concurrency, latency, timeout):
+    with app.app_context():
+        bot_ids = setup_database(bot_count, account_count, order_type, latency)
+        reset_process_state()
+    enter, exit_ = SIDES[side]
+    phases = [run_phase(counter, enter, bot_ids, concurrency, timeout),
+              run_phase(counter, exit_, bot_ids, concurrency, timeout)]
+    for phase in phases:
+        # A phase measured with other orders than the scenario's would be reported under the wrong type
+        assert phase['order_types'] in ([], [order_type]), \
+            f"{phase['action']} of a {order_type} scenario placed {phase['order_types']} orders"
+    return {
+        'side': side,
+        'order_type': order_type,
+        'bots': bot_count,
+        'accounts': account_count,
+        'concurrency': concurrency,
+        'latency': latency,
+        'phases': phases,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the TradingView webhook against the simulated exchange.')
+    parser.add_argument('--bots', type=int_list, default=[1, 10, 50])
+    parser.add_argument('--accounts', type=int_list, default=[1, 5])
+    parser.add_argument('--concurrency', type=int_list, default=[1, 8])
+    parser.add_argument('--sides', default='long,short')
+    parser.add_argument('--order-types', default='market,limit')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated exchange latency per request (s)')
+    parser.add_argument('--timeout', type=float, default=120.0, help='seconds to wait for the jobs of a phase')
+    parser.add_argument('--output', default='bench_results.json')
+    args = parser.parse_args()
+
+    counter = QueryCounter()
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', counter)
+
+    results = []
+    for side in args.sides.split(','):
+        for order_type in args.order_types.split(','):
+            for bot_count in args.bots:
+                for account_count in args.accounts:
+                    if account_count > bot_count:
+                        continue
+                    for concurrency in args.concurrency:
+                        result = run_scenario(counter, side, order_type, bot_count, account_count, concurrency,
+                                              args.latency, args.timeout)
+                        results.append(result)
+                        for phase in result['phases']:
+                            print(f"{phase['action']:<12} {order_type:<7} bots={bot_count:<4} "
+                                  f"accounts={account_count:<3} concurrency={concurrency:<3} "
+                                  f"done={phase['completed']}/{phase['signals']} "
+                                  f"http_p95={(phase['http_latency']['p95'] or 0) * 1000:.1f}ms "
+                                  f"e2e_p95={(phase['end_to_end_latency']['p95'] or 0) * 1000:.1f}ms "
+                                  f"throughput={phase['throughput'] or 0:.1f}/s")
+
+    report = {
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'arguments': vars(args),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    executor.shutdown(wait=False)
+
+
+if __name__ == '__main__':
+    main()
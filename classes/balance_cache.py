@@ -0,0 +1,73 @@
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BalanceCache(object):
+    """
+    Short-lived per-account balance snapshots.
+
+    One fetch_balance response (total, free and used for every currency) serves every
+    reader for `ttl` seconds. Concurrent readers of an account share one in-flight
+    request. invalidate() drops the snapshot after orders and fills. A fetch that was
+    already running when the account was invalidated is neither cached nor joined by
+    later readers, they start a new one.
+    """
+
+    def __init__(self, ttl=5.0):
+        self.ttl = ttl
+        self.entries = {}
+        self.inflight = {}
+        self.generations = {}
+        self.lock = threading.Lock()
+
+    def get(self, account_id, fetcher):
+        """Return the balance snapshot of the account, calling `fetcher()` when there is no fresh one."""
+        entry = self.entries.get(account_id)
+        if entry is not None and time.time() - entry[1] <= self.ttl:
+            return entry[0]
+
+        with self.lock:
+            future = self.inflight.get(account_id)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.inflight[account_id] = future
+                generation = self.generations.get(account_id, 0)
+        if not owner:
+            return future.result()
+
+        try:
+            balance = fetcher()
+        except Exception as e:
+            with self.lock:
+                self.release(account_id, future)
+            future.set_exception(e)
+            raise
+        with self.lock:
+            if self.generations.get(account_id, 0) == generation:
+                self.entries[account_id] = (balance, time.time())
+            self.release(account_id, future)
+        future.set_result(balance)
+        return balance
+
+    def release(self, account_id, future):
+        # invalidate() may already have replaced the fetch, never drop a newer one
+        if self.inflight.get(account_id) is future:
+            del self.inflight[account_id]
+
+    def invalidate(self, account_id):
+        """Drop the account's snapshot, readers arriving after this never join a fetch started before it."""
+        with self.lock:
+            self.generations[account_id] = self.generations.get(account_id, 0) + 1
+            self.entries.pop(account_id, None)
+            self.inflight.pop(account_id, None)
+
+
+# Create a global variable for the balance cache object
+balance_cache = BalanceCache()
+
+
+# Define a function to configure the balance cache from the Flask app config
+def init_balance_cache(app):
+    balance_cache.ttl = app.config.get('BALANCE_CACHE_TTL', balance_cache.ttl)
@@ -0,0 +1,197 @@
+import math
+import threading
+import time
+from array import array
+
+from sqlalchemy.orm import joinedload
+
+from database import db, unit_of_work
+from classes.models import Accounts, BalanceHistory
+from classes.bot_snapshot import AccountSnapshot
+from classes.balance_refresh import balance_refresher, save_balances
+from classes.log import get_logger
+
+logger = get_logger('balance_history')
+
+# Resolution name -> bucket length in seconds, every sample is written to each resolution
+RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+
+# Buckets per chunk row: 6 hours of minutes, 15 days of hours, 360 days of days
+CHUNK_SLOTS = 360
+
+# Seconds chunks of each resolution are kept after they end, None keeps them forever
+RETENTION = {'1m': 7 * 86400, '1h': 400 * 86400, '1d': None}
+
+# Seconds between two retention sweeps
+RETENTION_SWEEP_INTERVAL = 3600
+
+
+def chunk_position(resolution, timestamp):
+    """Return the chunk_start and the slot of the bucket holding `timestamp` (epoch seconds)."""
+    seconds = RESOLUTIONS[resolution]
+    bucket = int(timestamp) // seconds
+    return bucket // CHUNK_SLOTS * CHUNK_SLOTS * seconds, bucket % CHUNK_SLOTS
+
+
+def empty_values():
+    return array('d', [math.nan]) * CHUNK_SLOTS
+
+
+def unpack(data):
+    values = array('d')
+    values.frombytes(data)
+    return values
+
+
+def record_samples(samples, timestamp=None):
+    """
+    Write balance samples to every resolution, in the caller's transaction.
+
+    A sample overwrites its bucket, so the coarser resolutions keep the last balance of
+    each hour and day. `samples` are (account_id, user_id, balance_total, balance_usdt).
+    """
+    timestamp = timestamp or time.time()
+    samples = [sample for sample in samples if sample[2] is not None]
+    if not samples:
+        return
+    account_ids = [sample[0] for sample in samples]
+    for resolution in RESOLUTIONS:
+        chunk_start, slot = chunk_position(resolution, timestamp)
+        chunks = {chunk.account_id: chunk for chunk in BalanceHistory.query.filter(
+            BalanceHistory.resolution == resolution, BalanceHistory.chunk_start == chunk_start,
+            BalanceHistory.account_id.in_(account_ids))}
+        for account_id, user_id, balance_total, balance_usdt in samples:
+            chunk = chunks.get(account_id)
+            if chunk is None:
+                chunk = BalanceHistory(account_id=account_id, user_id=user_id, resolution=resolution,
+                                       chunk_start=chunk_start)
+                totals, usdts = empty_values(), empty_values()
+                db.session.add(chunk)
+            else:
+                totals, usdts = unpack(chunk.balance_total), unpack(chunk.balance_usdt)
+            totals[slot] = balance_total
+            usdts[slot] = balance_usdt if balance_usdt is not None else math.nan
+            chunk.balance_total = totals.tobytes()
+            chunk.balance_usdt = usdts.tobytes()
+
+
+def get_equity_curve(user_id, resolution='1h', points=CHUNK_SLOTS, end=None):
+    """
+    Return the summed balances of the user's accounts over the last `points` buckets.
+
+    An account without a sample in a bucket counts with its previous balance, buckets
+    before the first sample of any account are left out.
+
+    Returns:
+        dict: resolution and the total and usdt series as [timestamp in ms, value] pairs.
+    """
+    seconds = RESOLUTIONS[resolution]
+    end = int(end or time.time()) // seconds * seconds
+    start = end - (points - 1) * seconds
+    chunks = BalanceHistory.query.filter(
+        BalanceHistory.user_id == user_id, BalanceHistory.resolution == resolution,
+        BalanceHistory.chunk_start > start - CHUNK_SLOTS * seconds, BalanceHistory.chunk_start <= end) \
+        .order_by(BalanceHistory.account_id, BalanceHistory.chunk_start).all()
+
+    accounts = {}
+    for chunk in chunks:
+        series = accounts.setdefault(chunk.account_id, {})
+        for slot, (total, usdt) in enumerate(zip(unpack(chunk.balance_total), unpack(chunk.balance_usdt))):
+            bucket = chunk.chunk_start + slot * seconds
+            if start <= bucket <= end and not math.isnan(total):
+                series[bucket] = (total, usdt)
+
+    last = {}
+    total_series, usdt_series = [], []
+    for bucket in range(start, end + 1, seconds):
+        for account_id, series in accounts.items():
+            if bucket in series:
+                last[account_id] = series[bucket]
+        if not last:
+            continue
+        total_series.append([bucket * 1000, sum(total for total, _ in last.values())])
+        usdt_series.append([bucket * 1000, sum(usdt for _, usdt in last.values() if not math.isnan(usdt))])
+    return {'resolution': resolution, 'total': total_series, 'usdt': usdt_series}
+
+
+def sweep_balance_history(now=None):
+    """Delete the chunks past the retention of their resolution. The caller commits."""
+    now = now or time.time()
+    deleted = 0
+    for resolution, retention in RETENTION.items():
+        if retention is None:
+            continue
+        cutoff = now - retention - CHUNK_SLOTS * RESOLUTIONS[resolution]
+        deleted += BalanceHistory.query.filter(BalanceHistory.resolution == resolution,
+                                               BalanceHistory.chunk_start < cutoff).delete(synchronize_session=False)
+    return deleted
+
+
+class BalanceSync(object):
+    """
+    Scheduler snapshotting the balances of every account every `interval` seconds.
+
+    Each run refreshes the balances with the parallel balance refresher, then updates
+    the accounts and appends the samples to the balance history in one transaction. Web
+    workers never sync, the loop runs in its own process with `manage.py sync_balances`
+    so the history has a single writer however many workers serve requests.
+    """
+
+    def __init__(self, interval=60.0):
+        self.app = None
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.swept_at = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('BALANCE_SYNC_INTERVAL', self.interval)
+
+    def run(self):
+        """Sync until stop() is called, in the calling thread."""
+        while not self.stopped.is_set():
+            started = time.monotonic()
+            try:
+                samples = self.sync()
+                logger.info("Synced the balances of %s accounts", samples)
+                if time.time() - self.swept_at >= RETENTION_SWEEP_INTERVAL:
+                    self.sweep()
+            except Exception as e:
+                logger.error("Error syncing account balances: %s", e)
+            self.stopped.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def sync(self):
+        """Snapshot the balance of every account once. Returns the number of samples written."""
+        timestamp = time.time()
+        with self.app.app_context():
+            accounts = [AccountSnapshot.from_model(account) for account in
+                        Accounts.query.options(joinedload(Accounts.exchangemodels))]
+        if not accounts:
+            return 0
+        users = {account.id: account.user_id for account in accounts}
+        results = [result for result in balance_refresher.refresh(accounts) if result['error'] is None]
+        with self.app.app_context(), unit_of_work():
+            save_balances(results)
+            record_samples([(result['account_id'], users[result['account_id']], result['total_balance'],
+                             result['usdt_balance']) for result in results], timestamp)
+        return len(results)
+
+    def sweep(self):
+        self.swept_at = time.time()
+        with self.app.app_context(), unit_of_work():
+            deleted = sweep_balance_history()
+        if deleted:
+            logger.info("Deleted %s balance history chunks past their retention", deleted)
+        return deleted
+
+    def stop(self):
+        self.stopped.set()
+
+
+# Create a global variable for the balance sync scheduler
+balance_sync = BalanceSync()
+
+
+# Define a function to initialize the balance sync scheduler with the Flask app
+def init_balance_sync(app):
+    balance_sync.init_app(app)
@@ -0,0 +1,108 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from database import db, commit
+from classes.client_pool import client_pool
+from classes.models import Accounts
+from classes.log import get_logger
+
+logger = get_logger('balance_refresh')
+
+
+class BalanceRefresher(object):
+    """
+    Refreshes the balances of several accounts in parallel on a bounded thread pool.
+
+    Results are yielded as each account completes. An account that has been running for
+    more than `timeout` seconds is reported as timed out, so one slow exchange never holds
+    back the others. Its request keeps its worker until ccxt gives up on it.
+    """
+
+    def __init__(self, max_workers=8, timeout=15.0):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.pool = None
+
+    def init_app(self, app):
+        self.max_workers = app.config.get('BALANCE_REFRESH_WORKERS', self.max_workers)
+        self.timeout = app.config.get('BALANCE_REFRESH_TIMEOUT', self.timeout)
+
+    def get_pool(self):
+        # Created lazily so forked web workers never inherit a pool without threads
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='balance')
+            return self.pool
+
+    def refresh(self, accounts):
+        """
+        Fetch the balance of every account, `accounts` are AccountSnapshots or detached rows.
+
+        Yields:
+            dict: account_id, total_balance, usdt_balance and error, in completion order.
+        """
+        started = {}
+        pending = {}
+        for account in accounts:
+            future = self.get_pool().submit(self.fetch, account, started)
+            pending[future] = account.id
+
+        while pending:
+            now = time.monotonic()
+            # Accounts still waiting for a worker have not started their timeout yet
+            deadlines = [started[account_id] + self.timeout for account_id in pending.values()
+                         if account_id in started]
+            wait_for = max(0.0, min(deadlines) - now) if deadlines else self.timeout
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+            for future in done:
+                account_id = pending.pop(future)
+                try:
+                    total_balance, usdt_balance = future.result()
+                except Exception as e:
+                    logger.warning("Error refreshing the balance of account %s: %s", account_id, e)
+                    yield {'account_id': account_id, 'total_balance': None, 'usdt_balance': None, 'error': str(e)}
+                else:
+                    yield {'account_id': account_id, 'total_balance': total_balance, 'usdt_balance': usdt_balance,
+                           'error': None}
+            now = time.monotonic()
+            for future, account_id in list(pending.items()):
+                if account_id in started and now - started[account_id] >= self.timeout:
+                    del pending[future]
+                    future.cancel()
+                    logger.warning("Balance refresh of account %s timed out after %ss", account_id, self.timeout)
+                    yield {'account_id': account_id, 'total_balance': None, 'usdt_balance': None,
+                           'error': f'Timed out after {self.timeout:g}s'}
+
+    def fetch(self, account, started):
+        started[account.id] = time.monotonic()
+        exchange_client = client_pool.get(account)
+        # The button asks for the current balance, not the cached snapshot
+        exchange_client.invalidate_balance()
+        return exchange_client.get_total_balance(), exchange_client.get_usdt_balance()
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+def save_balances(results):
+    """Write the refreshed balances of several accounts in one transaction, failed accounts are skipped."""
+    mappings = [{'id': result['account_id'], 'balance_total': result['total_balance'],
+                 'balance_usdt': result['usdt_balance']} for result in results if result['error'] is None]
+    if mappings:
+        db.session.bulk_update_mappings(Accounts, mappings)
+        commit()
+    return len(mappings)
+
+
+# Create a global variable for the balance refresher
+balance_refresher = BalanceRefresher()
+
+
+# Define a function to initialize the balance refresher with the Flask app
+def init_balance_refresh(app):
+    balance_refresher.init_app(app)
@@ -0,0 +1,117 @@
+import threading
+import time
+
+from sqlalchemy import select, update
+
+from database import db
+from classes.models import CacheVersions
+from classes.log import get_logger
+
+logger = get_logger('bot_cache')
+
+# Name of the cache_versions row counting bot and account changes
+BOT_CONFIG_VERSION = 'bot_config'
+
+
+class BotConfigCache(object):
+    """
+    Process-wide cache of BotSnapshot execution configs, keyed by bot id.
+
+    The routes that change bots or accounts call invalidate(), which drops the local
+    entries and bumps a version counter in the cache_versions table. Other workers read
+    the counter at most every `check_interval` seconds and clear their cache when it moved,
+    so between checks a cached webhook read does not touch the database.
+    """
+
+    def __init__(self, check_interval=1.0):
+        self.app = None
+        self.check_interval = check_interval
+        self.entries = {}
+        self.version = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.check_interval = app.config.get('BOT_CACHE_CHECK_INTERVAL', self.check_interval)
+
+    def get(self, bot_id, loader):
+        """Return the cached snapshot of `bot_id`, calling `loader(bot_id)` on a miss. Missing bots are not cached."""
+        bot_id = int(bot_id)
+        self.check_version()
+        snapshot = self.entries.get(bot_id)
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+        self.misses += 1
+        version = self.version
+        snapshot = loader(bot_id)
+        if snapshot is not None:
+            with self.lock:
+                # An invalidation during the load made this snapshot stale, serve it but do not keep it
+                if self.version == version:
+                    self.entries[bot_id] = snapshot
+        return snapshot
+
+    def check_version(self):
+        now = time.monotonic()
+        if now - self.checked_at < self.check_interval:
+            return
+        self.checked_at = now
+        try:
+            version = self.read_version()
+        except Exception as e:
+            # Keep serving the cache, the next check retries
+            logger.warning("Error reading the bot config version: %s", e)
+            return
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+
+    def read_version(self):
+        with self.app.app_context(), db.engine.connect() as connection:
+            version = connection.execute(select(CacheVersions.version).where(
+                CacheVersions.name == BOT_CONFIG_VERSION)).scalar()
+        return version or 0
+
+    def bump_version(self):
+        with self.app.app_context(), db.engine.begin() as connection:
+            updated = connection.execute(update(CacheVersions).where(CacheVersions.name == BOT_CONFIG_VERSION)
+                                         .values(version=CacheVersions.version + 1)).rowcount
+            if not updated:
+                connection.execute(CacheVersions.__table__.insert().values(name=BOT_CONFIG_VERSION, version=1))
+
+    def invalidate(self, bot_id=None, account_id=None):
+        """
+        Drop the snapshot of a bot, of every bot of an account, or everything when called without
+        arguments, and tell the other workers. Call it after the change is committed.
+        """
+        with self.lock:
+            if bot_id is None and account_id is None:
+                self.entries.clear()
+            else:
+                for key, snapshot in list(self.entries.items()):
+                    if key == bot_id or snapshot.account_id == account_id:
+                        del self.entries[key]
+            # Snapshots loading right now were read before the change
+            self.version = None
+        try:
+            self.bump_version()
+        except Exception as e:
+            logger.error("Error bumping the bot config version, other workers keep stale bots: %s", e)
+        self.checked_at = 0.0
+
+    def metrics(self):
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+
+# Create a global variable for the bot config cache
+bot_cache = BotConfigCache()
+
+
+# Define a function to initialize the bot config cache with the Flask app
+def init_bot_cache(app):
+    bot_cache.init_app(app)
@@ -0,0 +1,75 @@
+from typing import NamedTuple, Optional
+
+
+class ExchangeSnapshot(NamedTuple):
+    id: int
+    name: str
+    short: str
+
+    @classmethod
+    def from_model(cls, exchange):
+        return cls(id=exchange.id, name=exchange.name, short=exchange.short)
+
+
+class AccountSnapshot(NamedTuple):
+    """Immutable copy of an Accounts row, accepted everywhere an account is, e.g. by the client pool."""
+    id: int
+    name: str
+    exchange_id: int
+    api_key: str
+    api_secret: str
+    password: Optional[str]
+    options: Optional[dict]
+    user_id: int
+    testnet: bool
+    exchangemodels: ExchangeSnapshot
+
+    @classmethod
+    def from_model(cls, account):
+        return cls(id=account.id, name=account.name, exchange_id=account.exchange_id, api_key=account.api_key,
+                   api_secret=account.api_secret, password=account.password, options=dict(account.options or {}),
+                   user_id=account.user_id, testnet=bool(account.testnet),
+                   exchangemodels=ExchangeSnapshot.from_model(account.exchangemodels))
+
+
+class FeesSnapshot(NamedTuple):
+    maker_fee: Optional[float]
+    taker_fee: Optional[float]
+
+
+class BotSnapshot(NamedTuple):
+    """
+    Immutable execution context of a bot: the bot, its account, exchange and fees.
+
+    Attribute names follow the models, so the order functions work the same with a
+    snapshot or a Bots row. Snapshots hold no session and can be shared between threads.
+    """
+    id: int
+    name: str
+    enabled: bool
+    order_type: str
+    base_order_size: float
+    leverage: Optional[float]
+    exchange: str
+    symbol: str
+    stop_loss: Optional[float]
+    take_profit: Optional[float]
+    time_interval: str
+    type: Optional[str]
+    signal_group: Optional[str]
+    exchange_id: int
+    account_id: int
+    user_id: int
+    accounts: AccountSnapshot
+    botfees: Optional[FeesSnapshot]
+
+    @classmethod
+    def from_model(cls, bot):
+        fees = bot.botfees[0] if bot.botfees else None
+        return cls(id=bot.id, name=bot.name, enabled=bot.enabled, order_type=bot.order_type,
+                   base_order_size=bot.base_order_size, leverage=bot.leverage, exchange=bot.exchange,
+                   symbol=bot.symbol, stop_loss=bot.stop_loss, take_profit=bot.take_profit,
+                   time_interval=bot.time_interval, type=bot.type, signal_group=bot.signal_group,
+                   exchange_id=bot.exchange_id, account_id=bot.account_id, user_id=bot.user_id,
+                   accounts=AccountSnapshot.from_model(bot.accounts),
+                   botfees=FeesSnapshot(fees.maker_fee, fees.taker_fee) if fees else None)
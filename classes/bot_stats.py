@@ -0,0 +1,212 @@
+from datetime import datetime
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from classes.models import BotDailyStats, Positions
+from classes.log import get_logger
+
+logger = get_logger('bot_stats')
+
+# Running columns carried from one day of a bot to the next
+RUNNING_COLUMNS = ('total_trades', 'total_wins', 'total_pnl', 'total_fees', 'total_gross_profit',
+                   'total_gross_loss', 'peak_pnl', 'max_drawdown')
+
+# Dialects whose INSERT can skip a row already inserted by a concurrent close
+UPSERT_INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+# Attempts of a rebuild that collides with a day inserted by a concurrent close
+REBUILD_ATTEMPTS = 3
+
+
+def position_pnl(position):
+    """Realized PnL of a closed position in the quote currency, net of fees."""
+    if position.position_type == 'long':
+        pnl = (position.exit_price - position.entry_price) * position.order_quantity
+    else:
+        pnl = (position.entry_price - position.exit_price) * position.order_quantity
+    return pnl - (position.fees or 0.0)
+
+
+def new_day(bot_id, user_id, day, previous=None):
+    """Return an empty stats row for `day`, starting from the running values of `previous`."""
+    stats = BotDailyStats(bot_id=bot_id, user_id=user_id, day=day, trades=0, wins=0, losses=0, realized_pnl=0.0,
+                          fees=0.0, gross_profit=0.0, gross_loss=0.0)
+    for column in RUNNING_COLUMNS:
+        setattr(stats, column, getattr(previous, column) if previous is not None else 0)
+    return stats
+
+
+def trade_increments(pnl, fees):
+    """Amounts one closed position adds to the day and running columns of a stats row."""
+    win = pnl > 0
+    return {
+        'trades': 1, 'wins': 1 if win else 0, 'losses': 0 if win else 1, 'realized_pnl': pnl, 'fees': fees,
+        'gross_profit': pnl if win else 0.0, 'gross_loss': 0.0 if win else -pnl,
+        'total_trades': 1, 'total_wins': 1 if win else 0, 'total_pnl': pnl, 'total_fees': fees,
+        'total_gross_profit': pnl if win else 0.0, 'total_gross_loss': 0.0 if win else -pnl,
+    }
+
+
+def apply_trade(stats, pnl, fees):
+    """Add one closed position to a stats row, updating the day and the running values."""
+    for column, amount in trade_increments(pnl, fees).items():
+        setattr(stats, column, getattr(stats, column) + amount)
+    # Drawdown from the highest cumulative PnL reached so far
+    stats.peak_pnl = max(stats.peak_pnl, stats.total_pnl)
+    stats.max_drawdown = max(stats.max_drawdown, stats.peak_pnl - stats.total_pnl)
+
+
+def add_trade(bot_id, day, pnl, fees):
+    """
+    Add one closed position to the bot's stats row of `day` with a single UPDATE, so
+    concurrent closes of the same day never overwrite each other's increments.
+
+    Returns:
+        bool: False when the bot has no row for the day yet.
+    """
+    values = {getattr(BotDailyStats, column): getattr(BotDailyStats, column) + amount
+              for column, amount in trade_increments(pnl, fees).items()}
+    # The right-hand sides read the values before the update, like apply_trade
+    total_pnl = BotDailyStats.total_pnl + pnl
+    peak_pnl = case((BotDailyStats.peak_pnl > total_pnl, BotDailyStats.peak_pnl), else_=total_pnl)
+    values[BotDailyStats.peak_pnl] = peak_pnl
+    values[BotDailyStats.max_drawdown] = case((BotDailyStats.max_drawdown > peak_pnl - total_pnl,
+                                               BotDailyStats.max_drawdown), else_=peak_pnl - total_pnl)
+    updated = BotDailyStats.query.filter_by(bot_id=bot_id, day=day).update(values, synchronize_session='fetch')
+    return updated > 0
+
+
+def insert_day(stats):
+    """Insert a new stats row, doing nothing when a concurrent close inserted the same day first."""
+    values = {column.name: getattr(stats, column.name) for column in BotDailyStats.__table__.columns
+              if column.name != 'id'}
+    insert = UPSERT_INSERTS.get(db.engine.dialect.name)
+    if insert is None:
+        db.session.execute(BotDailyStats.__table__.insert().values(**values))
+        return
+    db.session.execute(insert(BotDailyStats.__table__).values(**values)
+                       .on_conflict_do_nothing(index_elements=['bot_id', 'day']))
+
+
+def record_closed_position(position):
+    """
+    Add a position being closed to the daily stats of its bot, in the caller's transaction.
+
+    Positions normally close in time order and only touch the bot's latest day, which
+    is updated in place. A new day starts from the running values of the previous one,
+    read with a row lock. A close dated before the latest day changes the running values
+    of every later day, the bot's stats are rebuilt from its positions instead.
+    """
+    day = (position.exit_time or datetime.now()).date()
+    pnl, fees = position_pnl(position), position.fees or 0.0
+    if not add_trade(position.bot_id, day, pnl, fees):
+        previous = BotDailyStats.query.filter(BotDailyStats.bot_id == position.bot_id, BotDailyStats.day < day) \
+            .order_by(BotDailyStats.day.desc()).with_for_update().first()
+        insert_day(new_day(position.bot_id, position.user_id, day, previous))
+        add_trade(position.bot_id, day, pnl, fees)
+
+    # Checked after the update, a later day inserted meanwhile by another close is seen too
+    later = db.session.query(BotDailyStats.id).filter(BotDailyStats.bot_id == position.bot_id,
+                                                      BotDailyStats.day > day).first()
+    if later is not None:
+        logger.info("Position %s closed before the latest stats day of bot %s, rebuilding its stats",
+                    position.id, position.bot_id)
+        rebuild_bot_stats_with_retry(position.bot_id)
+
+
+def rebuild_bot_stats_with_retry(bot_id):
+    """Rebuild the stats of a bot in a savepoint, again when a concurrent close inserts one of its days."""
+    for attempt in range(1, REBUILD_ATTEMPTS + 1):
+        try:
+            with db.session.begin_nested():
+                return rebuild_bot_stats(bot_id)
+        except IntegrityError as e:
+            if attempt == REBUILD_ATTEMPTS:
+                raise
+            logger.warning("Stats rebuild of bot %s collided with a concurrent close, retrying: %s", bot_id, e)
+
+
+def rebuild_bot_stats(bot_id=None):
+    """
+    Recompute the daily stats of one bot, or of every bot, from the closed positions.
+
+    Returns:
+        int: The number of stats rows written. The caller commits.
+    """
+    stats_query = BotDailyStats.query
+    positions_query = Positions.query.filter(Positions.status == 'closed', Positions.exit_price.isnot(None))
+    if bot_id is not None:
+        stats_query = stats_query.filter_by(bot_id=bot_id)
+        positions_query = positions_query.filter_by(bot_id=bot_id)
+    # Rows already loaded by the session, e.g. by record_closed_position, leave it with the delete
+    stats_query.delete(synchronize_session='evaluate')
+
+    rows = {}
+    latest = {}
+    positions = positions_query.order_by(Positions.bot_id, Positions.exit_time, Positions.id).yield_per(1000)
+    for position in positions:
+        day = (position.exit_time or position.entry_time).date()
+        stats = latest.get(position.bot_id)
+        if stats is None or stats.day != day:
+            stats = new_day(position.bot_id, position.user_id, day, stats)
+            latest[position.bot_id] = stats
+            rows[(position.bot_id, day)] = stats
+        apply_trade(stats, position_pnl(position), position.fees or 0.0)
+
+    db.session.add_all(rows.values())
+    db.session.flush()
+    return len(rows)
+
+
+def get_bot_stats(user_id):
+    """
+    Return the running stats of each of the user's bots, read from the bot's latest stats row.
+
+    Returns:
+        dict: bot id -> dict of total_trades, total_wins, win_rate, total_pnl, total_fees,
+        profit_factor and max_drawdown.
+    """
+    latest_days = db.session.query(BotDailyStats.bot_id, func.max(BotDailyStats.day).label('day')) \
+        .filter(BotDailyStats.user_id == user_id).group_by(BotDailyStats.bot_id).subquery()
+    rows = BotDailyStats.query.join(latest_days, (BotDailyStats.bot_id == latest_days.c.bot_id) &
+                                    (BotDailyStats.day == latest_days.c.day)).all()
+    return {row.bot_id: stats_to_dict(row) for row in rows}
+
+
+def get_user_stats(user_id):
+    """Combine the running stats of all of the user's bots. max_drawdown is the largest of any bot."""
+    bots = get_bot_stats(user_id).values()
+    trades = sum(bot['total_trades'] for bot in bots)
+    wins = sum(bot['total_wins'] for bot in bots)
+    gross_profit = sum(bot['total_gross_profit'] for bot in bots)
+    gross_loss = sum(bot['total_gross_loss'] for bot in bots)
+    return {
+        'bots': len(bots),
+        'total_trades': trades,
+        'total_wins': wins,
+        'win_rate': wins / trades if trades else None,
+        'total_pnl': sum(bot['total_pnl'] for bot in bots),
+        'total_fees': sum(bot['total_fees'] for bot in bots),
+        'total_gross_profit': gross_profit,
+        'total_gross_loss': gross_loss,
+        'profit_factor': gross_profit / gross_loss if gross_loss else None,
+        'max_drawdown': max((bot['max_drawdown'] for bot in bots), default=0.0),
+    }
+
+
+def stats_to_dict(stats):
+    return {
+        'last_day': stats.day.isoformat(),
+        'total_trades': stats.total_trades,
+        'total_wins': stats.total_wins,
+        'win_rate': stats.total_wins / stats.total_trades if stats.total_trades else None,
+        'total_pnl': stats.total_pnl,
+        'total_fees': stats.total_fees,
+        'total_gross_profit': stats.total_gross_profit,
+        'total_gross_loss': stats.total_gross_loss,
+        'profit_factor': stats.total_gross_profit / stats.total_gross_loss if stats.total_gross_loss else None,
+        'max_drawdown': stats.max_drawdown,
+    }
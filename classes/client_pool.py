@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+from classes.exchange import Exchange
+from classes.balance_cache import balance_cache
+from classes.order_batcher import order_batchers
+from classes.fill_tracker import fill_trackers
+from classes.rate_limiter import rate_limits
+
+
+class ExchangeClientPool(object):
+    """
+    Least-recently-used pool of Exchange handles, one per account.
+
+    A handle is rebuilt when the account's exchange or credentials change, and the least
+    recently used handles are dropped once more than `max_size` accounts are pooled.
+    """
+
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self.clients = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, account):
+        """Check out the Exchange handle of the account, building it on first use."""
+        fingerprint = get_account_fingerprint(account)
+        with self.lock:
+            entry = self.clients.get(account.id)
+            if entry is not None and entry[0] == fingerprint:
+                self.clients.move_to_end(account.id)
+                return entry[1]
+
+        # Build outside the lock, ccxt client construction is the expensive part
+        client = Exchange(account)
+        evicted = []
+        with self.lock:
+            entry = self.clients.get(account.id)
+            if entry is not None and entry[0] == fingerprint:
+                # Another thread built the same handle first, keep a single one
+                client = entry[1]
+            else:
+                self.clients[account.id] = (fingerprint, client)
+            self.clients.move_to_end(account.id)
+            while len(self.clients) > self.max_size:
+                evicted.append(self.clients.popitem(last=False))
+        for account_id, entry in evicted:
+            self.release(account_id, entry)
+        return client
+
+    def invalidate(self, account_id):
+        """
+        Drop the account's handle and everything kept for it, called when the account is edited or deleted:
+        its balance snapshot, order batcher, fill tracker and the rate-limit scheduler of its API key.
+        """
+        with self.lock:
+            entry = self.clients.pop(account_id, None)
+        self.release(account_id, entry)
+
+    def release(self, account_id, entry):
+        """Release what is kept for an account whose pool `entry` was dropped, by invalidation or eviction."""
+        with self.lock:
+            # Accounts sharing the API key keep using its scheduler
+            shared = entry is not None and any(
+                (client.exchange_name, client.api_key) == (entry[1].exchange_name, entry[1].api_key)
+                for _, client in self.clients.values())
+        balance_cache.invalidate(account_id)
+        order_batchers.release(account_id)
+        fill_trackers.release(account_id)
+        if entry is not None and not shared:
+            rate_limits.release(entry[1].exchange_name, entry[1].api_key)
+
+
+def get_account_fingerprint(account):
+    # The options are copied, an in-place edit of the account's JSON must still change the fingerprint
+    return (account.exchange_id, account.api_key, account.api_secret, account.password, bool(account.testnet),
+            dict(account.options or {}))
+
+
+# Create a global variable for the exchange client pool
+client_pool = ExchangeClientPool()
+
+
+# Define a function to configure the client pool from the Flask app config
+def init_client_pool(app):
+    client_pool.max_size = app.config.get('EXCHANGE_POOL_SIZE', client_pool.max_size)
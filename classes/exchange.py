@@ -2,32 +2,44 @@ import ccxt
 from _decimal import Decimal
 from ccxt import ExchangeError
 import decimal
+from classes.market_cache import market_cache
+from classes.market_index import MarketIndex
+from classes.market_data import market_data
+from classes.balance_cache import balance_cache
+from classes.rate_limiter import rate_limits
+from classes.order_batcher import order_batchers
+from classes.simulated_exchange import SimulatedExchange
+from classes.metrics import metrics
+from classes.log import get_logger
 
+logger = get_logger('exchange')
 
-class Exchange(ccxt.Exchange):
-    markets = {}
-    instances = {}
+
+def create_ccxt_client(exchange_name, options):
+    """Build the ccxt client of an exchange short name, 'sim' selects the offline simulated exchange."""
+    if exchange_name == SimulatedExchange.id:
+        return SimulatedExchange(options)
+    return getattr(ccxt, exchange_name)(options)
+
+
+class Exchange(object):
+    """
+    Lightweight per-account handle around a ccxt client. Handles are pooled by ExchangeClientPool.
+    """
 
     def __init__(self, account):
-        super().__init__()
         self.account_id = account.id
         self.exchange_name = account.exchangemodels.short
         self.api_key = account.api_key
         self.secret = account.api_secret
         self.passphrase = account.password
         self.testnet = bool(account.testnet)
-        self.urls = {}  # initialize urls to an empty dictionary
+        self.account_options = account.options or {}
         self.exchange_instance = self.get_instance()
 
     def get_instance(self):
-        if self.account_id in Exchange.instances:
-            print("Found Exchange Instance")
-            return Exchange.instances[self.account_id]
-
-        exchange = getattr(ccxt, self.exchange_name)(self.build_exchange_options())
+        exchange = create_ccxt_client(self.exchange_name, self.build_exchange_options())
         exchange.set_sandbox_mode(self.testnet)
-        # print(exchange.fetch_balance()['total']['USDT'])
-        Exchange.instances[self.account_id] = exchange
         return exchange
 
     def build_exchange_options(self):
@@ -35,161 +47,249 @@ class Exchange(ccxt.Exchange):
             'apiKey': self.api_key,
             'secret': self.secret,
             'password': self.passphrase,
-            'enableRateLimit': True,
+            # Throttling is done by the shared per-API-key scheduler, see call()
+            'enableRateLimit': False,
             'options': {
                 'adjustForTimeDifference': True,
                 'defaultType': 'future',
                 'test': self.testnet
             }  # Enable testnet
         }
+        if self.exchange_name == SimulatedExchange.id:
+            # The account options hold the simulation settings (latency, partial fills, balance...)
+            exchange_options['options']['sim'] = self.account_options
         return exchange_options
 
+    def rate_limiter(self):
+        return rate_limits.get(self.exchange_name, self.api_key, self.exchange_instance.rateLimit)
+
+    def call(self, endpoint, *args, priority=None, cost=None, **kwargs):
+        """Call a ccxt endpoint once the API key's rate-limit scheduler admits it."""
+        waited = self.rate_limiter().acquire(endpoint, cost, priority)
+        metrics.observe('easymarket_rate_limit_wait_seconds', 'Time exchange requests waited for the rate limiter.',
+                        waited, exchange=self.exchange_name, endpoint=endpoint)
+        with metrics.exchange_request(self.exchange_name, endpoint):
+            return getattr(self.exchange_instance, endpoint)(*args, **kwargs)
+
     def get_trading_fees(self, symbol):
         try:
-            fees = self.exchange_instance.fetch_trading_fees(symbol)
+            fees = self.call('fetch_trading_fee', symbol)
             maker_fee = fees['maker']
             taker_fee = fees['taker']
             return maker_fee, taker_fee
         except Exception as e:
-            print(f"Error fetching trading fees for {self.exchange_name}: {e}")
+            logger.error("Error fetching trading fees for %s: %s", self.exchange_name, e)
             return None, None
 
     def get_available_leverage(self, symbol):
-        # Check if testnet is supported for the exchange
-        if self.testnet:
-            if hasattr(self.exchange_instance, 'fetch_markets'):
-                # Load markets information for the testnet exchange
-                markets = self.exchange_instance.fetch_markets()
-                market = next((m for m in markets if m['symbol'] == symbol), None)
-                if market:
-                    max_leverage = int(market['limits']['leverage']['max'])
-                    return ['{}x'.format(i) for i in [1, 3, 5, 10, 15, 20, 30, 40, 50, 60, 100, 150, 200] if
-                            i <= max_leverage]
-            # Testnet not supported for this exchange, return None
-            return None
-        else:
-            # Load leverage information for the live exchange
-            leverage_info = self.exchange_instance.futures_get_leverage_brackets(symbol)
-            return [float(level['initialLeverage']) for level in leverage_info]
+        """Return the selectable leverage steps for any alias of `symbol` from the market index."""
+        return self.market_index().leverage_options(symbol)
 
-    def load_markets(self, reload=False, params=None):
-        """Load all available markets for the exchange."""
-        if params is None:
-            params = {}
-        if not Exchange.markets:
+    def market_cache_key(self):
+        return self.exchange_name, self.testnet
+
+    def fetch_market_metadata(self):
+        """Download the markets with a throwaway client so the shared instance is never mutated mid-request."""
+        loader = create_ccxt_client(self.exchange_name, self.build_exchange_options())
+        loader.set_sandbox_mode(self.testnet)
+        self.rate_limiter().acquire('load_markets')
+        markets = loader.load_markets()
+        leverage_tiers = None
+        if not self.testnet and loader.has.get('fetchLeverageTiers'):
             try:
-                print(self.urls)
-                Exchange.markets = self.exchange_instance.load_markets()
-            except ccxt.ExchangeError as e:
-                raise ExchangeError(f"Error loading markets for {self.exchange_name}: {e}")
+                # One call returns the brackets of every symbol, fall back to the market limits if it fails
+                self.rate_limiter().acquire('fetch_leverage_tiers')
+                leverage_tiers = loader.fetch_leverage_tiers()
+            except Exception as e:
+                logger.warning("Error fetching leverage tiers for %s: %s", self.exchange_name, e)
+        return MarketIndex(markets, leverage_tiers)
+
+    def market_index(self):
+        """Return the cached MarketIndex for this exchange, loading it if necessary."""
+        try:
+            index, loaded_at = market_cache.get_entry(self.market_cache_key(), self.fetch_market_metadata)
+        except ccxt.ExchangeError as e:
+            raise ExchangeError(f"Error loading markets for {self.exchange_name}: {e}")
 
-        return Exchange.markets
+        # Attach the cached markets to the ccxt instance once per cache generation
+        if getattr(self.exchange_instance, 'markets_loaded_at', None) != loaded_at:
+            self.exchange_instance.set_markets(index.markets)
+            self.exchange_instance.markets_loaded_at = loaded_at
+        return index
+
+    def resolve_market(self, symbol):
+        """Return the canonical market record for any alias of `symbol`, or None."""
+        return self.market_index().resolve(symbol)
+
+    def load_markets(self, reload=False, params=None):
+        """Load all available markets for the exchange from the shared market cache."""
+        if reload:
+            market_cache.invalidate(self.market_cache_key())
+        return self.market_index().markets
 
     def get_time_intervals(self, symbol):
-        timeframes = None
         try:
-            self.exchange_instance.load_markets()
+            self.load_markets()
         except ccxt.ExchangeError as e:
-            print(f"Error loading timeframes for {self.exchange_name}: {e}")
+            logger.error("Error loading timeframes for %s: %s", self.exchange_name, e)
         return self.exchange_instance.timeframes.keys()
 
     def set_testnet(self):
         self.testnet = True
         return False
 
+    def get_balance_snapshot(self):
+        """Return the account's cached fetch_balance response, shared by every reader until it expires."""
+        return balance_cache.get(self.account_id, lambda: self.call('fetch_balance'))
+
+    def invalidate_balance(self):
+        balance_cache.invalidate(self.account_id)
+
     def get_balance(self, currency):
-        balance = self.exchange_instance.fetch_balance()[currency]
+        balance = self.get_balance_snapshot()[currency]
         return balance['free']
 
     # Fetch the account balance
     def fetch_balance(self, type='trading', currency=None):
-        total_balance = super().fetch_total_balance()
+        total_balance = self.get_balance_snapshot()['total']
         if currency in total_balance:
             return total_balance[currency]
         return None
 
     def get_total_balance(self):
-        total_balance = float(self.exchange_instance.fetch_balance()['total']['USDT'])
+        total_balance = float(self.get_balance_snapshot()['total']['USDT'])
         return total_balance
 
     def get_usdt_balance(self):
-        usdt_balance = float(self.exchange_instance.fetch_balance()['free']['USDT'])
+        usdt_balance = float(self.get_balance_snapshot()['free']['USDT'])
         return usdt_balance
 
     def get_ticker(self, symbol):
+        """Return the streamed ticker for `symbol`, falling back to REST when it is missing or stale."""
+        ticker = market_data.get_ticker(self.market_cache_key(), symbol)
+        if ticker is not None:
+            return ticker
         try:
-            return self.exchange_instance.fetch_ticker(symbol)
+            ticker = self.call('fetch_ticker', symbol)
         except Exception as e:
-            print(f"Error getting ticker for {symbol}: {e}")
+            logger.error("Error getting ticker for %s on %s: %s", symbol, self.exchange_name, e)
             return None
+        market_data.update(self.market_cache_key(), symbol, ticker, self.build_stream_options())
+        return ticker
+
+    def get_tickers(self, symbols):
+        """
+        Return the tickers of several symbols, fresh streamed ones first and the rest from a
+        single fetch_tickers request. Symbols the exchange did not return are missing from the result.
+        """
+        key = self.market_cache_key()
+        tickers = {}
+        missing = []
+        for symbol in symbols:
+            ticker = market_data.get_ticker(key, symbol)
+            if ticker is not None:
+                tickers[symbol] = ticker
+            else:
+                missing.append(symbol)
+        if not missing:
+            return tickers
+        if not self.exchange_instance.has.get('fetchTickers'):
+            for symbol in missing:
+                ticker = self.get_ticker(symbol)
+                if ticker is not None:
+                    tickers[symbol] = ticker
+            return tickers
+        try:
+            fetched = self.call('fetch_tickers', missing)
+        except Exception as e:
+            logger.error("Error getting %d tickers on %s: %s", len(missing), self.exchange_name, e)
+            return tickers
+        for symbol in missing:
+            ticker = fetched.get(symbol)
+            if ticker is not None:
+                tickers[symbol] = ticker
+                # Prices are read again on the next valuation, keep them in the store without subscribing
+                market_data.store.put(key, symbol, ticker)
+        return tickers
 
     def get_ticker_price(self, symbol):
-        ticker = self.exchange_instance.fetch_ticker(symbol)
+        ticker = self.get_ticker(symbol)
         return ticker['last'] if ticker else None
 
+    def build_stream_options(self):
+        # Tickers are public, the stream never needs the account credentials
+        return {'options': {'defaultType': 'future'}}
+
+    def submit_order(self, symbol, order_type, side, amount, price=None):
+        """Place an order through the account's order batcher and wait for the exchange's response."""
+        order = order_batchers.get(self).submit(symbol, order_type, side, amount, price).result()
+        self.invalidate_balance()
+        return order
+
     def create_limit_order(self, symbol, side, amount, price):
         order = None
         try:
-            order = self.exchange_instance.create_order(symbol, 'limit', side, amount, price)
+            order = self.submit_order(symbol, 'limit', side, amount, price)
         except Exception as e:
-            print(f"Failed to create limit order: {e}")
+            logger.error("Failed to create limit order on %s: %s", self.exchange_name, e,
+                         extra={'symbol': symbol, 'side': side, 'amount': amount, 'price': price})
         return order
 
     def create_market_order(self, symbol, side, amount):
         order = None
         try:
-            order = self.exchange_instance.create_order(symbol, 'market', side, amount)
+            order = self.submit_order(symbol, 'market', side, amount)
         except Exception as e:
-            print(f"Failed to create market order: {e}")
+            logger.error("Failed to create market order on %s: %s", self.exchange_name, e,
+                         extra={'symbol': symbol, 'side': side, 'amount': amount})
         return order
 
     def cancel_order(self, symbol, order_id):
         exchange_order = None
         try:
-            exchange_order = self.exchange_instance.cancel_order(order_id, symbol=symbol)
+            exchange_order = self.call('cancel_order', order_id, symbol=symbol)
+            self.invalidate_balance()
             # if exchange_order:
             # order = self.session.query(Positions).filter_by(exchange=self.exchange_name, order_id=exchange_order['id']).first()
             # if order:
             #   order.status = exchange_order['status']
             #   self.session.commit()
         except Exception as e:
-            print(f"Error cancelling order on {self.exchange_name}: {e}")
+            logger.error("Error cancelling order on %s: %s", self.exchange_name, e)
         return exchange_order
 
     def get_order_status(self, symbol, order_id):
+        exchange_order = None
         try:
-            exchange_order = self.exchange_instance.fetch_order(order_id, symbol=symbol)
-            print(exchange_order)
+            exchange_order = self.call('fetch_order', order_id, symbol=symbol)
+            logger.debug("Order status on %s: %s", self.exchange_name, exchange_order)
         except Exception as e:
-            print(f"Error getting order status on {self.exchange_name}: {e}")
+            logger.error("Error getting order status on %s: %s", self.exchange_name, e)
         return exchange_order
 
     def create_order(self, side, order_type, symbol, amount, price=None):
         try:
-            order_params = {'type': order_type, 'side': side, 'symbol': symbol, 'amount': amount}
-            if price:
-                order_params['price'] = price
-            response = self.exchange_instance.create_order(**order_params)
+            response = self.submit_order(symbol, order_type, side, amount, price)
             return response
         except Exception as e:
-            print(f"Error placing {order_type} order on {self.exchange_name}: {e}")
+            logger.error("Error placing %s order on %s: %s", order_type, self.exchange_name, e)
             return None
 
     def create_testnet_order(self, side, order_type, symbol, amount, price=None):
         if not self.testnet:
-            print("Error: create_testnet_order can only be used with testnet exchanges.")
+            logger.error("create_testnet_order can only be used with testnet exchanges")
             return None
         try:
-            order_params = {'type': order_type, 'side': side, 'symbol': symbol, 'amount': amount}
-            if price:
-                order_params['price'] = price
-            response = self.exchange_instance.create_order(**order_params)
+            response = self.submit_order(symbol, order_type, side, amount, price)
             return response
         except Exception as e:
-            print(f"Error placing {order_type} order on {self.exchange_name} testnet: {e}")
+            logger.error("Error placing %s order on %s testnet: %s", order_type, self.exchange_name, e)
             return None
 
     def amount_to_precision(self, symbol, quantity, precision=None, rounding_mode=None):
+        record = self.resolve_market(symbol)
+        if record is not None:
+            symbol = record['symbol']
         if symbol not in self.exchange_instance.markets:
             raise ValueError(f"{symbol} not found in markets dictionary. Please call load_markets() first.")
         if precision is None:
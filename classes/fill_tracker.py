@@ -0,0 +1,241 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from classes.metrics import current_trace, metrics
+from classes.log import get_logger
+
+logger = get_logger('fill_tracker')
+
+FINAL_STATUSES = ('closed', 'canceled', 'cancelled', 'expired', 'rejected', 'filled')
+
+
+class OrderNotFilledError(ValueError):
+    """Order canceled, expired, rejected or closed without a fill, no position is written for it."""
+
+
+class PendingOrder(object):
+    def __init__(self, order, on_fill=None, timeout=None):
+        self.order = order
+        self.id = order['id']
+        self.symbol = order['symbol']
+        self.on_fill = on_fill
+        # The order is canceled when it is still open at the deadline
+        self.deadline = time.monotonic() + timeout if timeout else None
+        # Only the caller's metrics trace follows the order into the tracker thread, the app
+        # context and its session are the tracker's own
+        self.trace = current_trace.get()
+        self.future = Future()
+
+
+class FillTracker(object):
+    """
+    Tracks the pending orders of one account.
+
+    Every tick fetches the open orders of the account, with one request for all symbols
+    when the exchange allows it and one per pending symbol otherwise. Orders that are no
+    longer open are fetched once to read their final state, then their callbacks
+    run inside the app context and their futures resolve. The poll interval doubles while
+    nothing changes and resets when an order is added or completes. Orders still open
+    `fill_timeout` seconds after they were tracked are canceled.
+    """
+
+    def __init__(self, app, exchange_client, min_interval=1.0, max_interval=30.0, fill_timeout=None):
+        self.app = app
+        self.exchange_client = exchange_client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.fill_timeout = fill_timeout
+        self.interval = min_interval
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def track(self, order, on_fill=None):
+        """
+        Start tracking `order` and return a Future of its final state. `on_fill(order)` runs
+        first in the app context, an exception it raises fails the Future.
+        """
+        pending = PendingOrder(order, on_fill, self.fill_timeout)
+        if is_order_complete(order):
+            self.complete(pending, order)
+            return pending.future
+
+        with self.lock:
+            self.pending[pending.id] = pending
+            self.interval = self.min_interval
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name=f"fill-tracker-{self.exchange_client.account_id}",
+                                               daemon=True)
+                self.thread.start()
+        self.wakeup.set()
+        return pending.future
+
+    def run(self):
+        # The thread exits once nothing is pending, track() starts a new one on demand
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.thread = None
+                    return
+                timeout = self.interval
+                deadlines = [p.deadline for p in self.pending.values() if p.deadline is not None]
+            if deadlines:
+                timeout = max(0.0, min(timeout, min(deadlines) - time.monotonic()))
+            self.wakeup.wait(timeout)
+            self.wakeup.clear()
+            try:
+                changed = self.poll()
+            except Exception as e:
+                logger.error("Error polling orders on %s: %s", self.exchange_client.exchange_name, e)
+                changed = False
+            with self.lock:
+                self.interval = self.min_interval if changed else min(self.interval * 2, self.max_interval)
+
+    def poll(self):
+        """Poll all pending orders once. Returns True if any of them completed."""
+        with self.lock:
+            pending = list(self.pending.values())
+        if not pending:
+            return False
+
+        open_ids = self.fetch_open_ids(pending)
+        client = self.exchange_client
+
+        changed = False
+        now = time.monotonic()
+        for p in pending:
+            expired = p.deadline is not None and now >= p.deadline
+            if open_ids is not None and p.id in open_ids and not expired:
+                continue
+            if expired:
+                self.cancel(p)
+            # Only orders that left the open book cost an extra request
+            try:
+                order = client.call('fetch_order', p.id, p.symbol)
+            except Exception as e:
+                # One failing order must not hold back the others, it is fetched again next tick
+                logger.warning("Error fetching order %s on %s: %s", p.id, client.exchange_name, e)
+                continue
+            if is_order_complete(order):
+                with self.lock:
+                    self.pending.pop(p.id, None)
+                self.complete(p, order)
+                changed = True
+        return changed
+
+    def cancel(self, pending):
+        """Cancel an order past its fill deadline, fetch_order then reads its final state."""
+        client = self.exchange_client
+        logger.warning("Order %s on %s not filled after %ss, canceling it", pending.id, client.exchange_name,
+                       self.fill_timeout)
+        # Retried after the longest poll interval if the order is still open
+        pending.deadline = time.monotonic() + self.max_interval
+        try:
+            client.call('cancel_order', pending.id, pending.symbol)
+        except Exception as e:
+            # Usually the order was filled or canceled in the meantime
+            logger.warning("Error canceling order %s on %s: %s", pending.id, client.exchange_name, e)
+
+    def fetch_open_ids(self, pending):
+        """
+        Return the ids of the account's open orders of the pending symbols, or None when the
+        exchange cannot list open orders and every pending order is fetched on its own.
+        """
+        client = self.exchange_client
+        exchange = client.exchange_instance
+        if not exchange.has.get('fetchOpenOrders'):
+            return None
+        symbols = sorted({p.symbol for p in pending})
+        options = getattr(exchange, 'options', None) or {}
+        if len(symbols) > 1 and not options.get('warnOnFetchOpenOrdersWithoutSymbol'):
+            # Without a symbol the exchange charges a much heavier request weight
+            open_orders = client.call('fetch_open_orders', cost=40)
+        else:
+            # Exchanges like Binance reject open orders requests without a symbol, ask once per symbol
+            open_orders = [order for symbol in symbols for order in client.call('fetch_open_orders', symbol)]
+        return {order['id'] for order in open_orders}
+
+    def complete(self, pending, order):
+        # A fill changes the account balance, sizing must not reuse the old snapshot
+        self.exchange_client.invalidate_balance()
+        try:
+            if pending.on_fill is not None:
+                with self.app.app_context(), metrics.traced(pending.trace):
+                    pending.on_fill(order)
+            pending.future.set_result(order)
+        except Exception as e:
+            pending.future.set_exception(e)
+
+
+def is_order_complete(order):
+    if not order:
+        return False
+    status = (order.get('status') or '').lower()
+    if status in FINAL_STATUSES:
+        return True
+    return bool(order.get('amount')) and order.get('filled') == order.get('amount')
+
+
+def is_order_filled(order):
+    """True for an order closed with a fill, the only state positions are opened or closed from."""
+    status = (order.get('status') or '').lower()
+    if status not in ('closed', 'filled') and not (order.get('amount') and order.get('filled') == order.get('amount')):
+        return False
+    return (order.get('filled') or 0) > 0
+
+
+def check_order_filled(order):
+    """Raise OrderNotFilledError unless `order` is closed with a fill."""
+    if not is_order_filled(order):
+        raise OrderNotFilledError(f"Order {order.get('id')} is {order.get('status')} with {order.get('filled') or 0} "
+                                  f"of {order.get('amount')} filled")
+
+
+class FillTrackerRegistry(object):
+    """One FillTracker per account."""
+
+    def __init__(self):
+        self.app = None
+        self.trackers = {}
+        self.lock = threading.Lock()
+        self.min_interval = 1.0
+        self.max_interval = 30.0
+        self.fill_timeout = 600.0
+
+    def init_app(self, app):
+        self.app = app
+        self.min_interval = app.config.get('FILL_POLL_MIN_INTERVAL', self.min_interval)
+        self.max_interval = app.config.get('FILL_POLL_MAX_INTERVAL', self.max_interval)
+        self.fill_timeout = app.config.get('FILL_TIMEOUT', self.fill_timeout)
+
+    def get(self, exchange_client):
+        with self.lock:
+            tracker = self.trackers.get(exchange_client.account_id)
+            if tracker is None:
+                tracker = FillTracker(self.app, exchange_client, self.min_interval, self.max_interval,
+                                      self.fill_timeout)
+                self.trackers[exchange_client.account_id] = tracker
+            else:
+                # Keep the newest client so credential changes reach the poller
+                tracker.exchange_client = exchange_client
+            return tracker
+
+    def track(self, exchange_client, order, on_fill=None):
+        """Track `order` with the account's tracker, see FillTracker.track()."""
+        return self.get(exchange_client).track(order, on_fill)
+
+    def release(self, account_id):
+        """Drop the account's tracker. Its thread keeps polling the orders it already tracks until they complete."""
+        with self.lock:
+            self.trackers.pop(account_id, None)
+
+
+# Create a global variable for the fill tracker registry
+fill_trackers = FillTrackerRegistry()
+
+
+# Define a function to initialize the fill trackers with the Flask app
+def init_fill_trackers(app):
+    fill_trackers.init_app(app)
@@ -0,0 +1,217 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from classes.log import get_logger
+
+logger = get_logger('jobs')
+
+
+class Job(object):
+    """State of one background job, reported by the /jobs/<id> endpoint."""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.status = 'queued'
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def set_stage(self, stage):
+        self.stage = stage
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'stage': self.stage,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+class JobGroup(object):
+    """Several jobs started by one request, reported together with a per-job summary."""
+
+    def __init__(self, name, jobs):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.jobs = jobs
+        self.created_at = time.time()
+
+    @property
+    def finished(self):
+        return all(job.finished for job in self.jobs)
+
+    @property
+    def status(self):
+        if not self.finished:
+            return 'running' if any(job.status != 'queued' for job in self.jobs) else 'queued'
+        return 'done' if all(job.status == 'done' for job in self.jobs) else 'failed'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'summary': {status: sum(1 for job in self.jobs if job.status == status)
+                        for status in ('queued', 'running', 'waiting', 'done', 'failed')},
+            'jobs': [job.to_dict() for job in self.jobs],
+            'created_at': self.created_at,
+        }
+
+
+class JobExecutor(object):
+    """
+    Runs jobs on a thread pool inside the Flask app context and keeps their state in memory.
+
+    A job that returns a concurrent Future, e.g. an order resting on the book, gives back its
+    worker and its key slot right away, it stays 'waiting' until the Future resolves.
+    Jobs submitted with the same `key` run at most `max_per_key` at a time, the rest wait
+    in a queue without holding a worker. Only the most recent `max_jobs` jobs are kept,
+    finished jobs are evicted first.
+    """
+
+    def __init__(self, max_workers=16, max_jobs=10000, max_per_key=4):
+        self.app = None
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self.max_per_key = max_per_key
+        self.jobs = OrderedDict()
+        self.running = {}
+        self.waiting = {}
+        self.lock = threading.Lock()
+        self.pool = None
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = app.config.get('JOB_WORKERS', self.max_workers)
+        self.max_jobs = app.config.get('JOB_RETENTION', self.max_jobs)
+        self.max_per_key = app.config.get('JOB_MAX_PER_ACCOUNT', self.max_per_key)
+
+    def get_pool(self):
+        # Created lazily so forked web workers never inherit a pool without threads
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job')
+            return self.pool
+
+    def submit(self, func, *args, name=None, key=None):
+        """Queue `func(job, *args)` and return the Job immediately."""
+        job = Job(name or func.__name__)
+        with self.lock:
+            self.jobs[job.id] = job
+            self.evict()
+            if key is not None:
+                if self.running.get(key, 0) >= self.max_per_key:
+                    self.waiting.setdefault(key, deque()).append((job, func, args))
+                    return job
+                self.running[key] = self.running.get(key, 0) + 1
+        self.get_pool().submit(self.run, job, func, args, key)
+        return job
+
+    def submit_group(self, name, jobs):
+        """Register already submitted jobs under one id and return the JobGroup."""
+        group = JobGroup(name, jobs)
+        with self.lock:
+            self.jobs[group.id] = group
+            self.evict()
+        return group
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def status_counts(self):
+        """Return (labels, count) pairs of the kept jobs per status, for the metrics gauges."""
+        with self.lock:
+            jobs = [job for job in self.jobs.values() if isinstance(job, Job)]
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return [({'status': status}, count) for status, count in counts.items()]
+
+    def release(self, key):
+        # Hand the slot straight to the next waiting job of the same key
+        with self.lock:
+            waiting = self.waiting.get(key)
+            if waiting:
+                job, func, args = waiting.popleft()
+            else:
+                self.waiting.pop(key, None)
+                self.running[key] -= 1
+                if not self.running[key]:
+                    del self.running[key]
+                return
+        self.get_pool().submit(self.run, job, func, args, key)
+
+    def run(self, job, func, args, key=None):
+        job.status = 'running'
+        job.started_at = time.time()
+        try:
+            with self.app.app_context():
+                result = func(job, *args)
+            if isinstance(result, Future):
+                job.status = 'waiting'
+                result.add_done_callback(lambda future: self.resolve(job, future))
+            else:
+                self.finish(job, result)
+        except Exception as e:
+            self.fail(job, e)
+        finally:
+            if key is not None:
+                self.release(key)
+
+    def resolve(self, job, future):
+        error = future.exception()
+        if error is not None:
+            self.fail(job, error)
+        else:
+            self.finish(job, future.result())
+
+    def finish(self, job, result):
+        job.result = result
+        job.status = 'done'
+        job.finished_at = time.time()
+
+    def fail(self, job, error):
+        logger.error("Error running job %s %s: %s", job.name, job.id, error)
+        job.error = str(error)
+        job.status = 'failed'
+        job.finished_at = time.time()
+
+    def evict(self):
+        if len(self.jobs) <= self.max_jobs:
+            return
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished]:
+            del self.jobs[job_id]
+            if len(self.jobs) <= self.max_jobs:
+                return
+
+    def shutdown(self, wait=True):
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+# Create a global variable for the job executor object
+executor = JobExecutor()
+
+
+# Define a function to initialize the job executor with the Flask app
+def init_jobs(app):
+    executor.init_app(app)
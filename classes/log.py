@@ -0,0 +1,100 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+# Attributes every LogRecord has, anything else was passed with `extra` and is logged as a field
+RECORD_ATTRIBUTES = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formats records as `key=value` text or as one JSON object per line.
+
+    Fields passed with `extra={...}` are appended to the message, so log lines can be
+    filtered by bot, account or order without parsing the message text.
+    """
+
+    def __init__(self, fmt='text'):
+        super().__init__()
+        self.fmt = fmt
+
+    def fields(self, record):
+        return {key: value for key, value in record.__dict__.items() if key not in RECORD_ATTRIBUTES}
+
+    def format(self, record):
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(self.fields(record))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if self.fmt == 'json':
+            return json.dumps(entry, default=str)
+        fields = ' '.join(f'{key}={value}' for key, value in entry.items() if key not in ('time', 'level', 'logger',
+                                                                                         'message', 'exception'))
+        line = f"{entry['time']} {entry['level']:<7} {entry['logger']}: {entry['message']}"
+        if fields:
+            line += f' {fields}'
+        if 'exception' in entry:
+            line += '\n' + entry['exception']
+        return line
+
+
+class LogPipeline(object):
+    """
+    Non-blocking logging for the app.
+
+    Callers only put the record on a queue, a background listener thread formats it and
+    writes it to stdout. Messages use %-style arguments, so payloads logged at a disabled
+    level are never formatted.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue(-1)
+        self.listener = None
+
+    def init_app(self, app):
+        level = logging.getLevelName(str(app.config.get('LOG_LEVEL', 'INFO')).upper())
+        if not isinstance(level, int):
+            level = logging.INFO
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(StructuredFormatter(app.config.get('LOG_FORMAT', 'text')))
+
+        self.stop()
+        self.listener = logging.handlers.QueueListener(self.queue, handler, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop)
+
+        # The app's own loggers and Flask's logger write through the queue only
+        for name in ('easymarket', app.logger.name):
+            logger = logging.getLogger(name)
+            logger.handlers = [logging.handlers.QueueHandler(self.queue)]
+            logger.setLevel(level)
+            logger.propagate = False
+
+    def stop(self):
+        # Flushes the records still queued
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+# Create a global variable for the log pipeline object
+log_pipeline = LogPipeline()
+
+
+def get_logger(name):
+    """Return the logger of an app module, e.g. get_logger('exchange') -> 'easymarket.exchange'."""
+    return logging.getLogger(f'easymarket.{name}')
+
+
+# Define a function to start the log pipeline with the Flask app
+def init_logging(app):
+    log_pipeline.init_app(app)
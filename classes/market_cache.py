@@ -0,0 +1,97 @@
+import threading
+import time
+
+from classes.log import get_logger
+
+logger = get_logger('market_cache')
+
+
+class MarketCache(object):
+    """
+    Process-wide market metadata cache keyed by (exchange short name, testnet).
+
+    Entries older than `ttl` are still served while a background thread reloads
+    them (stale-while-revalidate). Entries older than `max_age` are reloaded
+    synchronously before being returned.
+    """
+
+    def __init__(self, ttl=3600, max_age=86400):
+        self.ttl = ttl
+        self.max_age = max_age
+        self.entries = {}
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        # Bumped by invalidate(), loads started before it return their markets but do not cache them
+        self.generation = 0
+
+    def get(self, key, loader):
+        """Return the markets for `key`, calling `loader()` to (re)load them when needed."""
+        return self.get_entry(key, loader)[0]
+
+    def get_entry(self, key, loader):
+        """Return a (markets, loaded_at) tuple for `key`."""
+        entry = self.entries.get(key)
+        if entry is None or time.time() - entry[1] > self.max_age:
+            return self.load(key, loader)
+        if time.time() - entry[1] > self.ttl:
+            self.refresh_in_background(key, loader)
+        return entry
+
+    def load(self, key, loader):
+        """Load the markets for `key` synchronously. Concurrent callers share a single load."""
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self.entries.get(key)
+            # Another thread finished loading while we were waiting for the lock
+            if entry is not None and time.time() - entry[1] <= self.ttl:
+                return entry
+            generation = self.generation
+            entry = (loader(), time.time())
+            self.store(key, entry, generation)
+            return entry
+
+    def store(self, key, entry, generation):
+        with self.lock:
+            if self.generation == generation:
+                self.entries[key] = entry
+
+    def refresh_in_background(self, key, loader):
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+
+        generation = self.generation
+
+        def refresh():
+            try:
+                self.store(key, (loader(), time.time()), generation)
+            except Exception as e:
+                # Keep serving the stale entry, the next read past the TTL retries
+                logger.error("Error refreshing markets for %s: %s", key, e)
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"market-refresh-{key[0]}", daemon=True).start()
+
+    def invalidate(self, key=None):
+        """Drop the cached markets for `key`, or for every exchange when no key is given."""
+        with self.lock:
+            self.generation += 1
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+
+# Create a global variable for the market cache object
+market_cache = MarketCache()
+
+
+# Define a function to configure the market cache from the Flask app config
+def init_market_cache(app):
+    market_cache.ttl = app.config.get('MARKET_CACHE_TTL', market_cache.ttl)
+    market_cache.max_age = app.config.get('MARKET_CACHE_MAX_AGE', market_cache.max_age)
@@ -0,0 +1,235 @@
+import asyncio
+import threading
+import time
+
+from classes.log import get_logger
+
+logger = get_logger('market_data')
+
+try:
+    import ccxt.pro as ccxtpro
+except ImportError:
+    ccxtpro = None
+
+
+class PriceStore(object):
+    """
+    Last ticker per (exchange key, symbol) with the time it was received.
+
+    Writers replace the whole (ticker, received_at) tuple in one dict assignment, so
+    readers never need a lock and never see a half-written entry.
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def put(self, key, symbol, ticker, received_at=None):
+        self.entries[(key, symbol)] = (ticker, received_at or time.time())
+
+    def get(self, key, symbol, max_age):
+        """Return the ticker if it is younger than `max_age` seconds, otherwise None."""
+        entry = self.entries.get((key, symbol))
+        if entry is None or time.time() - entry[1] > max_age:
+            return None
+        return entry[0]
+
+    def age(self, key, symbol):
+        entry = self.entries.get((key, symbol))
+        return None if entry is None else time.time() - entry[1]
+
+
+class TickerFeed(object):
+    """
+    Base class of a streaming ticker source that writes into a PriceStore.
+
+    Subscriptions are bounded: a symbol nobody read for `idle_timeout` seconds is dropped,
+    and past `max_symbols` the least recently read symbol makes room for a new one.
+    """
+
+    def __init__(self, store, key, idle_timeout=300.0, max_symbols=200):
+        self.store = store
+        self.key = key
+        self.idle_timeout = idle_timeout
+        self.max_symbols = max_symbols
+        # Symbol -> monotonic time it was last subscribed or read
+        self.symbols = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, symbol):
+        """Subscribe `symbol`. Returns True if it was not subscribed yet."""
+        with self.lock:
+            added = symbol not in self.symbols
+            self.symbols[symbol] = time.monotonic()
+            while self.max_symbols and len(self.symbols) > self.max_symbols:
+                del self.symbols[min(self.symbols, key=self.symbols.get)]
+        return added
+
+    def touch(self, symbol):
+        """Record a read of `symbol`, keeping its subscription alive."""
+        if symbol in self.symbols:
+            self.symbols[symbol] = time.monotonic()
+
+    def unsubscribe(self, symbol):
+        with self.lock:
+            self.symbols.pop(symbol, None)
+
+    def is_idle(self, symbol):
+        read_at = self.symbols.get(symbol)
+        return read_at is None or time.monotonic() - read_at > self.idle_timeout
+
+    def expire(self):
+        """Drop the subscriptions nobody read for `idle_timeout` seconds. Returns the dropped symbols."""
+        with self.lock:
+            idle = [symbol for symbol in self.symbols if self.is_idle(symbol)]
+            for symbol in idle:
+                del self.symbols[symbol]
+        return idle
+
+    def stop(self):
+        pass
+
+
+class FakeTickerFeed(TickerFeed):
+    """Local feed for tests and offline runs, ticks are pushed by hand."""
+
+    def subscribe(self, symbol):
+        added = super().subscribe(symbol)
+        # Nothing streams, expiring here keeps the subscriptions bounded like a real feed
+        self.expire()
+        return added
+
+    def push(self, symbol, last, bid=None, ask=None):
+        ticker = {'symbol': symbol, 'last': last, 'bid': bid or last, 'ask': ask or last,
+                  'timestamp': int(time.time() * 1000)}
+        self.store.put(self.key, symbol, ticker)
+        return ticker
+
+
+class CcxtProTickerFeed(TickerFeed):
+    """
+    Streams tickers over the exchange websocket with ccxt.pro, one watch task per symbol.
+    The constructor raises the error of the client when it cannot be built.
+    """
+
+    def __init__(self, store, key, options, idle_timeout=300.0, max_symbols=200):
+        super().__init__(store, key, idle_timeout, max_symbols)
+        self.options = options
+        self.loop = None
+        self.client = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name=f"ticker-feed-{key[0]}", daemon=True)
+        self.ready = threading.Event()
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        try:
+            self.loop = asyncio.new_event_loop()
+            exchange_name, testnet = self.key
+            self.client = getattr(ccxtpro, exchange_name)(self.options)
+            self.client.set_sandbox_mode(testnet)
+        except Exception as e:
+            self.error = e
+            if self.loop is not None:
+                self.loop.close()
+            return
+        finally:
+            # The constructor waits for this, also when building the client failed
+            self.ready.set()
+        self.loop.run_forever()
+
+    def subscribe(self, symbol):
+        if super().subscribe(symbol):
+            self.loop.call_soon_threadsafe(self.loop.create_task, self.watch(symbol))
+        return True
+
+    async def watch(self, symbol):
+        while symbol in self.symbols:
+            if self.is_idle(symbol):
+                self.unsubscribe(symbol)
+                break
+            try:
+                ticker = await self.client.watch_ticker(symbol)
+                self.store.put(self.key, symbol, ticker)
+            except Exception as e:
+                # Readers fall back to REST while the stream reconnects
+                logger.warning("Error streaming ticker %s on %s: %s", symbol, self.key[0], e)
+                await asyncio.sleep(5)
+        if hasattr(self.client, 'un_watch_ticker'):
+            try:
+                await self.client.un_watch_ticker(symbol)
+            except Exception as e:
+                logger.debug("Error unsubscribing ticker %s on %s: %s", symbol, self.key[0], e)
+
+    def stop(self):
+        with self.lock:
+            self.symbols.clear()
+
+        async def close():
+            await self.client.close()
+            self.loop.stop()
+
+        self.loop.call_soon_threadsafe(self.loop.create_task, close())
+
+
+class MarketData(object):
+    """Keeps one ticker feed per (exchange short name, testnet) and serves fresh prices from the store."""
+
+    def __init__(self):
+        self.store = PriceStore()
+        self.feeds = {}
+        self.lock = threading.Lock()
+        self.max_age = 2.0
+        self.idle_timeout = 300.0
+        self.max_symbols = 200
+        self.streaming = ccxtpro is not None
+
+    def init_app(self, app):
+        self.max_age = app.config.get('TICKER_MAX_AGE', self.max_age)
+        self.idle_timeout = app.config.get('TICKER_IDLE_TIMEOUT', self.idle_timeout)
+        self.max_symbols = app.config.get('TICKER_MAX_SYMBOLS', self.max_symbols)
+        self.streaming = app.config.get('TICKER_STREAMING', self.streaming) and ccxtpro is not None
+
+    def get_feed(self, key, options=None):
+        with self.lock:
+            feed = self.feeds.get(key)
+            if feed is None:
+                if self.streaming and options is not None and hasattr(ccxtpro, key[0]):
+                    try:
+                        feed = CcxtProTickerFeed(self.store, key, options, self.idle_timeout, self.max_symbols)
+                    except Exception as e:
+                        # Prices keep coming from REST, the fake feed only records the subscriptions
+                        logger.error("Error starting the ticker stream of %s, using REST prices: %s", key[0], e)
+                if feed is None:
+                    feed = FakeTickerFeed(self.store, key, self.idle_timeout, self.max_symbols)
+                self.feeds[key] = feed
+            return feed
+
+    def get_ticker(self, key, symbol):
+        """Return the streamed ticker for `symbol` if it is fresh, otherwise None."""
+        feed = self.feeds.get(key)
+        if feed is not None:
+            feed.touch(symbol)
+        return self.store.get(key, symbol, self.max_age)
+
+    def update(self, key, symbol, ticker, options=None):
+        """Store a REST ticker and subscribe the symbol so the next read comes from the stream."""
+        self.store.put(key, symbol, ticker)
+        self.get_feed(key, options).subscribe(symbol)
+
+    def shutdown(self):
+        with self.lock:
+            feeds, self.feeds = self.feeds, {}
+        for feed in feeds.values():
+            feed.stop()
+
+
+# Create a global variable for the market data object
+market_data = MarketData()
+
+
+# Define a function to initialize the market data with the Flask app
+def init_market_data(app):
+    market_data.init_app(app)
@@ -0,0 +1,129 @@
+LEVERAGE_STEPS = [1, 3, 5, 10, 15, 20, 30, 40, 50, 60, 100, 150, 200]
+
+# Market types preferred when several markets share an alias, bots trade futures by default
+TYPE_PRIORITY = {'swap': 0, 'future': 1, 'spot': 2}
+
+# Market types used to convert between currencies, spot prices first, linear derivatives as a fallback
+CONVERSION_PRIORITY = {'spot': 0, 'swap': 1, 'future': 2}
+
+
+class MarketIndex(object):
+    """
+    Precomputed symbol lookup for one exchange.
+
+    Every alias of a market ('BTC-USDT', 'BTC/USDT', 'BTCUSDT', 'BTC/USDT:USDT',
+    the exchange market id and the inverted 'USDT/BTC' forms) maps to a single
+    canonical record, so resolving a symbol is one dictionary hit.
+    """
+
+    def __init__(self, markets, leverage_tiers=None):
+        self.markets = markets
+        self.leverage_tiers = leverage_tiers or {}
+        self.records = {}
+        self.aliases = {}
+        # Quote-currency graph: currency -> [(priority, other currency, symbol, inverted)]
+        self.conversions = {}
+        self.paths = {}
+        for symbol, market in markets.items():
+            self.add_market(symbol, market)
+        for edges in self.conversions.values():
+            edges.sort()
+
+    def add_market(self, symbol, market):
+        base = market.get('base')
+        quote = market.get('quote')
+        settle = market.get('settle')
+        tiers = self.leverage_tiers.get(symbol) or []
+        max_leverage = max([tier.get('maxLeverage') or 0 for tier in tiers] or [0])
+        if not max_leverage:
+            max_leverage = ((market.get('limits') or {}).get('leverage') or {}).get('max') or 0
+        record = {
+            'symbol': symbol,
+            'id': market.get('id'),
+            'base': base,
+            'quote': quote,
+            'settle': settle,
+            'type': market.get('type'),
+            'inverse': bool(market.get('inverse')),
+            'market': market,
+            'leverage_tiers': tiers,
+            'max_leverage': max_leverage,
+        }
+        self.records[symbol] = record
+
+        # A bare 'BTC/USDT' competes with the derivatives aliases, the pair list strips the settle suffix
+        self.add_alias(symbol, record, 0 if ':' in symbol else 1)
+        self.add_alias(market.get('id'), record, 1)
+        if base and quote:
+            for alias in [f"{base}/{quote}", f"{base}-{quote}", f"{base}{quote}"]:
+                self.add_alias(alias, record, 1)
+            if settle:
+                self.add_alias(f"{base}-{quote}:{settle}", record, 1)
+            # Inverted forms resolve to the same record so callers can detect and undo them
+            for alias in [f"{quote}/{base}", f"{quote}-{base}", f"{quote}{base}"]:
+                self.add_alias(alias, record, 2)
+            self.add_conversion(base, quote, symbol, market)
+
+    def add_conversion(self, base, quote, symbol, market):
+        """Add a market as an edge of the quote-currency graph, inverse contracts are not priced in their quote."""
+        priority = CONVERSION_PRIORITY.get(market.get('type'))
+        if priority is None or market.get('inverse') or market.get('active') is False:
+            return
+        # Walking base -> quote multiplies by the price, quote -> base divides by it
+        self.conversions.setdefault(base, []).append((priority, quote, symbol, False))
+        self.conversions.setdefault(quote, []).append((priority, base, symbol, True))
+
+    def add_alias(self, alias, record, rank):
+        """Map `alias` to `record`. Lower ranks win, ties prefer the market type bots actually trade."""
+        if not alias:
+            return
+        key = alias.upper()
+        priority = (rank, TYPE_PRIORITY.get(record['type'], len(TYPE_PRIORITY)))
+        current = self.aliases.get(key)
+        if current is None or priority < current[0]:
+            self.aliases[key] = (priority, record)
+
+    def resolve(self, symbol):
+        """Return the canonical market record for any alias of `symbol`, or None."""
+        if not symbol:
+            return None
+        entry = self.aliases.get(symbol.upper())
+        return entry[1] if entry else None
+
+    def leverage_options(self, symbol):
+        """Return the selectable leverage steps for `symbol` or None if the market has no leverage limits."""
+        record = self.resolve(symbol)
+        if record is None or not record['max_leverage']:
+            return None
+        return ['{}x'.format(i) for i in LEVERAGE_STEPS if i <= record['max_leverage']]
+
+    def conversion_path(self, currency, target):
+        """
+        Return the markets converting `currency` into `target` with the fewest hops, as a list
+        of (symbol, inverted) steps, [] when they are the same currency and None when no path exists.
+        Paths are computed once per index.
+        """
+        key = (currency, target)
+        if key in self.paths:
+            return self.paths[key]
+        path = [] if currency == target else None
+        if path is None and currency in self.conversions:
+            previous = {currency: None}
+            frontier = [currency]
+            while frontier and target not in previous:
+                next_frontier = []
+                for node in frontier:
+                    for _, other, symbol, inverted in self.conversions.get(node, ()):
+                        if other not in previous:
+                            previous[other] = (node, symbol, inverted)
+                            next_frontier.append(other)
+                frontier = next_frontier
+            if target in previous:
+                path = []
+                node = target
+                while previous[node] is not None:
+                    node, symbol, inverted = previous[node]
+                    path.append((symbol, inverted))
+                path.reverse()
+        self.paths[key] = path
+        return path
@@ -0,0 +1,182 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from classes.log import get_logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Stage durations of the signal being executed in the current context
+current_trace = contextvars.ContextVar('current_trace', default=None)
+
+logger = get_logger('slow_signals')
+
+
+class Histogram(object):
+    """Cumulative Prometheus histogram, one series per label set."""
+
+    def __init__(self, name, description, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # Per-bucket counts plus the sum and the count of observations
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {values[-2]}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {values[-1]}")
+        return lines
+
+
+class Metrics(object):
+    """
+    Timing histograms of the signal pipeline and the exchange requests.
+
+    span() times one stage. Inside a trace() the stage durations are also collected for
+    the signal being executed, and signals slower than `slow_signal_threshold` seconds
+    are logged with their stage breakdown.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.slow_signal_threshold = 5.0
+        self.histograms = {}
+        self.gauges = []
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', self.enabled)
+        self.slow_signal_threshold = app.config.get('SLOW_SIGNAL_THRESHOLD', self.slow_signal_threshold)
+
+    def histogram(self, name, description):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram(name, description))
+        return histogram
+
+    def observe(self, name, description, value, **labels):
+        if self.enabled:
+            self.histogram(name, description).observe(value, tuple(sorted(labels.items())))
+
+    def register_gauge(self, name, description, callback):
+        """Register a gauge whose `callback()` returns a list of (labels dict, value) pairs."""
+        self.gauges.append((name, description, callback))
+
+    @contextmanager
+    def timed(self, name, description, trace_key=None, **labels):
+        """Observe the duration of the block into histogram `name`, and into the current trace as `trace_key`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe(name, description, elapsed, **labels)
+            if trace_key is not None:
+                add_to_trace(trace_key, elapsed)
+
+    def span(self, stage, **labels):
+        """Time a stage of the signal pipeline."""
+        return self.timed('easymarket_signal_stage_seconds', 'Duration of each signal pipeline stage.', stage,
+                          stage=stage, **labels)
+
+    def observe_stage(self, stage, elapsed, **labels):
+        """Record a stage timed outside span(), e.g. a wait that ends in another thread."""
+        self.observe('easymarket_signal_stage_seconds', 'Duration of each signal pipeline stage.', elapsed,
+                     stage=stage, **labels)
+        add_to_trace(stage, elapsed)
+
+    def exchange_request(self, exchange, endpoint):
+        """Time one exchange request."""
+        return self.timed('easymarket_exchange_request_seconds', 'Duration of each exchange request.',
+                          f"exchange.{endpoint}", exchange=exchange, endpoint=endpoint)
+
+    def start_trace(self, name, **labels):
+        """Start the stage breakdown of one signal, finish_trace() ends it, possibly in another thread."""
+        return {'name': name, 'labels': labels, 'stages': {}, 'started': time.perf_counter()}
+
+    @contextmanager
+    def traced(self, trace):
+        """Make `trace` the current trace of the block, its spans are added to it."""
+        token = current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            current_trace.reset(token)
+
+    def finish_trace(self, trace, status):
+        """Time the whole signal and log its stage breakdown when it was slow."""
+        elapsed = time.perf_counter() - trace['started']
+        labels = trace['labels']
+        self.observe('easymarket_signal_seconds', 'Total duration of a signal.', elapsed, status=status, **labels)
+        if elapsed >= self.slow_signal_threshold:
+            breakdown = ', '.join(f"{stage}={duration:.3f}s" for stage, duration in trace['stages'].items())
+            logger.warning("Slow signal %s took %.3fs (%s): %s", trace['name'], elapsed, status, breakdown,
+                           extra=labels)
+
+    @contextmanager
+    def trace(self, name, **labels):
+        """Collect the stage breakdown of one signal and time the whole signal."""
+        trace = self.start_trace(name, **labels)
+        status = 'error'
+        try:
+            with self.traced(trace):
+                yield trace
+            status = 'ok'
+        finally:
+            self.finish_trace(trace, status)
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+        for histogram in list(self.histograms.values()):
+            lines.extend(histogram.render())
+        for name, description, callback in self.gauges:
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} gauge"]
+            for labels, value in callback():
+                lines.append(f"{name}{format_labels(tuple(sorted(labels.items())))} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+def add_to_trace(stage, elapsed):
+    trace = current_trace.get()
+    if trace is not None:
+        trace['stages'][stage] = trace['stages'].get(stage, 0.0) + elapsed
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+
+# Create a global variable for the metrics object
+metrics = Metrics()
+
+
+# Define a function to configure the metrics from the Flask app config
+def init_metrics(app):
+    metrics.init_app(app)
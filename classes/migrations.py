@@ -0,0 +1,135 @@
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+
+from database import db
+from classes.models import Accounts, BalanceHistory, BotDailyStats, Bots, BotFees, CacheVersions, Positions, Signals
+from classes.log import get_logger
+
+logger = get_logger('migrations')
+
+# Applied versions are recorded here, a database without the table is at version 0
+schema_migrations = Table('schema_migrations', MetaData(),
+                          Column('version', Integer, primary_key=True),
+                          Column('description', String(255), nullable=False),
+                          Column('applied_at', DateTime, nullable=False))
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Register `func(connection)` as schema migration `version`. Migrations must be safe to re-run."""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def get_index(model, name):
+    return next(index for index in model.__table__.indexes if index.name == name)
+
+
+def create_indexes(connection, indexes):
+    existing = {}
+    for index in indexes:
+        table = index.table.name
+        if table not in existing:
+            existing[table] = {i['name'] for i in inspect(connection).get_indexes(table)}
+        if index.name not in existing[table]:
+            index.create(connection)
+
+
+@migration(1, 'Baseline schema')
+def create_baseline(connection):
+    # Databases made by create_db already have the tables, only missing ones are created
+    db.metadata.create_all(connection)
+
+
+@migration(2, 'Add bots.signal_group')
+def add_bots_signal_group(connection):
+    columns = {column['name'] for column in inspect(connection).get_columns('bots')}
+    if 'signal_group' not in columns:
+        connection.execute(text('ALTER TABLE bots ADD COLUMN signal_group VARCHAR(64)'))
+
+
+@migration(3, 'Index hot lookup columns')
+def add_lookup_indexes(connection):
+    create_indexes(connection, [
+        get_index(Positions, 'ix_positions_order_id'),
+        get_index(Positions, 'ix_positions_bot_id_status'),
+        get_index(Positions, 'ix_positions_user_id_entry_time'),
+        get_index(Signals, 'ix_signals_bot_id_created_at'),
+        get_index(Bots, 'ix_bots_user_id'),
+        get_index(Accounts, 'ix_accounts_user_id'),
+        get_index(BotFees, 'ix_botfees_bot_id'),
+    ])
+
+
+@migration(4, 'Journal columns on signals')
+def add_signal_journal_columns(connection):
+    columns = {column['name'] for column in inspect(connection).get_columns('signals')}
+    for name, ddl in (('payload', 'TEXT'), ('outcome', 'VARCHAR(16)'), ('error', 'VARCHAR(255)'),
+                      ('latency', 'FLOAT')):
+        if name not in columns:
+            connection.execute(text(f'ALTER TABLE signals ADD COLUMN {name} {ddl}'))
+    create_indexes(connection, [get_index(Signals, 'ix_signals_created_at')])
+
+
+@migration(5, 'Cache version counters')
+def add_cache_versions(connection):
+    CacheVersions.__table__.create(connection, checkfirst=True)
+
+
+@migration(6, 'Per-bot daily statistics')
+def add_bot_daily_stats(connection):
+    BotDailyStats.__table__.create(connection, checkfirst=True)
+
+
+@migration(7, 'Account balance history')
+def add_balance_history(connection):
+    BalanceHistory.__table__.create(connection, checkfirst=True)
+
+
+@migration(8, 'Index signal groups per user')
+def index_signal_groups_per_user(connection):
+    create_indexes(connection, [get_index(Bots, 'ix_bots_user_id_signal_group')])
+    connection.execute(text('DROP INDEX IF EXISTS ix_bots_signal_group'))
+
+
+def get_current_version(connection):
+    if not inspect(connection).has_table(schema_migrations.name):
+        return 0
+    versions = [row[0] for row in connection.execute(select(schema_migrations.c.version))]
+    return max(versions, default=0)
+
+
+def upgrade(engine=None, target=None):
+    """
+    Apply the pending migrations up to `target` (default: latest), each in its own transaction.
+
+    Returns:
+        list: The (version, description) of the applied migrations.
+    """
+    engine = engine or db.engine
+    applied = []
+    with engine.begin() as connection:
+        schema_migrations.create(connection, checkfirst=True)
+        current = get_current_version(connection)
+    for version, description, func in MIGRATIONS:
+        if version <= current or (target is not None and version > target):
+            continue
+        with engine.begin() as connection:
+            func(connection)
+            connection.execute(schema_migrations.insert().values(version=version, description=description,
+                                                                 applied_at=datetime.utcnow()))
+        logger.info("Applied migration %s: %s", version, description)
+        applied.append((version, description))
+    return applied
+
+
+def status(engine=None):
+    """Return the current schema version and the (version, description) of the pending migrations."""
+    with (engine or db.engine).connect() as connection:
+        current = get_current_version(connection)
+    return current, [(version, description) for version, description, _ in MIGRATIONS if version > current]
@@ -1,5 +1,5 @@
 from flask_security import RoleMixin, UserMixin
-from database import db
+from database import db, commit
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -11,6 +11,10 @@ roles_users = db.Table('roles_users',
 
 class Bots(db.Model):
     __tablename__ = 'bots'
+    __table_args__ = (
+        # Signal group names are only unique per user, the webhook looks groups up by owner
+        db.Index('ix_bots_user_id_signal_group', 'user_id', 'signal_group'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), unique=False, nullable=False)
     enabled = db.Column(db.Boolean(), nullable=False)
@@ -24,9 +28,10 @@ class Bots(db.Model):
     description = db.Column(db.String(512), nullable=True)
     time_interval = db.Column(db.String(32), nullable=False)
     type = db.Column(db.String(15))
+    signal_group = db.Column(db.String(64), nullable=True)
     exchange_id = db.Column(db.Integer, db.ForeignKey('exchangemodels.id'), nullable=False)
     account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
 
     accounts = relationship('Accounts', back_populates='bots')
     signals = relationship('Signals', back_populates='bots')
@@ -40,7 +45,7 @@ class Bots(db.Model):
 class BotFees(db.Model):
     __tablename__ = 'botfees'
     id = db.Column(db.Integer, primary_key=True)
-    bot_id = db.Column(db.Integer, db.ForeignKey('bots.id'), nullable=False)
+    bot_id = db.Column(db.Integer, db.ForeignKey('bots.id'), nullable=False, index=True)
     maker_fee = db.Column(db.Float)
     taker_fee = db.Column(db.Float)
 
@@ -70,7 +75,7 @@ class Accounts(db.Model):
     api_secret = db.Column(db.String(256), nullable=False)
     password = db.Column(db.String(256), nullable=True)
     options = db.Column(db.JSON, nullable=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     testnet = db.Column(db.Boolean())
     balance_usdt = db.Column(db.Float, nullable=True)
     balance_total = db.Column(db.Float, nullable=True)
@@ -84,13 +89,21 @@ class Accounts(db.Model):
 
 class Signals(db.Model):
     __tablename__ = 'signals'
+    __table_args__ = (
+        db.Index('ix_signals_bot_id_created_at', 'bot_id', 'created_at'),
+    )
+    # created_at is the time the webhook received the signal
     id = db.Column(db.Integer, primary_key=True)
     bot_id = db.Column(db.Integer, db.ForeignKey('bots.id'), nullable=False)
     exchange_id = db.Column(db.Integer, db.ForeignKey('exchangemodels.id'), nullable=False)
     symbol = db.Column(db.String(16), nullable=False)
     signal_type = db.Column(db.String(16), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.now)
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    payload = db.Column(db.Text, nullable=True)
+    outcome = db.Column(db.String(16), nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+    latency = db.Column(db.Float, nullable=True)
 
     bots = relationship('Bots', back_populates='signals')
     exchangemodels = relationship('ExchangeModels')
@@ -101,6 +114,10 @@ class Signals(db.Model):
 
 class Positions(db.Model):
     __tablename__ = 'positions'
+    __table_args__ = (
+        db.Index('ix_positions_bot_id_status', 'bot_id', 'status'),
+        db.Index('ix_positions_user_id_entry_time', 'user_id', 'entry_time'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     bot_id = db.Column(db.Integer, db.ForeignKey('bots.id'), nullable=False)
     symbol = db.Column(db.String(16), nullable=False)
@@ -109,7 +126,7 @@ class Positions(db.Model):
     entry_time = db.Column(db.DateTime, nullable=False)
     exit_price = db.Column(db.Float, nullable=True)
     exit_time = db.Column(db.DateTime, nullable=True)
-    order_id = db.Column(db.String(64), nullable=False)
+    order_id = db.Column(db.String(64), nullable=False, index=True)
     order_quantity = db.Column(db.Float, nullable=False)
     order_type = db.Column(db.String(10), nullable=False)
     position_type = db.Column(db.String(10), nullable=False)
@@ -127,12 +144,72 @@ class Positions(db.Model):
 
     def save(self):
         db.session.add(self)
-        db.session.commit()
+        commit()
 
     def __repr__(self):
         return f"<Position {self.signal_type} {self.symbol}>"
 
 
+class BotDailyStats(db.Model):
+    __tablename__ = 'bot_daily_stats'
+    __table_args__ = (
+        db.UniqueConstraint('bot_id', 'day', name='uq_bot_daily_stats_bot_id_day'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    bot_id = db.Column(db.Integer, db.ForeignKey('bots.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    day = db.Column(db.Date, nullable=False)
+    # Positions closed on the day
+    trades = db.Column(db.Integer, nullable=False, default=0)
+    wins = db.Column(db.Integer, nullable=False, default=0)
+    losses = db.Column(db.Integer, nullable=False, default=0)
+    realized_pnl = db.Column(db.Float, nullable=False, default=0.0)
+    fees = db.Column(db.Float, nullable=False, default=0.0)
+    gross_profit = db.Column(db.Float, nullable=False, default=0.0)
+    gross_loss = db.Column(db.Float, nullable=False, default=0.0)
+    # Running values of the bot at the end of the day
+    total_trades = db.Column(db.Integer, nullable=False, default=0)
+    total_wins = db.Column(db.Integer, nullable=False, default=0)
+    total_pnl = db.Column(db.Float, nullable=False, default=0.0)
+    total_fees = db.Column(db.Float, nullable=False, default=0.0)
+    total_gross_profit = db.Column(db.Float, nullable=False, default=0.0)
+    total_gross_loss = db.Column(db.Float, nullable=False, default=0.0)
+    peak_pnl = db.Column(db.Float, nullable=False, default=0.0)
+    max_drawdown = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f"<BotDailyStats {self.bot_id} {self.day}>"
+
+
+class BalanceHistory(db.Model):
+    __tablename__ = 'balance_history'
+    __table_args__ = (
+        db.UniqueConstraint('account_id', 'resolution', 'chunk_start',
+                            name='uq_balance_history_account_id_resolution_chunk_start'),
+    )
+    # One chunk holds a fixed number of consecutive buckets of one resolution as packed float64
+    # arrays, bucket i starts at chunk_start + i * resolution seconds and NaN marks a missing sample
+    id = db.Column(db.Integer, primary_key=True)
+    account_id = db.Column(db.Integer, db.ForeignKey('accounts.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    resolution = db.Column(db.String(4), nullable=False)
+    chunk_start = db.Column(db.Integer, nullable=False)
+    balance_total = db.Column(db.LargeBinary, nullable=False)
+    balance_usdt = db.Column(db.LargeBinary, nullable=False)
+
+    def __repr__(self):
+        return f"<BalanceHistory {self.account_id} {self.resolution} {self.chunk_start}>"
+
+
+class CacheVersions(db.Model):
+    __tablename__ = 'cache_versions'
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<CacheVersion {self.name} {self.version}>"
+
+
 class Role(db.Model, RoleMixin):
     __tablename__ = 'role'
     id = db.Column(db.Integer(), primary_key=True)
@@ -0,0 +1,148 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class OrderRequest(object):
+    def __init__(self, symbol, order_type, side, amount, price=None, params=None):
+        self.symbol = symbol
+        self.type = order_type
+        self.side = side
+        self.amount = amount
+        self.price = price
+        self.params = params or {}
+        self.future = Future()
+
+    def to_dict(self):
+        return {'symbol': self.symbol, 'type': self.type, 'side': self.side, 'amount': self.amount,
+                'price': self.price, 'params': self.params}
+
+
+class OrderBatcher(object):
+    """
+    Collects the orders of one account for `window` seconds and submits them together.
+
+    Exchanges with a batch order endpoint get one create_orders call per batch, other
+    exchanges get the single orders in parallel. Every caller waits on the future of
+    its own order, so results and errors route back to the bot that placed them.
+    """
+
+    def __init__(self, exchange_client, pool, window=0.005, max_size=5):
+        self.exchange_client = exchange_client
+        self.pool = pool
+        self.window = window
+        self.max_size = max_size
+        self.pending = []
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def submit(self, symbol, order_type, side, amount, price=None, params=None):
+        """Queue an order and return a Future that resolves with the exchange's order."""
+        request = OrderRequest(symbol, order_type, side, amount, price, params)
+        if self.window <= 0:
+            self.execute([request])
+            return request.future
+
+        with self.lock:
+            self.pending.append(request)
+            if len(self.pending) >= self.max_size:
+                batch = self.take_batch()
+            else:
+                batch = None
+                if self.timer is None:
+                    self.timer = threading.Timer(self.window, self.flush)
+                    self.timer.daemon = True
+                    self.timer.start()
+        if batch:
+            self.execute(batch)
+        return request.future
+
+    def take_batch(self):
+        batch, self.pending = self.pending, []
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        return batch
+
+    def flush(self):
+        with self.lock:
+            batch = self.take_batch()
+        if batch:
+            self.execute(batch)
+
+    def execute(self, batch):
+        client = self.exchange_client
+        if len(batch) > 1 and client.exchange_instance.has.get('createOrders'):
+            try:
+                orders = client.call('create_orders', [request.to_dict() for request in batch])
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                return
+            # The exchange answers in request order, rejected entries come back without an id
+            for request, order in zip(batch, orders):
+                if order and order.get('id'):
+                    request.future.set_result(order)
+                else:
+                    request.future.set_exception(
+                        ValueError(f"Order rejected by {client.exchange_name}: {(order or {}).get('info')}"))
+            for request in batch[len(orders):]:
+                request.future.set_exception(ValueError(f"No response from {client.exchange_name} for order"))
+            return
+
+        if len(batch) == 1:
+            self.execute_single(batch[0])
+        else:
+            for request in batch:
+                self.pool.submit(self.execute_single, request)
+
+    def execute_single(self, request):
+        try:
+            order = self.exchange_client.call('create_order', request.symbol, request.type, request.side,
+                                              request.amount, request.price, request.params)
+            request.future.set_result(order)
+        except Exception as e:
+            request.future.set_exception(e)
+
+
+class OrderBatcherRegistry(object):
+    """One OrderBatcher per account."""
+
+    def __init__(self):
+        self.batchers = {}
+        self.lock = threading.Lock()
+        self.window = 0.005
+        self.max_size = 5
+        self.pool = None
+
+    def init_app(self, app):
+        self.window = app.config.get('ORDER_BATCH_WINDOW_MS', self.window * 1000) / 1000.0
+        self.max_size = app.config.get('ORDER_BATCH_SIZE', self.max_size)
+
+    def get(self, exchange_client):
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='order')
+            batcher = self.batchers.get(exchange_client.account_id)
+            if batcher is None:
+                batcher = OrderBatcher(exchange_client, self.pool, self.window, self.max_size)
+                self.batchers[exchange_client.account_id] = batcher
+            else:
+                # Keep the newest client so credential changes reach the next batch
+                batcher.exchange_client = exchange_client
+            return batcher
+
+    def release(self, account_id):
+        """Drop the account's batcher, orders it already queued are still submitted."""
+        with self.lock:
+            batcher = self.batchers.pop(account_id, None)
+        if batcher is not None:
+            batcher.flush()
+
+
+# Create a global variable for the order batcher registry
+order_batchers = OrderBatcherRegistry()
+
+
+# Define a function to configure the order batchers from the Flask app config
+def init_order_batchers(app):
+    order_batchers.init_app(app)
@@ -0,0 +1,146 @@
+from classes.client_pool import client_pool
+from classes.log import get_logger
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = get_logger('portfolio')
+
+# Currency every holding is valued in
+VALUATION_CURRENCY = 'USDT'
+
+
+def ticker_price(ticker):
+    """Last price of a ticker, the bid/ask mid or the close when the exchange does not report one."""
+    if ticker.get('last'):
+        return float(ticker['last'])
+    if ticker.get('bid') and ticker.get('ask'):
+        return (float(ticker['bid']) + float(ticker['ask'])) / 2
+    if ticker.get('close'):
+        return float(ticker['close'])
+    return None
+
+
+def path_rate(path, prices):
+    """Multiply the prices along a conversion path, None when a market of the path has no price."""
+    rate = 1.0
+    for symbol, inverted in path:
+        price = prices.get(symbol)
+        if not price:
+            return None
+        rate = rate / price if inverted else rate * price
+    return rate
+
+
+def get_rates(exchange_client, currencies, target=VALUATION_CURRENCY):
+    """
+    Return the conversion rate of each currency into `target` on the client's exchange,
+    fetching the prices of every market on the conversion paths in one request.
+
+    Returns:
+        dict: currency -> rate, None for currencies without a path or a price.
+    """
+    index = exchange_client.market_index()
+    paths = {currency: index.conversion_path(currency, target) for currency in currencies}
+    symbols = sorted({symbol for path in paths.values() if path for symbol, _ in path})
+    tickers = exchange_client.get_tickers(symbols) if symbols else {}
+    prices = {symbol: ticker_price(ticker) for symbol, ticker in tickers.items()}
+    return {currency: path_rate(path, prices) if path is not None else None for currency, path in paths.items()}
+
+
+def convert(exchange_client, currency, amount, target=VALUATION_CURRENCY):
+    """Value `amount` of `currency` in `target`, None when it cannot be priced."""
+    rate = get_rates(exchange_client, [currency], target)[currency]
+    return amount * rate if rate is not None else None
+
+
+def value_matrix(amounts, rates):
+    """
+    Value an accounts x currencies matrix of amounts with a vector of rates, NaN for unpriced currencies.
+
+    Returns:
+        tuple: (values matrix, total per account, total per currency), unpriced values count as 0 in the totals.
+    """
+    if np is not None:
+        values = np.asarray(amounts, dtype=float) * np.asarray(rates, dtype=float)
+        return values.tolist(), np.nansum(values, axis=1).tolist(), np.nansum(values, axis=0).tolist()
+    values = [[amount * rate for amount, rate in zip(row, rates)] for row in amounts]
+    finite = [[value if value == value else 0.0 for value in row] for row in values]
+    return values, [sum(row) for row in finite], [sum(column) for column in zip(*finite)]
+
+
+def get_holdings(exchange_client):
+    """Non-zero total balances of the client's account, from the shared balance snapshot."""
+    totals = exchange_client.get_balance_snapshot()['total']
+    return {currency: float(amount) for currency, amount in totals.items() if amount}
+
+
+def value_accounts(accounts, target=VALUATION_CURRENCY):
+    """
+    Value the holdings of several accounts in `target`.
+
+    Accounts on the same exchange and network share one price request. Each group's
+    holdings are valued as one matrix product, so the cost per account is a balance
+    read and not one ticker request per asset.
+
+    Returns:
+        dict: currency, total, one entry per account with its assets, and the assets
+        of all accounts combined, largest value first.
+    """
+    groups = {}
+    results = []
+    for account in accounts:
+        result = {'id': account.id, 'name': account.name, 'exchange': account.exchangemodels.short,
+                  'testnet': bool(account.testnet), 'total': 0.0, 'assets': [], 'unpriced': [], 'error': None}
+        results.append(result)
+        try:
+            exchange_client = client_pool.get(account)
+            holdings = get_holdings(exchange_client)
+        except Exception as e:
+            logger.error("Error loading the balance of account %s: %s", account.id, e)
+            result['error'] = str(e)
+            continue
+        group = groups.setdefault(exchange_client.market_cache_key(), (exchange_client, []))
+        group[1].append((result, holdings))
+
+    assets = {}
+    for exchange_client, members in groups.values():
+        currencies = sorted({currency for _, holdings in members for currency in holdings})
+        if not currencies:
+            continue
+        try:
+            rates = get_rates(exchange_client, currencies, target)
+        except Exception as e:
+            logger.error("Error loading prices on %s: %s", exchange_client.exchange_name, e)
+            rates = {}
+        rate_vector = [rates.get(currency) if rates.get(currency) is not None else float('nan')
+                       for currency in currencies]
+        amounts = [[holdings.get(currency, 0.0) for currency in currencies] for _, holdings in members]
+        values, account_totals, asset_totals = value_matrix(amounts, rate_vector)
+
+        for (result, holdings), row, total in zip(members, values, account_totals):
+            result['total'] = total
+            for currency, value, rate in zip(currencies, row, rate_vector):
+                if currency not in holdings:
+                    continue
+                priced = rate == rate
+                result['assets'].append({'asset': currency, 'amount': holdings[currency],
+                                         'price': rate if priced else None, 'value': value if priced else None})
+                if not priced:
+                    result['unpriced'].append(currency)
+            result['assets'].sort(key=lambda entry: entry['value'] or 0.0, reverse=True)
+
+        # The same currency held on several exchanges is combined
+        for currency, column, value in zip(currencies, zip(*amounts), asset_totals):
+            asset = assets.setdefault(currency, {'asset': currency, 'amount': 0.0, 'value': 0.0})
+            asset['amount'] += sum(column)
+            asset['value'] += value
+
+    return {
+        'currency': target,
+        'total': sum(result['total'] for result in results),
+        'accounts': results,
+        'assets': sorted(assets.values(), key=lambda entry: entry['value'], reverse=True),
+    }
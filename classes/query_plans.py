@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from database import db
+from classes.models import Accounts, Bots, Positions, Signals
+
+# Hot queries of the webhook and the pages, with the index each one must use
+HOT_QUERIES = [
+    ('update_position', lambda: Positions.query.filter_by(order_id='1'), 'ix_positions_order_id'),
+    ('get_position', lambda: Positions.query.filter_by(bot_id=1, status='open'), 'ix_positions_bot_id_status'),
+    ('user_positions', lambda: Positions.query.filter_by(user_id=1).order_by(Positions.entry_time.desc()),
+     'ix_positions_user_id_entry_time'),
+    ('positions_page', lambda: Positions.query.filter_by(user_id=1).filter(
+        tuple_(Positions.entry_time, Positions.id) < tuple_(datetime(2030, 1, 1), 1)).order_by(
+        Positions.entry_time.desc(), Positions.id.desc()), 'ix_positions_user_id_entry_time'),
+    ('bot_signals', lambda: Signals.query.filter_by(bot_id=1).order_by(Signals.created_at.desc()),
+     'ix_signals_bot_id_created_at'),
+    ('user_bots', lambda: Bots.query.filter_by(user_id=1), 'ix_bots_user_id'),
+    ('signal_group_bots', lambda: Bots.query.filter_by(signal_group='group', user_id=1, enabled=True),
+     'ix_bots_user_id_signal_group'),
+    ('user_accounts', lambda: Accounts.query.filter_by(user_id=1), 'ix_accounts_user_id'),
+]
+
+
+def explain(connection, query):
+    """Return the plan of a query as text, from EXPLAIN QUERY PLAN on SQLite and EXPLAIN elsewhere."""
+    compiled = query.statement.compile(dialect=connection.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = connection.exec_driver_sql(prefix + str(compiled), params).fetchall()
+    return '\n'.join(' '.join(str(value) for value in row) for row in rows)
+
+
+def check_query_plans(engine=None):
+    """
+    Explain every hot query and check it uses its index.
+
+    Returns:
+        list: (name, expected index, uses index, plan) per query.
+    """
+    results = []
+    with (engine or db.engine).connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            # Small tables are scanned sequentially anyway, ask which plan the index allows
+            connection.exec_driver_sql('SET enable_seqscan = off')
+        for name, build_query, index in HOT_QUERIES:
+            plan = explain(connection, build_query())
+            results.append((name, index, index in plan, plan))
+    return results
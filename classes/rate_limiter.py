@@ -0,0 +1,161 @@
+import heapq
+import itertools
+import threading
+import time
+
+# Request weight of each ccxt endpoint, unknown endpoints cost 1
+ENDPOINT_COSTS = {
+    'create_order': 1,
+    'create_orders': 5,
+    'cancel_order': 1,
+    'fetch_order': 2,
+    'fetch_open_orders': 3,
+    'fetch_orders': 5,
+    'fetch_ticker': 1,
+    'fetch_tickers': 40,
+    'fetch_balance': 5,
+    'fetch_trading_fee': 1,
+    'fetch_trading_fees': 1,
+    'fetch_leverage_tiers': 1,
+    'load_markets': 10,
+    'transfer': 1,
+}
+
+# Lower lanes are served first, order placement always goes ahead of balance refreshes
+PRIORITY_ORDER = 0
+PRIORITY_FILL = 1
+PRIORITY_MARKET_DATA = 2
+PRIORITY_BALANCE = 3
+PRIORITY_BACKGROUND = 4
+
+ENDPOINT_PRIORITIES = {
+    'create_order': PRIORITY_ORDER,
+    'create_orders': PRIORITY_ORDER,
+    'cancel_order': PRIORITY_ORDER,
+    'fetch_order': PRIORITY_FILL,
+    'fetch_open_orders': PRIORITY_FILL,
+    'fetch_orders': PRIORITY_FILL,
+    'fetch_ticker': PRIORITY_MARKET_DATA,
+    'fetch_tickers': PRIORITY_MARKET_DATA,
+    'fetch_balance': PRIORITY_BALANCE,
+    'fetch_trading_fee': PRIORITY_BACKGROUND,
+    'fetch_trading_fees': PRIORITY_BACKGROUND,
+    'fetch_leverage_tiers': PRIORITY_BACKGROUND,
+    'load_markets': PRIORITY_BACKGROUND,
+}
+
+
+class RateLimitScheduler(object):
+    """
+    Token bucket shared by every client using one exchange API key.
+
+    Tokens refill at `rate` per second up to `capacity`. Each request waits for its endpoint
+    weight in tokens, and waiting requests are served by priority lane, then arrival order.
+    """
+
+    def __init__(self, name, rate, capacity):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.waiters = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.requests = {}
+        self.wait_time = {}
+        self.max_wait = 0.0
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, endpoint, cost=None, priority=None):
+        """Block until `endpoint` may be called. Returns the seconds spent waiting."""
+        # A request heavier than the bucket would never run, it takes the whole bucket instead
+        cost = min(cost or ENDPOINT_COSTS.get(endpoint, 1), self.capacity)
+        if priority is None:
+            priority = ENDPOINT_PRIORITIES.get(endpoint, PRIORITY_BALANCE)
+        started = time.monotonic()
+        ticket = (priority, next(self.sequence))
+        with self.condition:
+            heapq.heappush(self.waiters, ticket)
+            try:
+                while True:
+                    self.refill()
+                    if self.waiters[0] == ticket:
+                        if self.tokens >= cost:
+                            self.tokens -= cost
+                            break
+                        self.condition.wait((cost - self.tokens) / self.rate)
+                    else:
+                        self.condition.wait()
+            finally:
+                self.waiters.remove(ticket)
+                heapq.heapify(self.waiters)
+                self.condition.notify_all()
+
+            waited = time.monotonic() - started
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.wait_time[endpoint] = self.wait_time.get(endpoint, 0.0) + waited
+            self.max_wait = max(self.max_wait, waited)
+        return waited
+
+    def metrics(self):
+        with self.condition:
+            self.refill()
+            return {
+                'name': self.name,
+                'queue_depth': len(self.waiters),
+                'tokens': round(self.tokens, 3),
+                'capacity': self.capacity,
+                'rate': self.rate,
+                'max_wait': self.max_wait,
+                'requests': dict(self.requests),
+                'wait_time': dict(self.wait_time),
+            }
+
+
+class RateLimitRegistry(object):
+    """One RateLimitScheduler per (exchange short name, API key)."""
+
+    def __init__(self):
+        self.schedulers = {}
+        self.lock = threading.Lock()
+        self.burst = 10
+        self.sequence = itertools.count(1)
+
+    def init_app(self, app):
+        self.burst = app.config.get('RATE_LIMIT_BURST', self.burst)
+
+    def get(self, exchange_name, api_key, rate_limit_ms):
+        """Return the scheduler of an API key. `rate_limit_ms` is the ccxt rateLimit of the exchange."""
+        key = (exchange_name, api_key)
+        with self.lock:
+            scheduler = self.schedulers.get(key)
+            if scheduler is None:
+                # Numbered per registry, metric labels never carry any part of the credentials
+                name = f"{exchange_name}:{next(self.sequence)}"
+                scheduler = RateLimitScheduler(name, 1000.0 / max(rate_limit_ms, 1), self.burst)
+                self.schedulers[key] = scheduler
+            return scheduler
+
+    def release(self, exchange_name, api_key):
+        """Drop the scheduler of an API key, requests already waiting on it are still served."""
+        with self.lock:
+            self.schedulers.pop((exchange_name, api_key), None)
+
+    def metrics(self):
+        with self.lock:
+            schedulers = list(self.schedulers.values())
+        return [scheduler.metrics() for scheduler in schedulers]
+
+
+# Create a global variable for the rate limit registry
+rate_limits = RateLimitRegistry()
+
+
+# Define a function to configure the rate limits from the Flask app config
+def init_rate_limits(app):
+    rate_limits.init_app(app)
@@ -0,0 +1,166 @@
+import atexit
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from database import db
+from classes.models import Signals
+from classes.log import get_logger
+
+logger = get_logger('signal_journal')
+
+# Longest raw payload kept per signal, bounds the memory of the buffer together with max_buffer
+MAX_PAYLOAD_LENGTH = 2048
+
+# Seconds between two retention sweeps
+RETENTION_SWEEP_INTERVAL = 3600
+
+
+class SignalJournal(object):
+    """
+    Write-behind journal of the TradingView signals in the Signals table.
+
+    record() only appends the row to an in-memory buffer, a background thread writes the
+    buffer every `flush_interval` seconds, or as soon as `batch_size` rows are waiting, with
+    one multi-row insert per batch. The buffer holds at most `max_buffer` rows, the oldest
+    rows are dropped and counted when the database falls behind. Rows older than
+    `retention_days` are deleted by the same thread, the buffer is flushed on shutdown.
+    """
+
+    def __init__(self, max_buffer=10000, batch_size=500, flush_interval=1.0, retention_days=30):
+        self.app = None
+        self.max_buffer = max_buffer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.buffer = deque()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.written = 0
+        self.dropped = 0
+        self.swept_at = 0.0
+
+    def init_app(self, app):
+        self.app = app
+        self.max_buffer = app.config.get('SIGNAL_JOURNAL_BUFFER', self.max_buffer)
+        self.batch_size = app.config.get('SIGNAL_JOURNAL_BATCH', self.batch_size)
+        self.flush_interval = app.config.get('SIGNAL_JOURNAL_FLUSH_INTERVAL', self.flush_interval)
+        self.retention_days = app.config.get('SIGNAL_RETENTION_DAYS', self.retention_days)
+        atexit.register(self.shutdown)
+
+    def entry(self, bot, signal, payload, received_at=None):
+        """Start the journal row of a signal for `bot` when the webhook receives it."""
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8', errors='replace')
+        return {
+            'bot_id': bot.id,
+            'exchange_id': bot.exchange_id,
+            'symbol': bot.symbol,
+            'signal_type': signal.split('_')[0],
+            'user_id': bot.user_id,
+            'payload': (payload or '')[:MAX_PAYLOAD_LENGTH],
+            'created_at': received_at or datetime.now(),
+        }
+
+    def record(self, entry, outcome, error=None):
+        """Complete a row started by entry() with its outcome and latency, and queue it for writing."""
+        row = dict(entry, outcome=outcome, error=error[:255] if error else None,
+                   latency=(datetime.now() - entry['created_at']).total_seconds())
+        with self.lock:
+            if len(self.buffer) >= self.max_buffer:
+                self.buffer.popleft()
+                self.dropped += 1
+            self.buffer.append(row)
+            full = len(self.buffer) >= self.batch_size
+        self.start()
+        if full:
+            self.wakeup.set()
+
+    def start(self):
+        if self.thread is None or not self.thread.is_alive():
+            with self.lock:
+                if self.stopped.is_set() or (self.thread is not None and self.thread.is_alive()):
+                    return
+                self.thread = threading.Thread(target=self.run, name='signal-journal', daemon=True)
+                self.thread.start()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+                if time.time() - self.swept_at >= RETENTION_SWEEP_INTERVAL:
+                    self.sweep()
+            except Exception as e:
+                logger.error("Error writing the signal journal: %s", e)
+
+    def flush(self):
+        """Write every buffered row, one multi-row insert per batch. Returns the number of rows written."""
+        written = 0
+        with self.flush_lock:
+            while True:
+                with self.lock:
+                    batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+                if not batch:
+                    return written
+                try:
+                    with self.app.app_context(), db.engine.begin() as connection:
+                        connection.execute(Signals.__table__.insert(), batch)
+                except Exception:
+                    # Put the batch back in front, it is retried on the next flush
+                    with self.lock:
+                        kept = batch[:max(self.max_buffer - len(self.buffer), 0)]
+                        self.buffer.extendleft(reversed(kept))
+                        self.dropped += len(batch) - len(kept)
+                    raise
+                written += len(batch)
+                self.written += len(batch)
+
+    def sweep(self):
+        """Delete the journal rows past the retention period."""
+        self.swept_at = time.time()
+        if not self.retention_days:
+            return 0
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        with self.app.app_context(), db.engine.begin() as connection:
+            deleted = connection.execute(Signals.__table__.delete().where(Signals.created_at < cutoff)).rowcount
+        if deleted:
+            logger.info("Deleted %s journaled signals older than %s days", deleted, self.retention_days)
+        return deleted
+
+    def discard(self, bot_id):
+        """Drop the buffered rows of a bot that is being deleted, waiting for a flush in progress."""
+        with self.flush_lock, self.lock:
+            kept = [row for row in self.buffer if row['bot_id'] != bot_id]
+            discarded = len(self.buffer) - len(kept)
+            self.buffer = deque(kept)
+        return discarded
+
+    def metrics(self):
+        with self.lock:
+            return {'buffered': len(self.buffer), 'written': self.written, 'dropped': self.dropped}
+
+    def shutdown(self):
+        self.stopped.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        if self.app is not None:
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Error flushing the signal journal on shutdown: %s", e)
+
+
+# Create a global variable for the signal journal object
+signal_journal = SignalJournal()
+
+
+# Define a function to initialize the signal journal with the Flask app
+def init_signal_journal(app):
+    signal_journal.init_app(app)
@@ -0,0 +1,314 @@
+import itertools
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+DEFAULT_PRICES = {
+    'BTC/USDT:USDT': 30000.0,
+    'ETH/USDT:USDT': 2000.0,
+    'SOL/USDT:USDT': 25.0,
+    'XRP/USDT:USDT': 0.5,
+}
+
+DEFAULT_SETTINGS = {
+    'latency': 0.0,         # seconds added to every request
+    'partial_fill': 1.0,    # share of the remaining amount filled per matching step
+    'spread': 0.0002,       # relative distance of bid and ask from the mid price
+    'volatility': 0.0,      # relative standard deviation of the mid price per matching step
+    'maker_fee': 0.0002,
+    'taker_fee': 0.0004,
+    'balance': 10000.0,     # starting USDT balance of a new account
+    'prices': None,         # {symbol: mid price}, defaults to DEFAULT_PRICES
+}
+
+
+class SimulatedAccount(object):
+    """In-memory balances and orders of one simulated API key."""
+
+    def __init__(self, balance):
+        self.balances = {'USDT': {'free': float(balance), 'used': 0.0}}
+        self.orders = {}
+        self.lock = threading.RLock()
+
+    def balance(self, currency):
+        return self.balances.setdefault(currency, {'free': 0.0, 'used': 0.0})
+
+
+class SimulatedExchange(object):
+    """
+    Offline exchange with the subset of the ccxt client API the app uses.
+
+    Balances and orders are kept in memory per API key, so every client built for the same
+    account sees the same state. Market orders fill against the simulated bid/ask, limit
+    orders fill once the price crosses them. Each matching step fills `partial_fill` of
+    the remaining amount, steps run on every order, ticker and order status request.
+    Settings come from the account's options, see DEFAULT_SETTINGS.
+    """
+
+    id = 'sim'
+    name = 'Simulated Exchange'
+    accounts = {}
+    accounts_lock = threading.Lock()
+    order_ids = itertools.count(1)
+    timeframes = {'1m': '1m', '5m': '5m', '15m': '15m', '1h': '1h', '4h': '4h', '1d': '1d'}
+    has = {
+        'createOrders': True,
+        'fetchOpenOrders': True,
+        'fetchLeverageTiers': False,
+        'fetchTickers': True,
+    }
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.apiKey = config.get('apiKey') or 'sim'
+        self.rateLimit = config.get('rateLimit', 1)
+        self.settings = dict(DEFAULT_SETTINGS)
+        self.settings.update((config.get('options') or {}).get('sim') or {})
+        self.prices = dict(self.settings['prices'] or DEFAULT_PRICES)
+        self.markets = None
+        with SimulatedExchange.accounts_lock:
+            if self.apiKey not in SimulatedExchange.accounts:
+                SimulatedExchange.accounts[self.apiKey] = SimulatedAccount(self.settings['balance'])
+            self.account = SimulatedExchange.accounts[self.apiKey]
+
+    def set_sandbox_mode(self, enabled):
+        pass
+
+    def sleep(self):
+        if self.settings['latency']:
+            time.sleep(self.settings['latency'])
+
+    # --------- Markets ---------
+
+    def load_markets(self, reload=False, params=None):
+        self.sleep()
+        if self.markets is None or reload:
+            self.markets = {symbol: self.build_market(symbol) for symbol in self.prices}
+        return self.markets
+
+    def set_markets(self, markets, currencies=None):
+        self.markets = markets
+        return markets
+
+    def build_market(self, symbol):
+        base, rest = symbol.split('/')
+        quote, settle = rest.split(':') if ':' in rest else (rest, None)
+        return {
+            'id': f"{base}{quote}",
+            'symbol': symbol,
+            'base': base,
+            'quote': quote,
+            'settle': settle,
+            'type': 'swap' if settle else 'spot',
+            'spot': not settle,
+            'swap': bool(settle),
+            'linear': bool(settle),
+            'inverse': False,
+            'active': True,
+            'contractSize': 1,
+            'precision': {'amount': 0.001, 'price': 0.01},
+            'limits': {
+                'amount': {'min': 0.001, 'max': 100000},
+                'price': {'min': 0.01, 'max': None},
+                'cost': {'min': 5, 'max': None},
+                'leverage': {'min': 1, 'max': 125},
+            },
+            'info': {},
+        }
+
+    def set_price(self, symbol, price):
+        """Move the mid price of `symbol`, resting limit orders are matched on the next step."""
+        self.prices[symbol] = float(price)
+
+    # --------- Market data ---------
+
+    def quote(self, symbol):
+        if symbol not in self.prices:
+            raise ValueError(f"{symbol} is not traded on the simulated exchange")
+        if self.settings['volatility']:
+            self.prices[symbol] *= 1 + random.gauss(0, self.settings['volatility'])
+        mid = self.prices[symbol]
+        return mid * (1 - self.settings['spread']), mid * (1 + self.settings['spread']), mid
+
+    def fetch_ticker(self, symbol, params=None):
+        self.sleep()
+        bid, ask, last = self.quote(symbol)
+        self.match()
+        timestamp = milliseconds()
+        return {'symbol': symbol, 'timestamp': timestamp, 'datetime': iso8601(timestamp), 'bid': bid, 'ask': ask,
+                'last': last, 'close': last, 'info': {}}
+
+    def fetch_tickers(self, symbols=None, params=None):
+        return {symbol: self.fetch_ticker(symbol) for symbol in (symbols or self.prices)}
+
+    def fetch_trading_fee(self, symbol, params=None):
+        self.sleep()
+        return {'symbol': symbol, 'maker': self.settings['maker_fee'], 'taker': self.settings['taker_fee']}
+
+    # --------- Account ---------
+
+    def fetch_balance(self, params=None):
+        self.sleep()
+        self.match()
+        with self.account.lock:
+            balance = {'info': {}, 'free': {}, 'used': {}, 'total': {}}
+            for currency, entry in self.account.balances.items():
+                total = entry['free'] + entry['used']
+                balance[currency] = {'free': entry['free'], 'used': entry['used'], 'total': total}
+                balance['free'][currency] = entry['free']
+                balance['used'][currency] = entry['used']
+                balance['total'][currency] = total
+            return balance
+
+    def transfer(self, code, amount, from_account, to_account, params=None):
+        self.sleep()
+        return {'id': str(next(SimulatedExchange.order_ids)), 'currency': code, 'amount': amount,
+                'fromAccount': from_account, 'toAccount': to_account, 'status': 'ok', 'info': {}}
+
+    # --------- Orders ---------
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        self.sleep()
+        return self.place_order(symbol, type, side, amount, price)
+
+    def create_orders(self, orders, params=None):
+        self.sleep()
+        results = []
+        for order in orders:
+            try:
+                results.append(self.place_order(order['symbol'], order['type'], order['side'], order['amount'],
+                                                order.get('price')))
+            except Exception as e:
+                results.append({'id': None, 'status': 'rejected', 'info': {'error': str(e)}})
+        return results
+
+    def place_order(self, symbol, type, side, amount, price=None):
+        bid, ask, last = self.quote(symbol)
+        amount = float(amount)
+        if amount <= 0:
+            raise ValueError(f"Invalid order amount {amount}")
+        if type == 'limit' and not price:
+            raise ValueError("Limit orders need a price")
+        base, quote = self.currencies(symbol)
+        reserve_price = float(price) if type == 'limit' else ask
+        with self.account.lock:
+            # Buy orders reserve the quote currency they may spend, shorts are margin-free in the simulation
+            if side == 'buy':
+                cost = amount * reserve_price
+                if self.account.balance(quote)['free'] < cost:
+                    raise ValueError(f"Insufficient {quote} balance for order")
+                self.account.balance(quote)['free'] -= cost
+                self.account.balance(quote)['used'] += cost
+            timestamp = milliseconds()
+            order = {
+                'id': str(next(SimulatedExchange.order_ids)),
+                'clientOrderId': None,
+                'timestamp': timestamp,
+                'datetime': iso8601(timestamp),
+                'lastTradeTimestamp': None,
+                'symbol': symbol,
+                'type': type,
+                'side': side,
+                'price': float(price) if price else None,
+                'average': None,
+                'amount': amount,
+                'filled': 0.0,
+                'remaining': amount,
+                'cost': 0.0,
+                'status': 'open',
+                'fee': {'cost': 0.0, 'currency': quote},
+                'trades': [],
+                'info': {'reserved': amount * reserve_price if side == 'buy' else 0.0},
+            }
+            self.account.orders[order['id']] = order
+            self.match_order(order, bid, ask)
+            return dict(order)
+
+    def match(self):
+        """Run one matching step over every open order of the account."""
+        with self.account.lock:
+            for order in list(self.account.orders.values()):
+                if order['status'] == 'open':
+                    bid, ask, last = self.quote(order['symbol'])
+                    self.match_order(order, bid, ask)
+
+    def match_order(self, order, bid, ask):
+        fill_price = ask if order['side'] == 'buy' else bid
+        if order['type'] == 'limit':
+            if order['side'] == 'buy' and ask > order['price'] or order['side'] == 'sell' and bid < order['price']:
+                return
+            fill_price = order['price']
+        filled = order['remaining'] if self.settings['partial_fill'] >= 1 else max(
+            round(order['remaining'] * self.settings['partial_fill'], 8), min(order['remaining'], 0.001))
+        fee_rate = self.settings['taker_fee'] if order['type'] == 'market' else self.settings['maker_fee']
+        base, quote = self.currencies(order['symbol'])
+        cost = filled * fill_price
+        fee = cost * fee_rate
+
+        if order['side'] == 'buy':
+            reserved = filled * (order['price'] or fill_price) if order['type'] == 'limit' else cost
+            reserved = min(reserved, order['info']['reserved'])
+            order['info']['reserved'] -= reserved
+            self.account.balance(quote)['used'] -= reserved
+            self.account.balance(quote)['free'] += reserved - cost - fee
+            self.account.balance(base)['free'] += filled
+        else:
+            self.account.balance(base)['free'] -= filled
+            self.account.balance(quote)['free'] += cost - fee
+
+        order['cost'] += cost
+        order['filled'] = round(order['filled'] + filled, 8)
+        order['remaining'] = round(order['amount'] - order['filled'], 8)
+        order['average'] = order['cost'] / order['filled']
+        order['fee']['cost'] += fee
+        order['lastTradeTimestamp'] = milliseconds()
+        if order['remaining'] <= 0:
+            order['remaining'] = 0.0
+            order['status'] = 'closed'
+            self.release_reserved(order)
+
+    def release_reserved(self, order):
+        base, quote = self.currencies(order['symbol'])
+        if order['info']['reserved']:
+            self.account.balance(quote)['used'] -= order['info']['reserved']
+            self.account.balance(quote)['free'] += order['info']['reserved']
+            order['info']['reserved'] = 0.0
+
+    def fetch_order(self, id, symbol=None, params=None):
+        self.sleep()
+        self.match()
+        with self.account.lock:
+            if id not in self.account.orders:
+                raise ValueError(f"Order {id} not found")
+            return dict(self.account.orders[id])
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        self.sleep()
+        self.match()
+        with self.account.lock:
+            return [dict(order) for order in self.account.orders.values()
+                    if order['status'] == 'open' and (symbol is None or order['symbol'] == symbol)]
+
+    def cancel_order(self, id, symbol=None, params=None):
+        self.sleep()
+        with self.account.lock:
+            order = self.account.orders.get(id)
+            if order is None:
+                raise ValueError(f"Order {id} not found")
+            if order['status'] == 'open':
+                order['status'] = 'canceled'
+                self.release_reserved(order)
+            return dict(order)
+
+    def currencies(self, symbol):
+        base, rest = symbol.split('/')
+        return base, rest.split(':')[0]
+
+
+def milliseconds():
+    return int(time.time() * 1000)
+
+
+def iso8601(timestamp):
+    return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
@@ -0,0 +1,156 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, case, func, tuple_
+
+from database import db
+from classes.models import Bots, ExchangeModels, Positions
+
+MAX_PAGE_SIZE = 500
+
+# Realized PnL of a closed position in the quote currency, net of fees
+realized_pnl = case(
+    (Positions.position_type == 'long', (Positions.exit_price - Positions.entry_price) * Positions.order_quantity),
+    else_=(Positions.entry_price - Positions.exit_price) * Positions.order_quantity,
+) - func.coalesce(Positions.fees, 0.0)
+
+
+class TradeHistoryError(ValueError):
+    """Invalid filter or cursor, reported to the client as a 400."""
+
+
+def parse_datetime(value, name):
+    """Parse an ISO date or datetime into the naive UTC datetimes positions are stored with."""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise TradeHistoryError(f'Invalid {name} "{value}", expected an ISO date or datetime')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_filters(args):
+    """Read the bot_id, symbol, status, from and to filters of a request's query string."""
+    filters = {}
+    if args.get('bot_id'):
+        try:
+            filters['bot_id'] = int(args['bot_id'])
+        except ValueError:
+            raise TradeHistoryError(f'Invalid bot_id "{args["bot_id"]}"')
+    if args.get('symbol'):
+        filters['symbol'] = args['symbol']
+    if args.get('status'):
+        if args['status'] not in ('open', 'closed'):
+            raise TradeHistoryError(f'Invalid status "{args["status"]}", expected open or closed')
+        filters['status'] = args['status']
+    if args.get('from'):
+        filters['from'] = parse_datetime(args['from'], 'from')
+    if args.get('to'):
+        filters['to'] = parse_datetime(args['to'], 'to')
+    return filters
+
+
+def apply_filters(query, user_id, filters):
+    query = query.filter(Positions.user_id == user_id)
+    if 'bot_id' in filters:
+        query = query.filter(Positions.bot_id == filters['bot_id'])
+    if 'symbol' in filters:
+        query = query.filter(Positions.symbol == filters['symbol'])
+    if 'status' in filters:
+        query = query.filter(Positions.status == filters['status'])
+    if 'from' in filters:
+        query = query.filter(Positions.entry_time >= filters['from'])
+    if 'to' in filters:
+        query = query.filter(Positions.entry_time < filters['to'])
+    return query
+
+
+def encode_cursor(entry_time, position_id):
+    data = json.dumps([entry_time.isoformat(), position_id]).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        entry_time, position_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.fromisoformat(entry_time), int(position_id)
+    except (ValueError, TypeError):
+        raise TradeHistoryError('Invalid cursor')
+
+
+def get_positions_page(user_id, filters, limit=50, cursor=None):
+    """
+    Return one page of the user's positions, newest entry first.
+
+    Pages are keyset-paginated on (entry_time, id): the cursor is the last row of the
+    previous page, so every page is an index range scan however deep it is.
+
+    Returns:
+        tuple: (list of position dicts, cursor of the next page or None)
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    query = db.session.query(Positions, Bots.name, ExchangeModels.short,
+                             case((Positions.status == 'closed', realized_pnl), else_=None)) \
+        .join(Bots, Bots.id == Positions.bot_id) \
+        .join(ExchangeModels, ExchangeModels.id == Positions.exchange_id)
+    query = apply_filters(query, user_id, filters)
+    if cursor:
+        entry_time, position_id = decode_cursor(cursor)
+        query = query.filter(tuple_(Positions.entry_time, Positions.id) < tuple_(entry_time, position_id))
+    rows = query.order_by(Positions.entry_time.desc(), Positions.id.desc()).limit(limit + 1).all()
+
+    positions = [position_to_dict(position, bot_name, exchange, pnl) for position, bot_name, exchange, pnl
+                 in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1][0]
+        next_cursor = encode_cursor(last.entry_time, last.id)
+    return positions, next_cursor
+
+
+def get_positions_summary(user_id, filters):
+    """Aggregate the filtered positions in a single SQL query."""
+    closed = Positions.status == 'closed'
+    query = db.session.query(
+        func.count(Positions.id),
+        func.sum(case((closed, 1), else_=0)),
+        func.sum(case((and_(closed, realized_pnl > 0), 1), else_=0)),
+        func.sum(case((closed, realized_pnl), else_=0.0)),
+        func.sum(func.coalesce(Positions.fees, 0.0)),
+    )
+    count, closed_count, wins, pnl, fees = apply_filters(query, user_id, filters).one()
+    closed_count = closed_count or 0
+    wins = wins or 0
+    return {
+        'count': count or 0,
+        'open': (count or 0) - closed_count,
+        'closed': closed_count,
+        'wins': wins,
+        'losses': closed_count - wins,
+        'win_rate': wins / closed_count if closed_count else None,
+        'realized_pnl': float(pnl or 0.0),
+        'fees': float(fees or 0.0),
+    }
+
+
+def position_to_dict(position, bot_name, exchange, pnl):
+    return {
+        'id': position.id,
+        'order_id': position.order_id,
+        'bot_id': position.bot_id,
+        'bot_name': bot_name,
+        'exchange': exchange,
+        'symbol': position.symbol,
+        'position_type': position.position_type,
+        'order_type': position.order_type,
+        'status': position.status,
+        'quantity': position.order_quantity,
+        'entry_price': position.entry_price,
+        'entry_time': position.entry_time.isoformat() if position.entry_time else None,
+        'exit_price': position.exit_price,
+        'exit_time': position.exit_time.isoformat() if position.exit_time else None,
+        'fees': position.fees,
+        'realized_pnl': pnl,
+    }
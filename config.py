@@ -4,4 +4,73 @@ class Config(object):
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'super-secret-key'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///easymarket.db'
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # SQLite pragmas applied to every connection, see database.py
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+    # PostgreSQL connection pool and per-statement timeout (0 disables the timeout)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 10)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 20)
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 1800)
+    DB_POOL_PRE_PING = (os.environ.get('DB_POOL_PRE_PING') or 'true').lower() == 'true'
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS') or 30000)
+    # Log the effective database settings at startup
+    DATABASE_STARTUP_CHECK = (os.environ.get('DATABASE_STARTUP_CHECK') or 'true').lower() == 'true'
+    # Seconds before cached exchange markets are refreshed in the background
+    MARKET_CACHE_TTL = int(os.environ.get('MARKET_CACHE_TTL') or 3600)
+    # Seconds after which a stale market entry is reloaded before it is served
+    MARKET_CACHE_MAX_AGE = int(os.environ.get('MARKET_CACHE_MAX_AGE') or 86400)
+    # Worker threads executing TradingView signals in the background
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 16)
+    # Number of jobs whose status is kept for the /jobs/<id> endpoint
+    JOB_RETENTION = int(os.environ.get('JOB_RETENTION') or 10000)
+    # Bounds in seconds of the adaptive poll interval used to track order fills
+    FILL_POLL_MIN_INTERVAL = float(os.environ.get('FILL_POLL_MIN_INTERVAL') or 1)
+    FILL_POLL_MAX_INTERVAL = float(os.environ.get('FILL_POLL_MAX_INTERVAL') or 30)
+    # Seconds an order may stay open before it is canceled and its signal fails, 0 waits forever
+    FILL_TIMEOUT = float(os.environ.get('FILL_TIMEOUT', 600))
+    # Seconds a streamed ticker is trusted before price lookups fall back to REST
+    TICKER_MAX_AGE = float(os.environ.get('TICKER_MAX_AGE') or 2)
+    # Stream subscribed tickers over websockets when ccxt.pro is available
+    TICKER_STREAMING = (os.environ.get('TICKER_STREAMING') or 'true').lower() == 'true'
+    # Seconds a streamed symbol may go unread before its subscription is dropped
+    TICKER_IDLE_TIMEOUT = float(os.environ.get('TICKER_IDLE_TIMEOUT') or 300)
+    # Most symbols streamed per exchange, the least recently read one is dropped first
+    TICKER_MAX_SYMBOLS = int(os.environ.get('TICKER_MAX_SYMBOLS') or 200)
+    # Seconds an account balance snapshot is reused before fetch_balance is called again
+    BALANCE_CACHE_TTL = float(os.environ.get('BALANCE_CACHE_TTL') or 5)
+    # Threads refreshing account balances in parallel for the accounts page
+    BALANCE_REFRESH_WORKERS = int(os.environ.get('BALANCE_REFRESH_WORKERS') or 8)
+    # Seconds one account's balance refresh may take before it is reported as timed out
+    BALANCE_REFRESH_TIMEOUT = float(os.environ.get('BALANCE_REFRESH_TIMEOUT') or 15)
+    # Seconds between two balance snapshots of every account taken by `manage.py sync_balances`
+    BALANCE_SYNC_INTERVAL = float(os.environ.get('BALANCE_SYNC_INTERVAL') or 60)
+    # Maximum number of per-account exchange clients kept alive
+    EXCHANGE_POOL_SIZE = int(os.environ.get('EXCHANGE_POOL_SIZE') or 64)
+    # Request weight an API key may burst before the rate-limit scheduler queues calls
+    RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST') or 10)
+    # Milliseconds orders of one account are collected into a batch, 0 disables batching
+    ORDER_BATCH_WINDOW_MS = float(os.environ.get('ORDER_BATCH_WINDOW_MS') or 5)
+    # Maximum orders per batch, most batch order endpoints accept 5
+    ORDER_BATCH_SIZE = int(os.environ.get('ORDER_BATCH_SIZE') or 5)
+    # Signal jobs of one account that may run at the same time
+    JOB_MAX_PER_ACCOUNT = int(os.environ.get('JOB_MAX_PER_ACCOUNT') or 4)
+    # Collect stage timing histograms for /metrics
+    METRICS_ENABLED = (os.environ.get('METRICS_ENABLED') or 'true').lower() == 'true'
+    # Bearer token scrapers send to read /metrics, without one only logged-in users can read it
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Seconds after which a signal is logged with its stage breakdown
+    SLOW_SIGNAL_THRESHOLD = float(os.environ.get('SLOW_SIGNAL_THRESHOLD') or 5)
+    # Level and format ('text' or 'json') of the application log
+    LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
+    LOG_FORMAT = os.environ.get('LOG_FORMAT') or 'text'
+    # Buffered rows, rows per insert and seconds between flushes of the signal journal
+    SIGNAL_JOURNAL_BUFFER = int(os.environ.get('SIGNAL_JOURNAL_BUFFER') or 10000)
+    SIGNAL_JOURNAL_BATCH = int(os.environ.get('SIGNAL_JOURNAL_BATCH') or 500)
+    SIGNAL_JOURNAL_FLUSH_INTERVAL = float(os.environ.get('SIGNAL_JOURNAL_FLUSH_INTERVAL') or 1)
+    # Days journaled signals are kept, 0 keeps them forever
+    SIGNAL_RETENTION_DAYS = int(os.environ.get('SIGNAL_RETENTION_DAYS') or 30)
+    # Seconds between checks of the bot config version written by other workers
+    BOT_CACHE_CHECK_INTERVAL = float(os.environ.get('BOT_CACHE_CHECK_INTERVAL') or 1)
@@ -1,10 +1,157 @@
+import contextvars
+from contextlib import contextmanager
+
 from flask_sqlalchemy import SQLAlchemy
 from flask import Flask
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from classes.log import get_logger
+
+logger = get_logger('database')
 
 # Create a global variable for the db object
 db = SQLAlchemy()
 
+# Synchronous levels SQLite reports for PRAGMA synchronous
+SQLITE_SYNCHRONOUS_LEVELS = {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'}
+
+# Session of the unit of work open in the current context. Contexts copied to other threads
+# carry it along, a different session there is not part of that unit of work.
+current_unit_of_work = contextvars.ContextVar('current_unit_of_work', default=None)
+
+
+@contextmanager
+def unit_of_work():
+    """
+    Collect the DB changes of the block into one transaction.
+
+    commit() inside the block only flushes, the session is committed once when the block
+    ends and rolled back if it raises. Nested blocks join the outermost one.
+    """
+    session = db.session()
+    if current_unit_of_work.get() is session:
+        yield db.session
+        return
+    token = current_unit_of_work.set(session)
+    try:
+        yield db.session
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        raise
+    finally:
+        current_unit_of_work.reset(token)
+
+
+def commit() -> None:
+    """Commit the session, or flush it when a unit of work commits at its end."""
+    if current_unit_of_work.get() is db.session():
+        db.session.flush()
+    else:
+        db.session.commit()
+
+
+def release_session() -> None:
+    """
+    End the session's transaction and give its connection back to the pool, call it after the
+    reads of a job and before its slow exchange requests. Loaded objects stay readable, detached.
+    """
+    db.session.close()
+
+
+def is_memory_database(url) -> bool:
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def build_engine_options(config) -> dict:
+    """Return the SQLAlchemy engine options for the configured database URL."""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    connect_args = dict(options.get('connect_args') or {})
+    backend = url.get_backend_name()
+
+    if backend == 'sqlite':
+        # Webhook jobs and requests share connections across threads, the busy timeout waits
+        # for a writer instead of failing with "database is locked"
+        connect_args.setdefault('check_same_thread', False)
+        connect_args.setdefault('timeout', config['SQLITE_BUSY_TIMEOUT_MS'] / 1000.0)
+    elif backend == 'postgresql':
+        options.setdefault('pool_size', config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_timeout', config['DB_POOL_TIMEOUT'])
+        options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+        options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+        if config['DB_STATEMENT_TIMEOUT_MS']:
+            connect_args.setdefault('options', f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}")
+
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+def set_sqlite_pragmas(config):
+    """Return a connect listener applying the SQLite pragmas of the config to every new connection."""
+    journal_mode = config['SQLITE_JOURNAL_MODE']
+    synchronous = config['SQLITE_SYNCHRONOUS']
+    busy_timeout = int(config['SQLITE_BUSY_TIMEOUT_MS'])
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            # WAL lets the dashboard read while a webhook job writes
+            cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+            cursor.execute(f"PRAGMA synchronous={synchronous}")
+            cursor.execute(f"PRAGMA busy_timeout={busy_timeout}")
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def database_report(engine) -> dict:
+    """Return the effective settings of the database engine, read back from the database."""
+    report = {'backend': engine.dialect.name, 'driver': engine.driver,
+              'url': engine.url.render_as_string(hide_password=True), 'pool': type(engine.pool).__name__}
+    with engine.connect() as connection:
+        if engine.dialect.name == 'sqlite':
+            report['journal_mode'] = connection.exec_driver_sql('PRAGMA journal_mode').scalar()
+            synchronous = connection.exec_driver_sql('PRAGMA synchronous').scalar()
+            report['synchronous'] = SQLITE_SYNCHRONOUS_LEVELS.get(synchronous, synchronous)
+            report['busy_timeout_ms'] = connection.exec_driver_sql('PRAGMA busy_timeout').scalar()
+        elif engine.dialect.name == 'postgresql':
+            report['server_version'] = connection.exec_driver_sql('SHOW server_version').scalar()
+            report['statement_timeout'] = connection.exec_driver_sql('SHOW statement_timeout').scalar()
+    if hasattr(engine.pool, 'size'):
+        report['pool_size'] = engine.pool.size()
+        report['max_overflow'] = getattr(engine.pool, '_max_overflow', None)
+    report['pool_pre_ping'] = getattr(engine.pool, '_pre_ping', False)
+    return report
+
+
+def check_database(app: Flask) -> dict:
+    """Log the effective database settings and warn when they differ from the configuration."""
+    with app.app_context():
+        engine = db.engine
+    report = database_report(engine)
+    logger.info("Database %s", ', '.join(f'{key}={value}' for key, value in report.items()))
+    if report['backend'] == 'sqlite' and not is_memory_database(engine.url):
+        if str(report['journal_mode']).upper() != app.config['SQLITE_JOURNAL_MODE'].upper():
+            # e.g. WAL is not available on network file systems
+            logger.warning("SQLite journal mode is %s instead of %s, concurrent writes will serialize",
+                           report['journal_mode'], app.config['SQLITE_JOURNAL_MODE'])
+    return report
+
 
 # Define a function to initialize the db object with the Flask app
 def init_db(app: Flask) -> None:
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = build_engine_options(app.config)
     db.init_app(app)
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', set_sqlite_pragmas(app.config))
+    if app.config.get('DATABASE_STARTUP_CHECK'):
+        try:
+            check_database(app)
+        except Exception as e:
+            logger.error("Database startup check failed: %s", e)
@@ -1,14 +1,36 @@
-import asyncio
+import hmac
 import json
+import time
+from concurrent.futures import Future
 from datetime import datetime
 from config import Config
-from flask import Markup, flash, request, Flask, render_template, redirect, url_for, jsonify
+from flask import Markup, flash, request, Flask, render_template, redirect, url_for, jsonify, Response, \
+    stream_with_context
 from flask_login import LoginManager, login_user, logout_user, login_required, UserMixin, current_user
 from flask_security import Security, SQLAlchemyUserDatastore, UserMixin, RoleMixin, login_required
-from database import db, init_db
+from database import db, init_db, commit, unit_of_work, release_session
 from config import Config
-from classes.exchange import Exchange
-from classes.models import ExchangeModels, Bots, Accounts, Signals, Positions, Role, User, BotFees
+from classes.client_pool import client_pool, init_client_pool
+from classes.rate_limiter import rate_limits, init_rate_limits
+from classes.order_batcher import init_order_batchers
+from classes.metrics import metrics, init_metrics
+from classes.log import get_logger, init_logging
+from classes.market_cache import init_market_cache
+from classes.jobs import executor, init_jobs
+from classes.fill_tracker import fill_trackers, init_fill_trackers, is_order_filled, check_order_filled
+from classes.market_data import init_market_data
+from classes.balance_cache import init_balance_cache
+from classes.balance_refresh import balance_refresher, init_balance_refresh, save_balances
+from classes.balance_history import RESOLUTIONS, get_equity_curve, init_balance_sync
+from classes.signal_journal import signal_journal, init_signal_journal
+from classes.bot_cache import bot_cache, init_bot_cache
+from classes.trade_history import TradeHistoryError, parse_filters, get_positions_page, get_positions_summary
+from classes.bot_stats import record_closed_position, get_bot_stats, get_user_stats
+from classes.portfolio import convert, value_accounts
+from classes.models import ExchangeModels, Bots, Accounts, Signals, Positions, Role, User, BotFees, BalanceHistory, \
+    BotDailyStats
+from classes.bot_snapshot import BotSnapshot, AccountSnapshot
+from sqlalchemy.orm import joinedload
 
 # Load Flask app
 app = Flask(__name__)
@@ -16,9 +38,60 @@ app = Flask(__name__)
 # Load configuration from config file
 app.config.from_object(Config)
 
+# Start the queue-based log pipeline before anything logs
+init_logging(app)
+logger = get_logger('app')
+
 # Initialize the db object with the Flask app
 init_db(app)
 
+# Configure the shared exchange market cache
+init_market_cache(app)
+
+# Initialize the background job executor that runs the webhook order flow
+init_jobs(app)
+
+# Initialize the per-account order fill trackers
+init_fill_trackers(app)
+
+# Initialize the streaming ticker feeds and last-price store
+init_market_data(app)
+
+# Configure the per-account balance snapshot cache
+init_balance_cache(app)
+
+# Configure the pool of per-account exchange clients
+init_client_pool(app)
+
+# Configure the parallel balance refresh of the accounts page
+init_balance_refresh(app)
+
+# Configure the shared per-API-key rate-limit schedulers
+init_rate_limits(app)
+
+# Configure the per-account order batching window
+init_order_batchers(app)
+
+# Configure the pipeline timing metrics and register the gauges exposed on /metrics
+init_metrics(app)
+metrics.register_gauge('easymarket_rate_limit_queue_depth', 'Exchange requests waiting for the rate limiter.',
+                       lambda: [({'scheduler': m['name']}, m['queue_depth']) for m in rate_limits.metrics()])
+metrics.register_gauge('easymarket_jobs', 'Background jobs kept by the job executor, by status.',
+                       lambda: executor.status_counts())
+
+# Initialize the cache of bot execution configs used by the webhook
+init_bot_cache(app)
+metrics.register_gauge('easymarket_bot_cache', 'Bot config cache entries, hits and misses.',
+                       lambda: [({'value': name}, count) for name, count in bot_cache.metrics().items()])
+
+# Initialize the write-behind journal of incoming signals
+init_signal_journal(app)
+metrics.register_gauge('easymarket_signal_journal_rows', 'Signal journal rows by state.',
+                       lambda: [({'state': state}, count) for state, count in signal_journal.metrics().items()])
+
+# Configure the balance snapshots, taken by `manage.py sync_balances` and never by the web workers
+init_balance_sync(app)
+
 # --------- setup Flask-Security ---------
 user_datastore = SQLAlchemyUserDatastore(db, User, Role)
 security = Security(app, user_datastore)
@@ -55,12 +128,11 @@ def users():
 @app.route('/')
 @login_required
 def home():
-    return render_template('home.html')
+    return render_template('home.html', stats=get_user_stats(current_user.id))
 
 
 @app.route('/login2', methods=['GET', 'POST'])
 def login():
-    print('Reached the login function')
     if current_user.is_authenticated:
         return redirect(url_for('home'))
 
@@ -68,7 +140,6 @@ def login():
         email = request.form['email']
         password = request.form['password']
         user = User.query.filter_by(email=email).first()
-        print(f"email: {email}, password: {password}")
         if user is not None and user.check_password(password):
             login_user(user)
             return redirect(url_for('home'))
@@ -80,7 +151,6 @@ def login():
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
-    print('Reached the register function')
     if current_user.is_authenticated:
         return redirect(url_for('home'))
 
@@ -114,7 +184,7 @@ def logout():
 @login_required
 def bots():
     bots = Bots.query.filter_by(user_id=current_user.id).all()
-    return render_template('bots.html', bots=bots)
+    return render_template('bots.html', bots=bots, stats=get_bot_stats(current_user.id))
 
 
 @app.route('/create/bot', methods=['GET', 'POST'])
@@ -131,6 +201,7 @@ def create_bot():
         bt_type = request.form["type"]
         user_id = current_user.id
         leverage = float(request.form["leverage"])
+        signal_group = request.form.get("signal_group") or None
 
         try:
             take_profit = float(request.form["take_profit"])
@@ -150,11 +221,11 @@ def create_bot():
         bot = Bots(name=name, enabled=enabled, order_type=bt_type, base_order_size=amount, leverage=leverage,
                    exchange=exchange_short, symbol=pair,
                    take_profit=take_profit, stop_loss=stop_loss, description=description, time_interval=time_interval,
-                   user_id=user_id, exchange_id=account.exchange_id, account_id=account_id)
+                   user_id=user_id, exchange_id=account.exchange_id, account_id=account_id,
+                   signal_group=signal_group)
 
         db.session.add(bot)
         db.session.commit()
-        bot = Bots.query.filter_by(user_id=current_user.id).first()
 
         exchange_model = get_exchange_client(account)
 
@@ -165,6 +236,7 @@ def create_bot():
 
         db.session.add(bot_fees)
         db.session.commit()
+        bot_cache.invalidate(bot.id)
 
         flash('Bot created successfully!')
         return redirect(url_for('bots'))
@@ -184,7 +256,7 @@ def edit_bot(id):
         bot.name = request.form['name']
         bot.enabled = bool(request.form.get("enabled"))
         bot.symbol = request.form["pair"]
-        bot.amount = request.form["amount"]
+        bot.base_order_size = float(request.form["amount"])
         bot.description = request.form['description']
         bot.time_interval = request.form['time_interval']
         bot.account_id = request.form['account']
@@ -193,6 +265,7 @@ def edit_bot(id):
         bot.leverage = request.form["leverage"]
         bot.take_profit = request.form["take_profit"]
         bot.stop_loss = request.form["stop_loss"]
+        bot.signal_group = request.form.get("signal_group") or None
 
         # Get the exchange associated with the selected account
         account = Accounts.query.filter_by(id=request.form['account']).first()
@@ -201,10 +274,12 @@ def edit_bot(id):
         # Load Fees
         maker_fee, taker_fee = exchange_model.get_trading_fees(request.form["pair"])
 
-        bot.botfees.maker_fee = maker_fee
-        bot.botfees.taker_fee = taker_fee
+        for bot_fees in bot.botfees:
+            bot_fees.maker_fee = maker_fee
+            bot_fees.taker_fee = taker_fee
 
         db.session.commit()
+        bot_cache.invalidate(bot.id)
 
         flash('Bot updated successfully!')
         return redirect(url_for('bots'))
@@ -217,8 +292,14 @@ def edit_bot(id):
 @login_required
 def delete_bot(id):
     bot = Bots.query.get_or_404(id)
+
+    # Journal rows reference the bot, buffered ones are dropped before they are written
+    signal_journal.discard(id)
+    Signals.query.filter_by(bot_id=id).delete(synchronize_session=False)
+    BotDailyStats.query.filter_by(bot_id=id).delete(synchronize_session=False)
     db.session.delete(bot)
     db.session.commit()
+    bot_cache.invalidate(id)
 
     flash('Bot deleted successfully!')
     return redirect(url_for('bots'))
@@ -278,6 +359,8 @@ def edit_account(id):
         account.testnet = request.form["testnet"]
 
         db.session.commit()
+        client_pool.invalidate(account.id)
+        bot_cache.invalidate(account_id=account.id)
 
         flash('Account updated successfully!', 'success')
         return redirect(url_for('accounts'))
@@ -290,8 +373,11 @@ def edit_account(id):
 def delete_account(id):
     account = Accounts.query.get_or_404(id)
 
+    BalanceHistory.query.filter_by(account_id=id).delete(synchronize_session=False)
     db.session.delete(account)
     db.session.commit()
+    client_pool.invalidate(id)
+    bot_cache.invalidate(account_id=id)
 
     flash('Account deleted successfully!', 'success')
     return redirect(url_for('accounts'))
@@ -312,7 +398,7 @@ def transfer():
     account = Accounts.query.get_or_404(4)
     exchange = get_exchange_client(account)
     # Transfer from main account to futures account
-    response = exchange.exchange_instance.transfer('main', 'futures', 'USDT', 1)
+    response = exchange.call('transfer', 'USDT', 1, 'main', 'futures')
     return render_template("transfer.html", response=response)
 
 
@@ -322,6 +408,95 @@ def trades():
     return render_template("trades.html")
 
 
+@app.route('/api/positions')
+@login_required
+def api_positions():
+    """
+    Page through the user's positions, newest entry first.
+
+    Query parameters: bot_id, symbol, status (open/closed), from and to (ISO dates, on the
+    entry time), limit (default 50, at most 500) and cursor (next_cursor of the previous page).
+    """
+    try:
+        filters = parse_filters(request.args)
+        positions, next_cursor = get_positions_page(current_user.id, filters,
+                                                    request.args.get('limit', 50, type=int),
+                                                    request.args.get('cursor'))
+    except TradeHistoryError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'positions': positions, 'next_cursor': next_cursor})
+
+
+@app.route('/api/equity')
+@login_required
+def api_equity():
+    """
+    Equity curve of all of the user's accounts from the local balance history.
+
+    Query parameters: resolution (1m, 1h or 1d, default 1h) and points (default 360, at most 1000).
+    """
+    resolution = request.args.get('resolution', '1h')
+    if resolution not in RESOLUTIONS:
+        return jsonify({'error': f'Invalid resolution "{resolution}", expected one of {", ".join(RESOLUTIONS)}'}), 400
+    points = max(1, min(request.args.get('points', 360, type=int), 1000))
+    return jsonify(get_equity_curve(current_user.id, resolution, points))
+
+
+@app.route('/api/bots/stats')
+@login_required
+def api_bot_stats():
+    """
+    Running PnL, fees, trade count, win rate and max drawdown per bot and for all of the user's bots.
+    """
+    return jsonify({'bots': get_bot_stats(current_user.id), 'total': get_user_stats(current_user.id)})
+
+
+@app.route('/api/portfolio')
+@login_required
+def api_portfolio():
+    """
+    USDT value of every asset of every account of the user, per account and combined.
+    """
+    accounts = Accounts.query.options(joinedload(Accounts.exchangemodels)).filter_by(user_id=current_user.id).all()
+    return jsonify(value_accounts(accounts))
+
+
+@app.route('/api/positions/summary')
+@login_required
+def api_positions_summary():
+    """
+    Count, win rate, realized PnL and fees of the user's positions, with the filters of /api/positions.
+    """
+    try:
+        filters = parse_filters(request.args)
+    except TradeHistoryError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(get_positions_summary(current_user.id, filters))
+
+
+@app.route("/rate-limits")
+@login_required
+def rate_limit_metrics():
+    # Queue depth and wait time per API key scheduler
+    return jsonify(rate_limits.metrics())
+
+
+def metrics_authorized():
+    """A scraper authenticates with the METRICS_TOKEN bearer token, a browser with its login session."""
+    token = app.config.get('METRICS_TOKEN')
+    if token:
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip(), token)
+    return current_user.is_authenticated
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    if not metrics_authorized():
+        return Response('Unauthorized', 401, {'WWW-Authenticate': 'Bearer'})
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @app.route("/settings")
 @login_required
 def settings():
@@ -334,14 +509,8 @@ def settings():
 
 
 def convert_to_usdt(exchange, symbol, amount):
-    ticker = exchange.get_ticker(symbol)
-    price = ticker['last']
-    usdt_ticker = exchange.get_ticker('USDT/USDT')
-    usdt_price = usdt_ticker['last']
-    value = price * amount
-    if symbol != 'USDT':
-        value = value / usdt_price
-    return value
+    """Value `amount` of the currency `symbol` in USDT, None when the exchange has no conversion path for it."""
+    return convert(exchange, symbol, amount, 'USDT')
 
 
 def get_total_account_balance(account_id):
@@ -352,7 +521,7 @@ def get_total_account_balance(account_id):
     exchange_client = get_exchange_client(account)
     # Load balance
     account.balance_total = exchange_client.get_total_balance()
-    db.session.commit()
+    commit()
     # Return the available pairs as a JSON response
     return account.balance_total
 
@@ -365,25 +534,36 @@ def get_usdt_account_balance(account_id):
     exchange_client = get_exchange_client(account)
     # Load balance
     account.balance_usdt = exchange_client.get_usdt_balance()
-    db.session.commit()
+    commit()
     # Return the available pairs as a JSON response
     return account.balance_usdt
 
 
+def refresh_account_balances(account_id):
+    """
+    GET TOTAL AND USDT PORTFOLIO VALUE OF ACCOUNT FROM ONE BALANCE SNAPSHOT
+    """
+    account = Accounts.query.filter_by(id=account_id).first()
+    exchange_client = get_exchange_client(account)
+    # Both values come from the same fetch_balance response
+    account.balance_total = exchange_client.get_total_balance()
+    account.balance_usdt = exchange_client.get_usdt_balance()
+    commit()
+    return account.balance_total, account.balance_usdt
+
+
 def get_exchange_client(account):
     """
     Get the exchange client.
     """
-    print("371")
-    exchange_instance = Exchange(account)
-    return exchange_instance
+    return client_pool.get(account)
 
 
 def get_position(bot_id):
     """
-    Get the position for a bot.
+    Get the open position for a bot.
     """
-    return Positions.query.filter_by(bot_id=bot_id).first()
+    return Positions.query.filter_by(bot_id=bot_id, status='open').first()
 
 
 def get_bot_by_id(bot_id):
@@ -393,6 +573,33 @@ def get_bot_by_id(bot_id):
     return Bots.query.filter_by(id=bot_id).first()
 
 
+def get_bot_snapshot(bot_id):
+    """
+    Get the execution context of a bot (bot, account, exchange and fees) in one query.
+    """
+    bot = Bots.query.options(joinedload(Bots.accounts).joinedload(Accounts.exchangemodels),
+                             joinedload(Bots.botfees)).filter_by(id=bot_id).first()
+    return BotSnapshot.from_model(bot) if bot else None
+
+
+def get_cached_bot(bot_id):
+    """
+    Get the execution context of a bot from the bot config cache, loading it on a miss.
+    """
+    try:
+        bot_id = int(bot_id)
+    except (TypeError, ValueError):
+        return None
+    return bot_cache.get(bot_id, get_bot_snapshot)
+
+
+def get_enabled_bots_by_signal_group(user_id, group):
+    """
+    Get every enabled bot of a user's signal group. Group names are only unique per user.
+    """
+    return Bots.query.filter_by(signal_group=group, user_id=user_id, enabled=True).all()
+
+
 def get_balances(bot):
     """
     Calculate the order amount based on the bot's configured amount
@@ -420,14 +627,17 @@ def calculate_order_quantity(exchange_client, symbol, order_amount_percentage, p
         float: The order quantity.
     """
 
-    symbol_info = exchange_client.load_markets()[symbol]
+    with metrics.span('load_markets'):
+        market = exchange_client.resolve_market(symbol)
+    if market is None:
+        raise ValueError(f'{symbol} not found in markets for {exchange_client.exchange_name}')
+    symbol_info = market['market']
 
-    # Check if symbol is inverted in the exchange
-    if 'inverted' in symbol_info:
-        symbol = f"{symbol.split('/')[1]}/{symbol.split('/')[0]}"
+    # Use the symbol the exchange trades, this also undoes inverted aliases
+    symbol = market['symbol']
 
-    balance = exchange_client.get_usdt_balance()
-    print(balance)
+    with metrics.span('balance_fetch'):
+        balance = exchange_client.get_usdt_balance()
     quote_currency = symbol_info['quote']
     quantity_precision = symbol_info['precision']['amount']
 
@@ -440,8 +650,8 @@ def calculate_order_quantity(exchange_client, symbol, order_amount_percentage, p
 
     # Calculate the order amount based on the bot's configured percentage of the available balance
     amount = float(balance) * (order_amount_percentage / 100.0)
-    print(amount)
-    print(symbol_info)
+    logger.debug("Sizing %s order for %s: balance=%s amount=%s market=%s", order_type, symbol, balance, amount,
+                 symbol_info)
     ordertype = order_type.lower()
     quantity = amount
     if ordertype == 'market':
@@ -449,17 +659,16 @@ def calculate_order_quantity(exchange_client, symbol, order_amount_percentage, p
         quantity = max(exchange_client.amount_to_precision(symbol, amount),
                        symbol_info['limits']['amount']['min'])
     elif ordertype == 'limit':
-        print("write limit lorder execution")
         # For limit orders, we calculate the quantity based on the order amount and price
         #min_cost = symbol_info['limits']['cost']['min']
         #quantity = max(exchange_client.amount_to_precision(symbol, amount / price),
                        #symbol_info['limits']['amount']['min'])
         #quantity = exchange_client.price_to_precision(symbol, quantity * price)
         #quantity = max(quantity, exchange_client.amount_to_precision(symbol, min_cost / price))
+        pass
     else:
         raise ValueError(f'Invalid order type: {ordertype}')
-    print(quantity)
-    print(position_type)
+    logger.debug("Order quantity for %s %s: %s", position_type, symbol, quantity)
     """
     if position_type == 'long':
         # For long positions, we buy the base currency and sell the quote currency
@@ -480,7 +689,6 @@ def calculate_order_quantity(exchange_client, symbol, order_amount_percentage, p
     else:
         raise ValueError(f'Invalid position type: {position_type}')
         """
-    print(quantity)
 
     return quantity
 
@@ -584,14 +792,11 @@ def calculate_long_market_order_quantity(exchange_client, symbol, quantity):
         float: The order quantity.
     """
     # Check the minimum notional value
-    print("entered calculate_long_market_order_quantity function")
     symbol_info = exchange_client.load_markets()[symbol]
-    print(symbol_info)
-    ask_price = exchange_client.fetch_ticker(symbol)
-    print(ask_price)
+    ask_price = exchange_client.get_ticker(symbol)['ask']
     min_notional = symbol_info['limits']['cost']['min'] if symbol_info['limits']['cost'] else None
+    logger.debug("Minimum notional of %s is %s at ask %s", symbol, min_notional, ask_price)
 
-    print(min_notional)
     if min_notional and quantity * ask_price < min_notional:
         raise ValueError(
             f'Order quantity {quantity} is too low for symbol {symbol}. Minimum notional value is {min_notional}')
@@ -613,7 +818,7 @@ def calculate_short_market_order_quantity(exchange_client, symbol, quantity):
     """
     # Check the minimum notional value
     symbol_info = exchange_client.load_markets()[symbol]
-    bid_price = exchange_client.fetch_ticker(symbol)['bid']
+    bid_price = exchange_client.get_ticker(symbol)['bid']
     min_notional = symbol_info['limits']['cost']['min'] if symbol_info['limits']['cost'] else None
 
     if min_notional and quantity * bid_price < min_notional:
@@ -634,15 +839,28 @@ def check_inverted_symbol(exchange_client, symbol):
     Returns:
         str: The inverted symbol, if applicable. Otherwise, the original symbol.
     """
-    exchange_markets = exchange_client.load_markets()
-    symbol_info = exchange_markets.get(symbol)
-    if symbol_info and symbol_info['type'] == 'future' and symbol_info.get('inverse'):
-        if '/' in symbol:
-            return f"{symbol.split('/')[1]}{symbol.split('/')[0]}"
-        else:
-            return f"{symbol[-3:]}{symbol[:-3]}"
-    else:
+    market = exchange_client.resolve_market(symbol)
+    if market is None:
         return symbol
+    # Every alias, including the inverted one, resolves to the symbol the exchange trades
+    return market['symbol']
+
+
+def get_limit_entry_price(exchange_client, bot):
+    """
+    Return the price of a limit entry. Bots have no fixed entry price, limit entries rest at
+    the last traded price of the bot's symbol.
+
+    Raises:
+        ValueError: No price is available, the entry is aborted instead of sent without a price.
+    """
+    symbol = check_inverted_symbol(exchange_client, bot.symbol)
+    price = exchange_client.get_ticker_price(symbol)
+    if not price:
+        logger.error("No price for %s on %s, limit entry of bot %s aborted", symbol, exchange_client.exchange_name,
+                     bot.id)
+        raise ValueError(f'No price available for {symbol}')
+    return price
 
 
 def update_position(bot, order_id, position_side, quantity, price, fees, dt, position_action):
@@ -650,79 +868,133 @@ def update_position(bot, order_id, position_side, quantity, price, fees, dt, pos
     Create or update a position based on the provided order details.
 
     Args:
-        bot (Bots): The Bot DB Class
+        bot (Bots|BotSnapshot): The bot.
         order_id (str): The ID of the order.
         position_side (str): The side of the position ('long' or 'short').
         quantity (float): The quantity of the position.
         price (float): The price of the position.
-        timestamp (dt): The timestamp of the position.
+        fees (float): The fees paid for the order.
+        dt (str|datetime): The timestamp of the position.
         position_action (str): The action being taken ('open' or 'close').
     """
-    print('update position function')
-    positions = Positions.query.filter_by(order_id=order_id).first()
-    print(position_side)
+    # Exchanges report ISO strings, callers may also pass a datetime
+    if isinstance(dt, str):
+        dt = datetime.strptime(dt, '%Y-%m-%dT%H:%M:%S.%fZ')
+    position = Positions.query.filter_by(order_id=order_id).first()
     # Check if there is already an existing position for the order
-    if positions is not None:
-        for position in positions:
-            if position.order_id == order_id:
-                # Update the existing position
-                if position_action == 'open':
-                    raise ValueError(f'Position for order {order_id} already exists')
-                elif position_action == 'close':
-                    if position.status != 'open':
-                        raise ValueError(f'Position for order {order_id} is not open')
-                    position.status = 'closed'
-                    position.exit_price = price
-                    position.exit_time = dt
-
-                    position.fees = position.fees + fees
-                else:
-                    raise ValueError(f'Invalid position action: {position_side}')
-                position.save()
-                return
+    if position is not None:
+        # Update the existing position
+        if position_action == 'open':
+            raise ValueError(f'Position for order {order_id} already exists')
+        elif position_action == 'close':
+            if position.status != 'open':
+                raise ValueError(f'Position for order {order_id} is not open')
+            position.status = 'closed'
+            position.exit_price = price
+            position.exit_time = dt
+
+            position.fees = (position.fees or 0.0) + fees
+            # Same transaction as the position, the stats never disagree with it
+            record_closed_position(position)
+        else:
+            raise ValueError(f'Invalid position action: {position_action}')
+        position.save()
+        logger.info("Closed %s position of bot %s", position_side, position.bot_id,
+                    extra={'order_id': order_id, 'quantity': quantity, 'price': price, 'fees': fees})
+        return
 
     # Create a new position
-    print("bot")
-    print(bot)
     if position_action == 'open':
-        # Convert to datetime object
-        datetime_obj = datetime.strptime(dt, '%Y-%m-%dT%H:%M:%S.%fZ')
         position_type = 'long' if position_side == 'long' else 'short'
-        print(bot.id)
-        print(bot.symbol)
-        print(bot.accounts.exchangemodels.id)
-        print(price)
-        print(order_id)
-        print(quantity)
-        print(bot.order_type)
-        print(fees)
         position = Positions(bot_id=bot.id, symbol=bot.symbol, exchange_id=bot.accounts.exchangemodels.id, entry_price=price,
-                             entry_time=datetime_obj, order_id=order_id, order_quantity=quantity,
+                             entry_time=dt, order_id=order_id, order_quantity=quantity,
                              order_type=bot.order_type, position_type=position_type, fees=fees, status='open', user_id=bot.user_id)
 
         position.save()
-    elif position_side == 'close':
+        logger.info("Opened %s position of bot %s", position_type, bot.id,
+                    extra={'order_id': order_id, 'quantity': quantity, 'price': price, 'fees': fees})
+    elif position_action == 'close':
         raise ValueError(f'Position for order {order_id} not found')
     else:
-        raise ValueError(f'Invalid position action: {position_side}')
+        raise ValueError(f'Invalid position action: {position_action}')
+
+
+def get_order_fees(order):
+    """
+    Get the fees paid for an order, 0.0 if the exchange does not report them.
+    """
+    fee = order.get('fee') or {}
+    return float(fee.get('cost') or 0.0)
+
+
+def get_fill_price(order):
+    """
+    Get the price an order was filled at, market orders only report the average.
+    """
+    return order.get('average') or order.get('price')
+
+
+def open_position_on_fill(bot, position_type):
+    """
+    Return a fill callback that opens a position for the bot.
+    """
+    def on_fill(order):
+        with metrics.span('position_write'):
+            update_position(bot, order['id'], position_type, order['filled'],
+                            get_fill_price(order), get_order_fees(order), order['datetime'] or datetime.utcnow(), 'open')
+
+    return on_fill
 
 
-async def create_long_order(exchange_client, bot, quantity, price=None):
+def wait_and_apply_fill(exchange_client, order, on_fill):
+    """
+    Hand `order` to the account's fill tracker and return a Future of its final state.
+
+    The tracker runs `on_fill(order)` in its own unit of work once the order is closed with a
+    fill. Orders canceled, expired or closed without a fill, including those canceled after
+    FILL_TIMEOUT, fail the Future with OrderNotFilledError.
+    """
+    started = time.perf_counter()
+
+    def apply_fill(order):
+        metrics.observe_stage('fill_wait', time.perf_counter() - started)
+        if not is_order_filled(order) and order.get('filled'):
+            logger.error("Order %s was %s after a partial fill of %s, no position is recorded for it",
+                         order.get('id'), order.get('status'), order.get('filled'))
+        check_order_filled(order)
+        with unit_of_work():
+            on_fill(order)
+
+    return fill_trackers.track(exchange_client, order, apply_fill)
+
+
+def close_position_on_fill(bot, position_type):
+    """
+    Return a fill callback that closes the bot's open position.
+    """
+    def on_fill(order):
+        with metrics.span('position_write'):
+            position = get_position(bot.id)
+            if not position:
+                raise ValueError(f'Position for bot "{bot.id}" not found')
+            update_position(bot, position.order_id, position_type, order['filled'],
+                            get_fill_price(order), get_order_fees(order), order['datetime'] or datetime.utcnow(), 'close')
+
+    return on_fill
+
+
+def create_long_order(exchange_client, bot, quantity, price=None):
     """
         Create a long order.
 
         Args:
             exchange_client (ccxt.Exchange): The exchange client.
-            bot (Bot): The Bot object.
-            side (str): The order side ('buy' or 'sell').
+            bot (BotSnapshot): The bot.
             quantity (float): The order quantity.
+            price (float): The order price.
 
         Returns:
-            dict: The order object.
-            :param quantity:
-            :param bot:
-            :param exchange_client:
-            :param price:
+            Future: Resolves with the filled order once the position is written, None if no order was placed.
     """
     symbol = bot.symbol
     position_type = 'long'
@@ -730,41 +1002,32 @@ async def create_long_order(exchange_client, bot, quantity, price=None):
 
     # Check if symbol is reversed in the exchange
     symbol = check_inverted_symbol(exchange_client, symbol)
-    print(quantity)
 
     # Create the order
-    if order_type == 'limit':
-        order = exchange_client.create_limit_order(symbol, 'buy', quantity, price)
-    else:
-        order = exchange_client.create_market_order(symbol, 'buy', quantity)
-    # Wait for the order to be filled
-    while True:
-        print(order['id'])
-        order = exchange_client.get_order_status(symbol, order['id'])
-        if order['filled'] == order['amount']:
-            break
-        await asyncio.sleep(5)
-
-    # Create or update the position
-    print("before update function")
-    update_position(bot, order['id'], position_type, order['amount'], order['price'], 0.06, order['datetime'], 'open')
-
-    return order
+    with metrics.span('order_placement'):
+        if order_type == 'limit':
+            order = exchange_client.create_limit_order(symbol, 'buy', quantity, price)
+        else:
+            order = exchange_client.create_market_order(symbol, 'buy', quantity)
+    if not order:
+        return None
 
+    # Wait for the order to be filled, then open the position
+    return wait_and_apply_fill(exchange_client, order, open_position_on_fill(bot, position_type))
 
 
-async def create_short_order(exchange_client, bot, quantity, price=None):
+def create_short_order(exchange_client, bot, quantity, price=None):
     """
         Create a short order.
 
         Args:
             exchange_client (ccxt.Exchange): The exchange client.
-            bot (Bot): The Bot object.
+            bot (BotSnapshot): The bot.
             quantity (float): The order quantity.
             price (float): The order price.
 
         Returns:
-            dict: The order object.
+            Future: Resolves with the filled order once the position is written, None if no order was placed.
     """
     symbol = bot.symbol
     position_type = 'short'
@@ -774,37 +1037,30 @@ async def create_short_order(exchange_client, bot, quantity, price=None):
     symbol = check_inverted_symbol(exchange_client, symbol)
 
     # Create the order
-    if order_type == 'limit':
-        order = exchange_client.create_limit_sell_order(symbol, quantity, price)
-    else:
-        order = exchange_client.create_market_sell_order(symbol, quantity)
-
-    # Wait for limit order to be filled
-    if order_type == 'limit':
-        while True:
-            order = exchange_client.fetch_order(order['id'], symbol)
-            if order['status'] == 'filled':
-                break
-            await asyncio.sleep(5)
-
-    # Create or update the position
-    update_position(bot.id, order['id'], position_type, quantity, order['price'], datetime.now())
+    with metrics.span('order_placement'):
+        if order_type == 'limit':
+            order = exchange_client.create_limit_order(symbol, 'sell', quantity, price)
+        else:
+            order = exchange_client.create_market_order(symbol, 'sell', quantity)
+    if not order:
+        return None
 
-    return order
+    # Wait for the order to be filled, then open the position
+    return wait_and_apply_fill(exchange_client, order, open_position_on_fill(bot, position_type))
 
 
-async def create_long_exit_order(exchange_client, bot, quantity, price=None):
+def create_long_exit_order(exchange_client, bot, quantity, price=None):
     """
     Create an order to exit a long position.
 
     Args:
         exchange_client (ccxt.Exchange): The exchange client.
-        bot (Bot): The bot instance.
+        bot (BotSnapshot): The bot.
         quantity (float): The quantity of the order.
         price (float): The price at which the order should be executed (for limit orders).
 
     Returns:
-        dict: The order object returned by the exchange.
+        Future: Resolves with the filled order once the position is written, None if no order was placed.
     """
     if not exchange_client or not bot or not quantity:
         return None
@@ -816,42 +1072,35 @@ async def create_long_exit_order(exchange_client, bot, quantity, price=None):
     position_type = 'long'
 
     order_type = bot.order_type
-    if order_type == 'market':
-        order = exchange_client.create_market_sell_order(symbol, quantity)
-    else:
-        if not price:
-            ticker = exchange_client.get_ticker(symbol)
-            if not ticker:
-                return None
-            price = ticker['askPrice']
-        order = exchange_client.create_limit_sell_order(symbol, quantity, price)
-
-    # Wait for limit order to be filled
-    if order_type == 'limit':
-        while True:
-            order = exchange_client.fetch_order(order['id'], symbol)
-            if order['status'] == 'filled':
-                break
-            await asyncio.sleep(5)
-
-    # Create or update the position
-    update_position(bot.id, order['id'], position_type, quantity, order['price'], datetime.now())
+    with metrics.span('order_placement'):
+        if order_type == 'market':
+            order = exchange_client.create_market_order(symbol, 'sell', quantity)
+        else:
+            if not price:
+                ticker = exchange_client.get_ticker(symbol)
+                if not ticker:
+                    return None
+                price = ticker['ask']
+            order = exchange_client.create_limit_order(symbol, 'sell', quantity, price)
+    if not order:
+        return None
 
-    return order
+    # Wait for the order to be filled, then close the position
+    return wait_and_apply_fill(exchange_client, order, close_position_on_fill(bot, position_type))
 
 
-async def create_short_exit_order(exchange_client, bot, quantity, price=None):
+def create_short_exit_order(exchange_client, bot, quantity, price=None):
     """
     Create an order to exit a short position.
 
     Args:
         exchange_client (ccxt.Exchange): The exchange client.
-        bot (Bot): The bot instance.
+        bot (BotSnapshot): The bot.
         quantity (float): The quantity of the order.
         price (float): The price at which the order should be executed (for limit orders).
 
     Returns:
-        dict: The order object returned by the exchange.
+        Future: Resolves with the filled order once the position is written, None if no order was placed.
     """
     if not exchange_client or not bot or not quantity:
         return None
@@ -863,28 +1112,21 @@ async def create_short_exit_order(exchange_client, bot, quantity, price=None):
     position_type = 'short'
 
     order_type = bot.order_type
-    if order_type == 'market':
-        order = exchange_client.create_market_buy_order(symbol, quantity)
-    else:
-        if not price:
-            ticker = exchange_client.get_ticker(symbol)
-            if not ticker:
-                return None
-            price = ticker['bidPrice']
-        order = exchange_client.create_limit_buy_order(symbol, quantity, price)
-
-    # Wait for limit order to be filled
-    if order_type == 'limit':
-        while True:
-            order = exchange_client.fetch_order(order['id'], symbol)
-            if order['status'] == 'filled':
-                break
-            await asyncio.sleep(5)
-
-    # Create or update the position
-    update_position(bot.id, order['id'], position_type, quantity, order['price'], datetime.now())
+    with metrics.span('order_placement'):
+        if order_type == 'market':
+            order = exchange_client.create_market_order(symbol, 'buy', quantity)
+        else:
+            if not price:
+                ticker = exchange_client.get_ticker(symbol)
+                if not ticker:
+                    return None
+                price = ticker['bid']
+            order = exchange_client.create_limit_order(symbol, 'buy', quantity, price)
+    if not order:
+        return None
 
-    return order
+    # Wait for the order to be filled, then close the position
+    return wait_and_apply_fill(exchange_client, order, close_position_on_fill(bot, position_type))
 
 
 def calculate_take_profit_price(side, entry_price, take_profit):
@@ -920,7 +1162,6 @@ def load_pairs(account_id):
         # Load markets
         try:
             markets = exchange_model.load_markets()
-            print(markets)
         except Exception as e:
             return f'Error loading markets: {e}'
 
@@ -930,7 +1171,7 @@ def load_pairs(account_id):
         # Return the available pairs as a JSON response
         return jsonify(pairs)
     else:
-        print(f"No account found with id {account_id}")
+        logger.warning("No account found with id %s", account_id)
 
 
 @app.route('/load/leverage/<int:account_id>/<string:symbol>')
@@ -938,20 +1179,17 @@ def load_leverage(account_id, symbol):
     # Get the exchange associated with the selected account
     account = Accounts.query.filter_by(id=account_id).first()
     exchange_client = get_exchange_client(account)
-    print("we here")
     if exchange_client is not None:
         # Load Leverage
         try:
-            print("we here1")
-            symbolnew = symbol.replace('-', '/')
-            leverage = exchange_client.get_available_leverage(symbolnew + ":" + symbolnew.split("/")[1].split(":")[0])
+            leverage = exchange_client.get_available_leverage(symbol)
         except Exception as e:
             return f'Error loading leverage: {e}'
 
         # Return the available pairs as a JSON response
         return jsonify(leverage)
     else:
-        print(f"No account found with id {exchange_client}")
+        logger.warning("No account found with id %s", account_id)
 
 
 @app.route('/load/intervals/<int:account_id>/<string:symbol>')
@@ -962,130 +1200,278 @@ def load_intervals(account_id, symbol):
     if exchange_client is not None:
         # Load Leverage
         try:
-            symbolnew = symbol.replace('-', '/')
-            time_intervals = exchange_client.get_time_intervals(symbolnew + ":" + symbolnew.split("/")[1].split(":")[0])
+            time_intervals = exchange_client.get_time_intervals(symbol)
         except Exception as e:
             return f'Error loading time_intervals: {e}'
 
         # Return the available pairs as a JSON response
         return list(time_intervals)
     else:
-        print(f"No account found with id {account_id}")
+        logger.warning("No account found with id %s", account_id)
 
 
 @app.route('/load/balance', methods=['POST'])
 def load_balance():
     data = request.get_json()
     account_id = data['account_id']
-    total_balance = get_total_account_balance(account_id)
-    print(total_balance)
-    usdt_balance = get_usdt_account_balance(account_id)
+    total_balance, usdt_balance = refresh_account_balances(account_id)
     # Return the available pairs as a JSON response
     return jsonify({'total_balance': total_balance, 'usdt_balance': usdt_balance})
 
 
+@app.route('/load/balances', methods=['POST'])
+@login_required
+def load_balances():
+    """
+    Refresh the balances of all of the user's accounts in parallel.
+
+    Streams one JSON line per account as it completes, then writes every refreshed
+    balance in one transaction and ends with a {"done": true, "saved": n} line.
+    """
+    accounts = [AccountSnapshot.from_model(account) for account in Accounts.query.options(
+        joinedload(Accounts.exchangemodels)).filter_by(user_id=current_user.id)]
+
+    def generate():
+        results = []
+        for result in balance_refresher.refresh(accounts):
+            results.append(result)
+            yield json.dumps(result) + '\n'
+        saved = save_balances(results)
+        yield json.dumps({'done': True, 'saved': saved}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
 #################################################################################
 ########################### TRADINGVIEW WEBHOOK #################################
 #################################################################################
 
+SIGNAL_ACTIONS = ('ENTER-LONG', 'EXIT-LONG', 'ENTER-SHORT', 'EXIT-SHORT')
+
+
 @app.route('/webhook/tradingview', methods=['POST'])
-async def tradingview_webhook():
+def tradingview_webhook():
+    with metrics.span('webhook_accept'):
+        return accept_tradingview_signal()
+
+
+def accept_tradingview_signal():
+    """
+    Validate the TradingView alert and queue it, the order flow runs in the background job executor.
+    The time to acknowledge the alert is recorded as the 'webhook_accept' stage.
+
+    A message like 'ENTER-LONG_12' targets bot 12. A payload with a "group" key, e.g.
+    {"message": "ENTER-LONG", "group": "btc-trend", "user": 3}, fans the signal out to every
+    enabled bot of that signal group owned by the user.
+    """
+    received_at = datetime.now()
     try:
         data = json.loads(request.data)
         signal = data['message']
-        bot = get_bot_by_id(signal.split('_')[-1])
-        print(signal.split('_')[-1])
-        if not bot:
-            return jsonify({'error': f'Bot "{bot.name}" not found'}), 404
+    except (ValueError, KeyError, TypeError):
+        logger.warning("Rejected invalid webhook payload", extra={'payload': request.data[:256]})
+        return jsonify({'error': 'Invalid webhook payload'}), 400
 
-        print(bot.accounts)
-        exchange_client = get_exchange_client(bot.accounts)
-        if not exchange_client:
-            return jsonify({'error': 'Invalid bot configuration'}), 400
+    if not signal.startswith(SIGNAL_ACTIONS):
+        logger.warning("Rejected unknown signal %s", signal)
+        return jsonify({'error': f'Unknown signal "{signal}"'}), 400
+
+    if data.get('group'):
+        try:
+            user_id = int(data['user'])
+        except (KeyError, TypeError, ValueError):
+            logger.warning("Rejected signal %s for group %s without a user", signal, data['group'])
+            return jsonify({'error': 'Signal group payloads need the "user" id owning the group'}), 400
+        return dispatch_signal_group(user_id, data['group'], signal.split('_')[0], received_at)
+
+    bot = get_cached_bot(signal.split('_')[-1])
+    if not bot:
+        logger.warning("Rejected signal %s for unknown bot", signal)
+        return jsonify({'error': f'Bot "{signal.split("_")[-1]}" not found'}), 404
+
+    journal_entry = signal_journal.entry(bot, signal, request.data, received_at)
+    job = executor.submit(process_tradingview_signal, bot.id, signal, journal_entry, name=f'signal-{bot.id}',
+                          key=bot.account_id)
+    return jsonify({'job_id': job.id, 'status': job.status, 'status_url': url_for('job_status', job_id=job.id)}), 202
+
+
+def dispatch_signal_group(user_id, group, action, received_at):
+    """
+    Queue one job per enabled bot of the user's signal group.
+
+    Jobs of different accounts run in parallel, jobs of the same account are bounded by
+    JOB_MAX_PER_ACCOUNT. The returned group id reports a per-bot summary on /jobs/<id>.
+    """
+    bots = get_enabled_bots_by_signal_group(user_id, group)
+    if not bots:
+        return jsonify({'error': f'No enabled bots in signal group "{group}"'}), 404
+
+    jobs = [executor.submit(process_tradingview_signal, bot.id, f'{action}_{bot.id}',
+                            signal_journal.entry(bot, action, request.data, received_at), name=f'signal-{bot.id}',
+                            key=bot.account_id)
+            for bot in bots]
+    job_group = executor.submit_group(f'group-{group}', jobs)
+    return jsonify({'job_id': job_group.id, 'status': job_group.status, 'bots': len(jobs),
+                    'status_url': url_for('job_status', job_id=job_group.id)}), 202
 
-        # ENTER LONG TRADE AND CREATE POSITION
-        if signal.startswith('ENTER-LONG'):
+
+@app.route('/jobs/<string:job_id>')
+def job_status(job_id):
+    job = executor.get(job_id)
+    if not job:
+        return jsonify({'error': f'Job "{job_id}" not found'}), 404
+    return jsonify(job.to_dict())
+
+
+def process_tradingview_signal(job, bot_id, signal, journal_entry):
+    """
+    Execute a TradingView signal for a bot. Runs inside the job executor.
+
+    The job returns once the order is placed, the account's fill tracker finishes the signal
+    when the order is final. The stages of the signal are timed into the /metrics histograms,
+    slow signals are logged with their stage breakdown. The outcome is written to the signal journal.
+
+    Args:
+        job (Job): The job tracking this signal.
+        bot_id (int): The ID of the bot the signal is for.
+        signal (str): The signal message (e.g. 'ENTER-LONG_12').
+        journal_entry (dict): The journal row started when the webhook received the signal.
+
+    Returns:
+        Future: Resolves with the result message stored on the job.
+    """
+    trace = metrics.start_trace(f'signal-{bot_id}', action=signal.split('_')[0])
+    try:
+        # Only reads happen before the order is placed, the position is written in its own unit of work
+        # once the order is filled, see wait_and_apply_fill()
+        with metrics.traced(trace):
+            fill, message = execute_tradingview_signal(job, bot_id, signal)
+    except Exception as e:
+        metrics.finish_trace(trace, 'error')
+        signal_journal.record(journal_entry, 'failed', str(e))
+        raise
+
+    job.set_stage('fill_wait')
+    result = Future()
+
+    def finish(fill):
+        error = fill.exception()
+        metrics.finish_trace(trace, 'error' if error else 'ok')
+        if error is not None:
+            signal_journal.record(journal_entry, 'failed', str(error))
+            result.set_exception(error)
+        else:
+            signal_journal.record(journal_entry, 'done')
+            result.set_result({'message': message, 'order_id': fill.result()['id']})
+
+    fill.add_done_callback(finish)
+    return result
+
+
+def execute_tradingview_signal(job, bot_id, signal):
+    """
+    Place the order of a signal.
+
+    Returns:
+        tuple: (Future of the filled order, result message)
+    """
+    job.set_stage('load_bot')
+    with metrics.span('bot_lookup'):
+        bot = get_cached_bot(bot_id)
+    if not bot:
+        raise ValueError(f'Bot "{bot_id}" not found')
+    # No transaction may stay open while the exchange is called
+    release_session()
+
+    job.set_stage('exchange_client')
+    with metrics.span('exchange_client'):
+        exchange_client = get_exchange_client(bot.accounts)
+    if not exchange_client:
+        raise ValueError('Invalid bot configuration')
+
+    # ENTER LONG TRADE AND CREATE POSITION
+    if signal.startswith('ENTER-LONG'):
+        order_type = bot.order_type
+        if order_type == 'limit':
+            price = get_limit_entry_price(exchange_client, bot)
+        else:
+            price = None
+        job.set_stage('calculate_quantity')
+        quantity = calculate_order_quantity(exchange_client, bot.symbol, bot.base_order_size, 'long', bot.order_type,
+                                            price)
+        job.set_stage('create_order')
+        fill = create_long_order(exchange_client, bot, quantity, price)
+        if not fill:
+            raise ValueError('Unable to create order')
+        return fill, 'Long position created successfully'
+
+    # EXIT LONG TRADE AND UPDATE POSITION
+    elif signal.startswith('EXIT-LONG'):
+        job.set_stage('load_position')
+        position = get_position(bot.id)
+        release_session()
+        if not position:
+            raise ValueError(f'Position for bot "{bot.name}" not found')
+        order = exchange_client.get_order_status(bot.symbol, position.order_id)
+        if not order:
+            raise ValueError('Unable to get order details')
+        if order['status'] == 'closed':
             order_type = bot.order_type
             if order_type == 'limit':
-                price = bot.price
+                price = float(order['price'])
+                quantity = position.order_quantity
             else:
                 price = None
-            print("before calculate order ")
-            quantity = calculate_order_quantity(exchange_client, bot.symbol, bot.base_order_size, 'long', bot.order_type,
-                                                price)
-            order = await create_long_order(exchange_client, bot, quantity, price)
-
-            if not order:
-                return jsonify({'error': 'Unable to create order'}), 500
-            return jsonify({'message': 'Long position created successfully'}), 200
-
-        # EXIT LONG TRADE AND UPDATE POSITION
-        elif signal.startswith('EXIT-LONG'):
-            position = get_position(bot.id)
-            if not position:
-                return jsonify({'error': f'Position for bot "{bot.name}" not found'}), 404
-            order = exchange_client.get_order_status(bot.symbol, position.order_id)
-            if not order:
-                return jsonify({'error': 'Unable to get order details'}), 500
-            if order['status'] == 'FILLED':
-                order_type = bot.order_type
-                side = 'SELL'
-                if order_type == 'limit':
-                    price = float(order['price'])
-                    quantity = position.order_quantity
-                else:
-                    price = None
-                    quantity = position.order_quantity
-                order = create_long_exit_order(exchange_client, bot, quantity, price)
-                update_position(bot.id, order['orderId'], 'closed', quantity, order['price'], datetime.now(), 'close')
-                return 'Order created successfully'
-            else:
-                return jsonify({'error': 'Order has not been filled yet'}), 400
+                quantity = position.order_quantity
+            job.set_stage('create_order')
+            fill = create_long_exit_order(exchange_client, bot, quantity, price)
+            if not fill:
+                raise ValueError('Unable to create order')
+            return fill, 'Order created successfully'
+        else:
+            raise ValueError('Order has not been filled yet')
 
-        # ENTER SHORT TRADE AND CREATE POSITION
-        elif signal.startswith('ENTER-SHORT'):
+    # ENTER SHORT TRADE AND CREATE POSITION
+    elif signal.startswith('ENTER-SHORT'):
+        order_type = bot.order_type
+        if order_type == 'limit':
+            price = get_limit_entry_price(exchange_client, bot)
+        else:
+            price = None
+        job.set_stage('calculate_quantity')
+        quantity = calculate_order_quantity(exchange_client, bot.symbol, bot.base_order_size, 'short', bot.order_type,
+                                            price)
+        job.set_stage('create_order')
+        fill = create_short_order(exchange_client, bot, quantity, price)
+        if not fill:
+            raise ValueError('Unable to create order')
+        return fill, 'Short position created successfully'
+
+    # EXIT SHORT TRADE AND UPDATE POSITION
+    elif signal.startswith('EXIT-SHORT'):
+        job.set_stage('load_position')
+        position = get_position(bot.id)
+        release_session()
+        if not position:
+            raise ValueError(f'Position for bot "{bot.name}" not found')
+        order = exchange_client.get_order_status(bot.symbol, position.order_id)
+        if not order:
+            raise ValueError('Unable to get order details')
+        if order['status'] == 'closed':
             order_type = bot.order_type
-            side = 'SELL'
             if order_type == 'limit':
-                price = bot.price
+                price = float(order['price'])
+                quantity = position.order_quantity
             else:
+                quantity = position.order_quantity
                 price = None
-            quantity = calculate_order_quantity(exchange_client, bot.symbol, bot.base_order_size, 'short', bot.order_type,
-                                                price)
-            order = create_short_order(exchange_client, bot, quantity, price)
-            if not order:
-                return jsonify({'error': 'Unable to create order'}), 500
-            stop_loss = bot.stop_loss
-            take_profit = bot.take_profit
-            update_position(bot, order['orderId'], 'short', quantity, order['price'], datetime.now(), 'open')
-            return jsonify({'message': 'Short position created successfully'}), 200
-
-        # EXIT SHORT TRADE AND UPDATE POSITION
-        elif signal.startswith('EXIT-SHORT'):
-            position = get_position(bot.id)
-            if not position:
-                return jsonify({'error': f'Position for bot "{bot.name}" not found'}), 404
-            order = exchange_client.get_order_status(bot.symbol, position.order_id)
-            if not order:
-                return jsonify({'error': 'Unable to get order details'}), 500
-            if order['status'] == 'FILLED':
-                order_type = bot.order_type
-                side = 'BUY'
-                if order_type == 'limit':
-                    price = float(order['price'])
-                    quantity = position.order_quantity
-                else:
-                    quantity = position.order_quantity
-                    price = None
-                order = create_short_exit_order(exchange_client, bot, quantity, price)
-                update_position(bot.id, order['orderId'], 'closed', quantity, order['price'], datetime.now(), 'close')
-                return 'Order created successfully'
-            else:
-                return jsonify({'error': 'Order has not been filled yet'}), 400
-    except Exception as e:
-        # Log error
-        app.logger.error(f'Error processing TradingView webhook: {e}')
-        return 'Error processing TradingView webhook', 500
+            job.set_stage('create_order')
+            fill = create_short_exit_order(exchange_client, bot, quantity, price)
+            if not fill:
+                raise ValueError('Unable to create order')
+            return fill, 'Order created successfully'
+        else:
+            raise ValueError('Order has not been filled yet')
 
 
 if __name__ == '__main__':
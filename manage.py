@@ -1,3 +1,4 @@
+import click
 from flask.cli import FlaskGroup
 from main import app, db
 
@@ -6,10 +7,86 @@ cli = FlaskGroup(app)
 
 @cli.command("create_db")
 def create_db():
-    db.create_all()
+    from classes.migrations import upgrade
+    upgrade()
     print("Database created")
 
 
+@cli.command("rebuild_bot_stats")
+@click.option("--bot-id", type=int, default=None, help="Only rebuild the stats of this bot.")
+def rebuild_bot_stats(bot_id):
+    from classes.bot_stats import rebuild_bot_stats as rebuild
+    rows = rebuild(bot_id)
+    db.session.commit()
+    print(f"Rebuilt {rows} daily stats row(s)")
+
+
+@cli.command("db_settings")
+def db_settings():
+    from database import database_report
+    for key, value in database_report(db.engine).items():
+        print(f"{key}: {value}")
+
+
+@cli.command("migrate")
+def migrate():
+    from classes.migrations import upgrade
+    applied = upgrade()
+    for version, description in applied:
+        print(f"Applied migration {version}: {description}")
+    print("Database is up to date" if not applied else f"{len(applied)} migration(s) applied")
+
+
+@cli.command("migration_status")
+def migration_status():
+    from classes.migrations import status
+    current, pending = status()
+    print(f"Schema version {current}")
+    for version, description in pending:
+        print(f"Pending migration {version}: {description}")
+
+
+@cli.command("check_query_plans")
+def check_query_plans():
+    from classes.query_plans import check_query_plans as check
+    failed = 0
+    for name, index, uses_index, plan in check():
+        print(f"{'OK  ' if uses_index else 'FAIL'} {name} -> {index}")
+        if not uses_index:
+            failed += 1
+            print(f"     {plan}")
+    if failed:
+        raise SystemExit(f"{failed} hot query(s) do not use their index")
+
+
+@cli.command("sync_balances")
+@click.option("--interval", type=float, default=None, help="Seconds between two snapshots, BALANCE_SYNC_INTERVAL by default.")
+@click.option("--once", is_flag=True, help="Snapshot the balances once and exit.")
+def sync_balances(interval, once):
+    from classes.balance_history import balance_sync
+    if once:
+        print(f"Wrote {balance_sync.sync()} balance sample(s)")
+        return
+    if interval is not None:
+        balance_sync.interval = interval
+    if balance_sync.interval <= 0:
+        raise click.BadParameter("the interval must be positive", param_hint="--interval")
+    print(f"Syncing account balances every {balance_sync.interval:g}s")
+    try:
+        balance_sync.run()
+    except KeyboardInterrupt:
+        balance_sync.stop()
+
+
+@cli.command("add_sim_exchange")
+def add_sim_exchange():
+    from classes.models import ExchangeModels
+    if ExchangeModels.query.filter_by(short="sim").first() is None:
+        db.session.add(ExchangeModels(name="Simulated Exchange", short="sim"))
+        db.session.commit()
+    print("Simulated exchange available")
+
+
 if __name__ == "__main__":
     cli()
     create_db()
@@ -448,6 +448,42 @@ let demoOptions = {
 };
 
 const renderedCharts = [];
+function chartOptions(chartElement) {
+    const type = chartElement.getAttribute('data-type');
+    const variant = chartElement.getAttribute('data-variant');
+
+    if (typeof demoOptions[type] !== 'object') {
+        return null;
+    }
+    let options = demoOptions[type];
+
+    if (typeof options['__variants'] === 'object' && typeof options['__variants'][variant] === 'object') {
+        options = { ...options, ...options['__variants'][variant] };
+    }
+    return options;
+}
+
+function loadChartData(chartElement) {
+    // Charts with a data-source draw the local balance history instead of the demo series
+    const options = chartOptions(chartElement);
+    if (!options) {
+        return;
+    }
+    fetch(chartElement.getAttribute('data-source'))
+        .then(response => response.json())
+        .then(data => {
+            const series = [{ name: 'Total Balance', data: data.total || [] }];
+            if (chartElement.chart) {
+                chartElement.chart.updateSeries(series);
+            } else {
+                chartElement.chart = new ApexCharts(chartElement, { ...options, series: series, xaxis: { type: 'datetime' } });
+                chartElement.chart.render();
+            }
+            chartElement.dispatchEvent(new CustomEvent('chartdata', { detail: data }));
+        })
+        .catch(error => console.error(error));
+}
+
 function updateCharts() {
     if (typeof ApexCharts !== 'function') {
         return;
@@ -460,16 +496,15 @@ function updateCharts() {
             return;
         }
 
-        const type = chartElement.getAttribute('data-type');
-        const variant = chartElement.getAttribute('data-variant');
-
-        if (typeof demoOptions[type] === 'object') {
-            let options = demoOptions[type];
+        if (chartElement.hasAttribute('data-source')) {
+            loadChartData(chartElement);
+            renderedCharts.push(chartElement);
+            return;
+        }
 
-            if (typeof options['__variants'] === 'object' && typeof options['__variants'][variant] === 'object') {
-                options = { ...options, ...options['__variants'][variant] };
-            }
+        const options = chartOptions(chartElement);
 
+        if (options) {
             const chart = new ApexCharts(chartElement, options);
             chart.render();
             renderedCharts.push(chartElement);
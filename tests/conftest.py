@@ -0,0 +1,55 @@
+"""
+Shared fixtures of the unit tests, run them from the repository root with `python -m pytest -q`.
+
+The caches, schedulers, market index and simulated exchange are tested without third-party
+packages. Tests using the `app` fixture, the exchange handle (client pool, portfolio) or a Flask
+app context need the app's dependencies: pytest, Flask < 2.3 (Flask-Security-Too 3.4 still uses
+its request context stack), Flask-SQLAlchemy, SQLAlchemy and ccxt. Without them those test
+modules fail to import. numpy is optional, the numpy valuation test is skipped without it.
+"""
+import pytest
+
+from classes.simulated_exchange import SimulatedExchange
+
+
+class SimulatedClient(object):
+    """The parts of the Exchange handle the fill tracker uses, calling a SimulatedExchange directly."""
+
+    def __init__(self, account_id=1, **settings):
+        self.account_id = account_id
+        self.exchange_name = SimulatedExchange.id
+        self.exchange_instance = SimulatedExchange({'apiKey': f'test-{account_id}', 'options': {'sim': settings}})
+        self.calls = []
+        self.invalidations = 0
+
+    def call(self, endpoint, *args, priority=None, cost=None, **kwargs):
+        self.calls.append((endpoint, args))
+        return getattr(self.exchange_instance, endpoint)(*args, **kwargs)
+
+    def invalidate_balance(self):
+        self.invalidations += 1
+
+
+@pytest.fixture
+def sim_client():
+    # Simulated accounts live for the whole process, every test starts from a fresh one
+    SimulatedExchange.accounts.clear()
+    return SimulatedClient()
+
+
+@pytest.fixture
+def app():
+    from flask import Flask
+    from config import Config
+    from database import db, init_db
+    import classes.models  # noqa: F401, registers the tables
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(SQLALCHEMY_DATABASE_URI='sqlite://', DATABASE_STARTUP_CHECK=False, TESTING=True)
+    init_db(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from classes.balance_cache import BalanceCache
+
+
+def test_snapshot_is_reused_until_invalidated():
+    cache = BalanceCache(ttl=60)
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return {'total': {'USDT': len(calls)}}
+
+    assert cache.get(1, fetch)['total']['USDT'] == 1
+    assert cache.get(1, fetch)['total']['USDT'] == 1
+    cache.invalidate(1)
+    assert cache.get(1, fetch)['total']['USDT'] == 2
+    assert len(calls) == 2
+
+
+def test_concurrent_readers_share_one_fetch():
+    cache = BalanceCache(ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {'total': {'USDT': 100}}
+
+    results = []
+    readers = [threading.Thread(target=lambda: results.append(cache.get(1, fetch))) for _ in range(5)]
+    readers[0].start()
+    started.wait(5)
+    for reader in readers[1:]:
+        reader.start()
+    # Let the other readers reach the in-flight future before the fetch returns
+    time.sleep(0.05)
+    release.set()
+    for reader in readers:
+        reader.join(5)
+
+    assert len(calls) == 1
+    assert len(results) == 5
+    assert all(result is results[0] for result in results)
+
+
+def test_fetch_started_before_invalidate_is_not_joined_or_cached():
+    cache = BalanceCache(ttl=60)
+    started = threading.Event()
+    release = threading.Event()
+
+    def stale_fetch():
+        started.set()
+        release.wait(5)
+        return 'stale'
+
+    first = []
+    reader = threading.Thread(target=lambda: first.append(cache.get(1, stale_fetch)))
+    reader.start()
+    started.wait(5)
+    cache.invalidate(1)
+
+    # A reader after the invalidation starts its own fetch instead of waiting for the old one
+    assert cache.get(1, lambda: 'fresh') == 'fresh'
+    release.set()
+    reader.join(5)
+    assert first == ['stale']
+    # The first fetch finished last but never replaced the newer snapshot
+    assert cache.get(1, lambda: 'refetched') == 'fresh'
+
+
+def test_failed_fetch_is_not_cached():
+    cache = BalanceCache(ttl=60)
+
+    def fail():
+        raise RuntimeError('exchange down')
+
+    with pytest.raises(RuntimeError):
+        cache.get(1, fail)
+    assert cache.get(1, lambda: 5) == 5
+    assert cache.inflight == {}
@@ -0,0 +1,58 @@
+import math
+
+from database import db
+from classes.models import BalanceHistory
+from classes.balance_history import CHUNK_SLOTS, RESOLUTIONS, chunk_position, get_equity_curve, record_samples, \
+    unpack
+
+
+def chunks(resolution):
+    return BalanceHistory.query.filter_by(account_id=1, resolution=resolution) \
+        .order_by(BalanceHistory.chunk_start).all()
+
+
+def test_chunk_position():
+    assert chunk_position('1m', 0) == (0, 0)
+    assert chunk_position('1m', 61) == (0, 1)
+    assert chunk_position('1m', CHUNK_SLOTS * 60) == (CHUNK_SLOTS * 60, 0)
+    assert chunk_position('1h', CHUNK_SLOTS * 3600 - 1) == (0, CHUNK_SLOTS - 1)
+
+
+def test_samples_roll_over_into_a_new_chunk(app):
+    # The last minute of the first 1m chunk, then the first minute of the next one
+    last_minute = (CHUNK_SLOTS - 1) * RESOLUTIONS['1m']
+    record_samples([(1, 1, 100.0, 90.0)], last_minute)
+    record_samples([(1, 1, 110.0, None)], last_minute + RESOLUTIONS['1m'])
+    db.session.commit()
+
+    first, second = chunks('1m')
+    assert (first.chunk_start, second.chunk_start) == (0, CHUNK_SLOTS * RESOLUTIONS['1m'])
+    assert unpack(first.balance_total)[CHUNK_SLOTS - 1] == 100.0
+    assert unpack(second.balance_total)[0] == 110.0
+    assert math.isnan(unpack(second.balance_usdt)[0])
+    assert sum(not math.isnan(value) for value in unpack(first.balance_total)) == 1
+
+    # The 1m chunk ends on an hour, the samples land in consecutive buckets of one 1h chunk
+    hourly, = chunks('1h')
+    assert list(unpack(hourly.balance_total)[5:7]) == [100.0, 110.0]
+    # and in the same 1d bucket, where the last sample wins
+    daily, = chunks('1d')
+    assert unpack(daily.balance_total)[0] == 110.0
+
+
+def test_samples_without_a_balance_are_skipped(app):
+    record_samples([(1, 1, None, None)], RESOLUTIONS['1d'])
+    db.session.commit()
+    assert BalanceHistory.query.count() == 0
+
+
+def test_equity_curve_carries_the_last_balance_forward(app):
+    minute = RESOLUTIONS['1m']
+    start = RESOLUTIONS['1d']
+    record_samples([(1, 1, 100.0, 100.0), (2, 1, 50.0, 50.0)], start)
+    record_samples([(1, 1, 120.0, 120.0)], start + 2 * minute)
+    db.session.commit()
+
+    curve = get_equity_curve(1, '1m', points=3, end=start + 2 * minute)
+    assert curve['total'] == [[start * 1000, 150.0], [(start + minute) * 1000, 150.0],
+                              [(start + 2 * minute) * 1000, 170.0]]
@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import pytest
+
+from classes.bot_cache import BotConfigCache
+
+
+class Loader(object):
+    """Loads snapshots with the account of every bot, counting the loads."""
+
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.loads = []
+
+    def __call__(self, bot_id):
+        self.loads.append(bot_id)
+        if bot_id not in self.accounts:
+            return None
+        return SimpleNamespace(id=bot_id, account_id=self.accounts[bot_id], load=len(self.loads))
+
+
+def make_cache(app, check_interval=60):
+    cache = BotConfigCache()
+    cache.init_app(app)
+    # After init_app, which reads the interval from the config
+    cache.check_interval = check_interval
+    return cache
+
+
+@pytest.fixture
+def loader():
+    return Loader({1: 10, 2: 10, 3: 20})
+
+
+def test_cached_snapshots_are_served_without_loading(app, loader):
+    cache = make_cache(app)
+    first = cache.get(1, loader)
+    assert cache.get('1', loader) is first
+    assert loader.loads == [1]
+    assert cache.metrics() == {'entries': 1, 'hits': 1, 'misses': 1}
+
+
+def test_missing_bots_are_not_cached(app, loader):
+    cache = make_cache(app)
+    assert cache.get(4, loader) is None
+    assert cache.get(4, loader) is None
+    assert loader.loads == [4, 4]
+
+
+def test_invalidate_drops_a_bot_or_every_bot_of_an_account(app, loader):
+    cache = make_cache(app)
+    for bot_id in (1, 2, 3):
+        cache.get(bot_id, loader)
+
+    cache.invalidate(bot_id=1)
+    assert set(cache.entries) == {2, 3}
+    cache.invalidate(account_id=20)
+    assert set(cache.entries) == {2}
+    cache.invalidate()
+    assert cache.entries == {}
+
+
+def test_other_workers_see_the_invalidation(app, loader):
+    cache = make_cache(app, check_interval=0)
+    other_worker = make_cache(app, check_interval=0)
+    cache.get(1, loader)
+    stale = other_worker.get(1, loader)
+
+    cache.invalidate(bot_id=1)
+    assert other_worker.get(1, loader) is not stale
+    assert loader.loads == [1, 1, 1]
+
+
+def test_snapshot_loaded_during_an_invalidation_is_not_kept(app, loader):
+    cache = make_cache(app)
+
+    def racing_loader(bot_id):
+        snapshot = loader(bot_id)
+        # The bot is edited while its old row is being read
+        cache.invalidate(bot_id=bot_id)
+        return snapshot
+
+    assert cache.get(1, racing_loader).account_id == 10
+    assert cache.entries == {}
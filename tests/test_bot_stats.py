@@ -0,0 +1,89 @@
+import itertools
+from datetime import datetime
+
+from database import db
+from classes.models import BotDailyStats, Positions
+from classes.bot_stats import record_closed_position, rebuild_bot_stats
+
+COLUMNS = [column.name for column in BotDailyStats.__table__.columns if column.name != 'id']
+
+order_ids = itertools.count(1)
+
+
+def close_position(bot_id, exit_time, position_type, entry_price, exit_price, quantity=1.0, fees=0.5):
+    """Open a position, then close it the way update_position does, and commit."""
+    position = Positions(bot_id=bot_id, user_id=1, exchange_id=1, symbol='BTC/USDT:USDT',
+                         order_id=str(next(order_ids)), order_quantity=quantity, order_type='market',
+                         position_type=position_type, entry_price=entry_price, entry_time=exit_time,
+                         status='open', fees=0.0)
+    db.session.add(position)
+    db.session.flush()
+    position.status = 'closed'
+    position.exit_price = exit_price
+    position.exit_time = exit_time
+    position.fees = fees
+    record_closed_position(position)
+    db.session.commit()
+    return position
+
+
+def stats_rows(bot_id):
+    rows = BotDailyStats.query.filter_by(bot_id=bot_id).order_by(BotDailyStats.day).all()
+    return [{column: round(value, 9) if isinstance(value, float) else value
+             for column, value in ((column, getattr(row, column)) for column in COLUMNS)} for row in rows]
+
+
+def rebuilt_rows(bot_id):
+    rebuild_bot_stats(bot_id)
+    db.session.commit()
+    db.session.expire_all()
+    return stats_rows(bot_id)
+
+
+def test_incremental_stats_match_a_rebuild(app):
+    close_position(1, datetime(2024, 5, 1, 9), 'long', 100, 110)
+    close_position(1, datetime(2024, 5, 1, 15), 'short', 100, 104)
+    close_position(1, datetime(2024, 5, 2, 10), 'long', 100, 90, quantity=2)
+    close_position(1, datetime(2024, 5, 4, 12), 'short', 100, 80)
+    close_position(1, datetime(2024, 5, 4, 13), 'long', 100, 99)
+
+    incremental = stats_rows(1)
+    assert [row['day'].day for row in incremental] == [1, 2, 4]
+    assert incremental[-1]['total_trades'] == 5
+    assert incremental[-1]['total_wins'] == 2
+    assert incremental == rebuilt_rows(1)
+
+
+def test_drawdown_follows_the_running_pnl(app):
+    close_position(1, datetime(2024, 5, 1), 'long', 100, 120, fees=0.0)
+    close_position(1, datetime(2024, 5, 1), 'long', 100, 95, fees=0.0)
+    close_position(1, datetime(2024, 5, 2), 'long', 100, 90, fees=0.0)
+
+    first, second = stats_rows(1)
+    assert first['peak_pnl'] == 20
+    assert first['max_drawdown'] == 5
+    assert second['total_pnl'] == 5
+    assert second['max_drawdown'] == 15
+    assert [first, second] == rebuilt_rows(1)
+
+
+def test_close_before_the_latest_day_rebuilds(app):
+    close_position(1, datetime(2024, 5, 1), 'long', 100, 110)
+    close_position(1, datetime(2024, 5, 3), 'long', 100, 90)
+    close_position(1, datetime(2024, 5, 2), 'short', 100, 95)
+
+    incremental = stats_rows(1)
+    assert [row['day'].day for row in incremental] == [1, 2, 3]
+    # The day after the late close carries its trade in the running values
+    assert incremental[-1]['total_trades'] == 3
+    assert incremental == rebuilt_rows(1)
+
+
+def test_bots_are_counted_separately(app):
+    close_position(1, datetime(2024, 5, 1), 'long', 100, 110)
+    close_position(2, datetime(2024, 5, 1), 'long', 100, 90)
+    close_position(1, datetime(2024, 5, 2), 'long', 100, 105)
+
+    assert [row['total_trades'] for row in stats_rows(1)] == [1, 2]
+    assert [row['total_trades'] for row in stats_rows(2)] == [1]
+    assert stats_rows(2) == rebuilt_rows(2)
@@ -0,0 +1,41 @@
+from classes.bot_snapshot import AccountSnapshot, ExchangeSnapshot
+from classes.client_pool import ExchangeClientPool
+from classes.fill_tracker import fill_trackers
+from classes.rate_limiter import rate_limits
+from classes.simulated_exchange import SimulatedExchange
+
+
+def make_account(account_id, api_key=None, options=None):
+    return AccountSnapshot(id=account_id, name=f'account-{account_id}', exchange_id=1,
+                           api_key=api_key or f'key-{account_id}', api_secret='secret', password=None,
+                           options=options or {}, user_id=1, testnet=False,
+                           exchangemodels=ExchangeSnapshot(id=1, name='Simulated Exchange', short=SimulatedExchange.id))
+
+
+def test_options_change_rebuilds_the_handle():
+    pool = ExchangeClientPool()
+    client = pool.get(make_account(1))
+    assert pool.get(make_account(1)) is client
+    assert pool.get(make_account(1, options={'latency': 0.1})) is not client
+
+
+def test_eviction_releases_the_account_state():
+    pool = ExchangeClientPool(max_size=1)
+    first = pool.get(make_account(1))
+    fill_trackers.get(first)
+    first.rate_limiter()
+
+    pool.get(make_account(2))
+    assert list(pool.clients) == [2]
+    assert 1 not in fill_trackers.trackers
+    assert (first.exchange_name, first.api_key) not in rate_limits.schedulers
+
+
+def test_shared_api_key_keeps_its_scheduler():
+    pool = ExchangeClientPool()
+    first = pool.get(make_account(1, api_key='shared'))
+    pool.get(make_account(2, api_key='shared'))
+    first.rate_limiter()
+
+    pool.invalidate(1)
+    assert (first.exchange_name, 'shared') in rate_limits.schedulers
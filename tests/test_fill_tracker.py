@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from classes.fill_tracker import FillTracker, OrderNotFilledError, PendingOrder, check_order_filled, \
+    is_order_filled
+
+
+def make_tracker(client, fill_timeout=None):
+    return FillTracker(None, client, min_interval=0.01, max_interval=0.05, fill_timeout=fill_timeout)
+
+
+def add_pending(tracker, order, timeout=None):
+    # Added without track() so poll() is driven by the test and not by the tracker thread
+    pending = PendingOrder(order, timeout=timeout)
+    tracker.pending[pending.id] = pending
+    return pending
+
+
+def test_poll_completes_filled_orders_and_keeps_open_ones(sim_client):
+    exchange = sim_client.exchange_instance
+    tracker = make_tracker(sim_client)
+    resting = add_pending(tracker, exchange.create_order('BTC/USDT:USDT', 'limit', 'buy', 0.01, 29000))
+    filling = add_pending(tracker, exchange.create_order('ETH/USDT:USDT', 'limit', 'buy', 0.1, 1900))
+
+    assert tracker.poll() is False
+    assert set(tracker.pending) == {resting.id, filling.id}
+
+    exchange.set_price('ETH/USDT:USDT', 1850)
+    assert tracker.poll() is True
+    assert set(tracker.pending) == {resting.id}
+    order = filling.future.result(1)
+    assert order['status'] == 'closed'
+    assert is_order_filled(order)
+    assert sim_client.invalidations == 1
+
+
+def test_poll_only_fetches_orders_that_left_the_book(sim_client):
+    exchange = sim_client.exchange_instance
+    tracker = make_tracker(sim_client)
+    add_pending(tracker, exchange.create_order('BTC/USDT:USDT', 'limit', 'buy', 0.01, 29000))
+    add_pending(tracker, exchange.create_order('ETH/USDT:USDT', 'limit', 'buy', 0.1, 1900))
+
+    tracker.poll()
+    endpoints = [endpoint for endpoint, _ in sim_client.calls]
+    assert 'fetch_order' not in endpoints
+    # The simulated exchange lists open orders without a symbol, one request covers both
+    assert endpoints.count('fetch_open_orders') == 1
+
+
+def test_poll_asks_per_symbol_when_the_exchange_requires_it(sim_client):
+    exchange = sim_client.exchange_instance
+    exchange.options = {'warnOnFetchOpenOrdersWithoutSymbol': True}
+    tracker = make_tracker(sim_client)
+    add_pending(tracker, exchange.create_order('BTC/USDT:USDT', 'limit', 'buy', 0.01, 29000))
+    add_pending(tracker, exchange.create_order('ETH/USDT:USDT', 'limit', 'buy', 0.1, 1900))
+
+    tracker.poll()
+    assert sorted(args for endpoint, args in sim_client.calls if endpoint == 'fetch_open_orders') == \
+        [('BTC/USDT:USDT',), ('ETH/USDT:USDT',)]
+
+
+def test_poll_cancels_orders_past_their_deadline(sim_client):
+    exchange = sim_client.exchange_instance
+    tracker = make_tracker(sim_client, fill_timeout=0.01)
+    pending = add_pending(tracker, exchange.create_order('BTC/USDT:USDT', 'limit', 'buy', 0.01, 29000), timeout=0.01)
+    time.sleep(0.02)
+
+    assert tracker.poll() is True
+    order = pending.future.result(1)
+    assert order['status'] == 'canceled'
+    assert not is_order_filled(order)
+    with pytest.raises(OrderNotFilledError):
+        check_order_filled(order)
+
+
+def test_track_resolves_through_the_tracker_thread(sim_client):
+    exchange = sim_client.exchange_instance
+    tracker = make_tracker(sim_client)
+    future = tracker.track(exchange.create_order('ETH/USDT:USDT', 'limit', 'sell', 0.1, 2100))
+    exchange.set_price('ETH/USDT:USDT', 2200)
+    assert future.result(5)['status'] == 'closed'
+
+
+def test_fill_callback_gets_the_trace_but_its_own_app_context(sim_client):
+    from flask import Flask, g
+    from classes.metrics import current_trace, metrics
+
+    exchange = sim_client.exchange_instance
+    app = Flask(__name__)
+    tracker = FillTracker(app, sim_client, min_interval=0.01, max_interval=0.05)
+    trace = metrics.start_trace('signal-1')
+    seen = {}
+
+    def on_fill(order):
+        seen['trace'] = current_trace.get()
+        seen['caller_g'] = g.get('caller')
+
+    with app.app_context(), metrics.traced(trace):
+        g.caller = True
+        future = tracker.track(exchange.create_order('ETH/USDT:USDT', 'limit', 'buy', 0.1, 1900), on_fill)
+    exchange.set_price('ETH/USDT:USDT', 1850)
+    future.result(5)
+
+    assert seen == {'trace': trace, 'caller_g': None}
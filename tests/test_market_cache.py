@@ -0,0 +1,63 @@
+import threading
+import time
+
+from classes.market_cache import MarketCache
+
+KEY = ('sim', False)
+
+
+def age(cache, seconds):
+    markets, loaded_at = cache.entries[KEY]
+    cache.entries[KEY] = (markets, loaded_at - seconds)
+
+
+def test_markets_are_loaded_once_within_the_ttl():
+    cache = MarketCache(ttl=60, max_age=600)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {'BTC/USDT': len(calls)}
+
+    assert cache.get(KEY, loader) == {'BTC/USDT': 1}
+    assert cache.get(KEY, loader) == {'BTC/USDT': 1}
+    assert cache.get(('sim', True), loader) == {'BTC/USDT': 2}
+    assert len(calls) == 2
+
+
+def test_stale_markets_are_served_while_refreshing():
+    cache = MarketCache(ttl=60, max_age=600)
+    cache.get(KEY, lambda: 'old')
+    age(cache, 120)
+    refreshed = threading.Event()
+
+    def loader():
+        refreshed.set()
+        return 'new'
+
+    assert cache.get(KEY, loader) == 'old'
+    assert refreshed.wait(5)
+    deadline = time.time() + 5
+    while cache.entries[KEY][0] != 'new' and time.time() < deadline:
+        time.sleep(0.01)
+    assert cache.get(KEY, loader) == 'new'
+
+
+def test_markets_past_the_max_age_are_reloaded_synchronously():
+    cache = MarketCache(ttl=60, max_age=600)
+    cache.get(KEY, lambda: 'old')
+    age(cache, 1200)
+    assert cache.get(KEY, lambda: 'new') == 'new'
+
+
+def test_load_started_before_an_invalidation_is_not_cached():
+    cache = MarketCache(ttl=60, max_age=600)
+
+    def loader():
+        # An account edit invalidates the exchange while its markets are downloading
+        cache.invalidate(KEY)
+        return 'stale'
+
+    assert cache.get(KEY, loader) == 'stale'
+    assert KEY not in cache.entries
+    assert cache.get(KEY, lambda: 'fresh') == 'fresh'
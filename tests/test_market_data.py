@@ -0,0 +1,75 @@
+import threading
+import time
+
+import classes.market_data as market_data_module
+from classes.market_data import FakeTickerFeed, MarketData, PriceStore
+
+KEY = ('sim', False)
+
+
+def make_market_data(**settings):
+    market_data = MarketData()
+    market_data.streaming = False
+    for name, value in settings.items():
+        setattr(market_data, name, value)
+    return market_data
+
+
+def test_rest_ticker_is_served_from_the_store_until_it_is_stale():
+    market_data = make_market_data(max_age=0.05)
+    market_data.update(KEY, 'BTC/USDT:USDT', {'last': 30000.0})
+    assert isinstance(market_data.get_feed(KEY), FakeTickerFeed)
+    assert market_data.get_ticker(KEY, 'BTC/USDT:USDT')['last'] == 30000.0
+    time.sleep(0.06)
+    assert market_data.get_ticker(KEY, 'BTC/USDT:USDT') is None
+
+
+def test_pushed_ticks_replace_the_last_price():
+    market_data = make_market_data()
+    feed = market_data.get_feed(KEY)
+    feed.push('ETH/USDT:USDT', 2000.0)
+    feed.push('ETH/USDT:USDT', 2010.0, bid=2009.5, ask=2010.5)
+    ticker = market_data.get_ticker(KEY, 'ETH/USDT:USDT')
+    assert (ticker['last'], ticker['bid'], ticker['ask']) == (2010.0, 2009.5, 2010.5)
+
+
+def test_subscriptions_are_bounded_by_count():
+    feed = FakeTickerFeed(PriceStore(), KEY, idle_timeout=60, max_symbols=2)
+    assert feed.subscribe('BTC/USDT:USDT')
+    assert feed.subscribe('ETH/USDT:USDT')
+    assert not feed.subscribe('BTC/USDT:USDT')
+    feed.subscribe('SOL/USDT:USDT')
+    # ETH was read least recently, BTC was subscribed again after it
+    assert set(feed.symbols) == {'BTC/USDT:USDT', 'SOL/USDT:USDT'}
+
+
+def test_unread_subscriptions_expire():
+    market_data = make_market_data(idle_timeout=0.05)
+    market_data.update(KEY, 'BTC/USDT:USDT', {'last': 30000.0})
+    market_data.update(KEY, 'ETH/USDT:USDT', {'last': 2000.0})
+    time.sleep(0.06)
+    market_data.get_ticker(KEY, 'BTC/USDT:USDT')
+    assert market_data.get_feed(KEY).expire() == ['ETH/USDT:USDT']
+    assert set(market_data.get_feed(KEY).symbols) == {'BTC/USDT:USDT'}
+
+
+class BrokenCcxtPro(object):
+    """Stands in for ccxt.pro with an exchange whose client cannot be built."""
+
+    @staticmethod
+    def binance(options):
+        raise RuntimeError('no websocket support')
+
+
+def test_failing_stream_falls_back_to_the_fake_feed(monkeypatch):
+    monkeypatch.setattr(market_data_module, 'ccxtpro', BrokenCcxtPro)
+    market_data = make_market_data(streaming=True)
+    feeds = []
+    reader = threading.Thread(target=lambda: feeds.append(market_data.get_feed(('binance', False), {})))
+    reader.start()
+    reader.join(5)
+
+    # The constructor used to wait forever for the failed stream while holding the lock
+    assert not reader.is_alive()
+    assert isinstance(feeds[0], FakeTickerFeed)
+    assert market_data.get_feed(('binance', False), {}) is feeds[0]
@@ -0,0 +1,66 @@
+import pytest
+
+from classes.market_index import MarketIndex
+from classes.simulated_exchange import SimulatedExchange
+
+
+def build_markets(*symbols):
+    exchange = SimulatedExchange({'apiKey': 'market-index'})
+    return {symbol: exchange.build_market(symbol) for symbol in symbols}
+
+
+@pytest.fixture
+def index():
+    markets = build_markets('BTC/USDT:USDT', 'BTC/USDT', 'ETH/USDT')
+    markets['ETH/USDT']['limits']['leverage'] = {'min': None, 'max': None}
+    tiers = {'BTC/USDT:USDT': [{'maxLeverage': 50}, {'maxLeverage': 20}]}
+    return MarketIndex(markets, tiers)
+
+
+@pytest.mark.parametrize('alias', ['BTC/USDT:USDT', 'btc/usdt:usdt', 'BTC-USDT:USDT', 'BTC-USDT', 'BTCUSDT'])
+def test_aliases_prefer_the_swap_market(index, alias):
+    assert index.resolve(alias)['symbol'] == 'BTC/USDT:USDT'
+
+
+def test_inverted_aliases_resolve_to_the_same_market(index):
+    record = index.resolve('USDT/BTC')
+    assert record['symbol'] == 'BTC/USDT:USDT'
+    assert (record['base'], record['quote']) == ('BTC', 'USDT')
+    assert index.resolve('ETHUSDT')['symbol'] == 'ETH/USDT'
+    assert index.resolve('USDT-ETH')['symbol'] == 'ETH/USDT'
+
+
+def test_unknown_symbols(index):
+    assert index.resolve('DOGE/USDT') is None
+    assert index.resolve('') is None
+    assert index.leverage_options('DOGE/USDT') is None
+
+
+def test_leverage_comes_from_the_tiers_then_the_market_limits(index):
+    assert index.resolve('BTCUSDT')['max_leverage'] == 50
+    assert index.leverage_options('BTCUSDT')[-1] == '50x'
+    # The spot market has no tiers, its limits allow 125x
+    assert index.records['BTC/USDT']['max_leverage'] == 125
+    assert index.leverage_options('ETH/USDT') is None
+
+
+@pytest.fixture
+def conversion_index():
+    markets = build_markets('BTC/USDT', 'BTC/USDT:USDT', 'ETH/BTC', 'SOL/USDT:USDT', 'BTC/USD:BTC')
+    markets['BTC/USD:BTC']['inverse'] = True
+    return MarketIndex(markets)
+
+
+def test_conversion_paths_prefer_spot_and_take_the_fewest_hops(conversion_index):
+    assert conversion_index.conversion_path('USDT', 'USDT') == []
+    assert conversion_index.conversion_path('BTC', 'USDT') == [('BTC/USDT', False)]
+    assert conversion_index.conversion_path('USDT', 'BTC') == [('BTC/USDT', True)]
+    assert conversion_index.conversion_path('ETH', 'USDT') == [('ETH/BTC', False), ('BTC/USDT', False)]
+    # Without a spot market the linear swap prices the currency
+    assert conversion_index.conversion_path('SOL', 'USDT') == [('SOL/USDT:USDT', False)]
+
+
+def test_inverse_contracts_are_not_conversion_paths(conversion_index):
+    assert conversion_index.conversion_path('USD', 'USDT') is None
+    assert conversion_index.conversion_path('DOGE', 'USDT') is None
+    assert ('USD', 'USDT') in conversion_index.paths
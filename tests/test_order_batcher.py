@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from classes.order_batcher import OrderBatcher
+
+
+@pytest.fixture
+def pool():
+    pool = ThreadPoolExecutor(max_workers=4)
+    yield pool
+    pool.shutdown()
+
+
+def endpoints(client):
+    return [endpoint for endpoint, _ in client.calls]
+
+
+def test_full_batch_is_one_create_orders_call(sim_client, pool):
+    batcher = OrderBatcher(sim_client, pool, window=10, max_size=2)
+    btc = batcher.submit('BTC/USDT:USDT', 'market', 'buy', 0.01)
+    eth = batcher.submit('ETH/USDT:USDT', 'market', 'sell', 0.1)
+
+    assert btc.result(1)['symbol'] == 'BTC/USDT:USDT'
+    assert eth.result(1)['side'] == 'sell'
+    assert endpoints(sim_client) == ['create_orders']
+    assert batcher.timer is None
+
+
+def test_window_flushes_a_partial_batch(sim_client, pool):
+    batcher = OrderBatcher(sim_client, pool, window=0.01, max_size=5)
+    futures = [batcher.submit('ETH/USDT:USDT', 'market', 'buy', 0.1) for _ in range(2)]
+
+    assert all(future.result(5)['status'] == 'closed' for future in futures)
+    assert endpoints(sim_client) == ['create_orders']
+    assert len(sim_client.calls[0][1][0]) == 2
+
+
+def test_rejected_orders_fail_only_their_own_future(sim_client, pool):
+    batcher = OrderBatcher(sim_client, pool, window=10, max_size=2)
+    accepted = batcher.submit('ETH/USDT:USDT', 'market', 'buy', 0.1)
+    # Far more than the simulated account's balance
+    rejected = batcher.submit('BTC/USDT:USDT', 'market', 'buy', 100)
+
+    assert accepted.result(1)['status'] == 'closed'
+    with pytest.raises(ValueError, match='rejected'):
+        rejected.result(1)
+
+
+def test_exchanges_without_batch_orders_get_single_orders(sim_client, pool):
+    exchange = sim_client.exchange_instance
+    exchange.has = dict(exchange.has, createOrders=False)
+    batcher = OrderBatcher(sim_client, pool, window=10, max_size=3)
+    futures = [batcher.submit(symbol, 'market', 'buy', 0.01)
+               for symbol in ('BTC/USDT:USDT', 'ETH/USDT:USDT', 'SOL/USDT:USDT')]
+
+    assert sorted(future.result(5)['symbol'] for future in futures) == \
+        ['BTC/USDT:USDT', 'ETH/USDT:USDT', 'SOL/USDT:USDT']
+    assert endpoints(sim_client) == ['create_order'] * 3
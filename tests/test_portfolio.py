@@ -0,0 +1,71 @@
+import math
+
+import pytest
+
+from classes import portfolio
+from classes.market_index import MarketIndex
+from classes.portfolio import get_rates, path_rate, ticker_price, value_matrix
+from classes.simulated_exchange import SimulatedExchange
+
+NAN = float('nan')
+
+
+class PricedClient(object):
+    """The parts of the Exchange handle get_rates() uses, with fixed last prices."""
+
+    def __init__(self, prices):
+        exchange = SimulatedExchange({'apiKey': 'portfolio'})
+        self.index = MarketIndex({symbol: exchange.build_market(symbol) for symbol in prices})
+        self.prices = prices
+        self.requests = []
+
+    def market_index(self):
+        return self.index
+
+    def get_tickers(self, symbols):
+        self.requests.append(symbols)
+        return {symbol: {'last': self.prices[symbol]} for symbol in symbols}
+
+
+def test_ticker_price_falls_back_to_the_mid_then_the_close():
+    assert ticker_price({'last': 10, 'bid': 1, 'ask': 2}) == 10
+    assert ticker_price({'last': None, 'bid': 9, 'ask': 11, 'close': 5}) == 10
+    assert ticker_price({'close': 5}) == 5
+    assert ticker_price({}) is None
+
+
+def test_path_rate_multiplies_and_divides_along_the_path():
+    prices = {'ETH/BTC': 0.05, 'BTC/USDT': 40000}
+    assert path_rate([], prices) == 1.0
+    assert path_rate([('ETH/BTC', False), ('BTC/USDT', False)], prices) == pytest.approx(2000)
+    assert path_rate([('BTC/USDT', True)], prices) == pytest.approx(1 / 40000)
+    assert path_rate([('SOL/USDT', False)], prices) is None
+
+
+def test_rates_of_every_currency_come_from_one_ticker_request():
+    client = PricedClient({'BTC/USDT': 40000, 'ETH/BTC': 0.05})
+    rates = get_rates(client, ['BTC', 'ETH', 'USDT', 'DOGE'])
+
+    assert rates['BTC'] == 40000
+    assert rates['ETH'] == pytest.approx(2000)
+    assert rates['USDT'] == 1.0
+    assert rates['DOGE'] is None
+    assert client.requests == [['BTC/USDT', 'ETH/BTC']]
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def matrix_backend(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(portfolio, 'np', None)
+    return request.param
+
+
+def test_value_matrix_leaves_unpriced_currencies_out_of_the_totals(matrix_backend):
+    values, account_totals, asset_totals = value_matrix([[1.0, 2.0, 3.0], [0.0, 4.0, 1.0]], [100.0, 1.0, NAN])
+
+    assert values[0][:2] == [100.0, 2.0]
+    assert math.isnan(values[0][2]) and math.isnan(values[1][2])
+    assert account_totals == [102.0, 4.0]
+    assert asset_totals == [100.0, 6.0, 0.0]
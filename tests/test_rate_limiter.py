@@ -0,0 +1,59 @@
+import threading
+import time
+
+from classes.rate_limiter import RateLimitRegistry, RateLimitScheduler
+
+
+def wait_for_waiters(scheduler, count):
+    deadline = time.monotonic() + 5
+    while len(scheduler.waiters) < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert len(scheduler.waiters) == count
+
+
+def test_burst_is_served_then_throttled():
+    scheduler = RateLimitScheduler('sim:1', rate=20, capacity=2)
+    assert scheduler.acquire('create_order') < 0.01
+    assert scheduler.acquire('create_order') < 0.01
+    # The bucket is empty, the next token takes 1 / rate seconds
+    assert scheduler.acquire('create_order') >= 0.04
+    assert scheduler.metrics()['requests'] == {'create_order': 3}
+
+
+def test_heavy_requests_take_at_most_the_whole_bucket():
+    scheduler = RateLimitScheduler('sim:1', rate=100, capacity=2)
+    assert scheduler.acquire('fetch_tickers') < 0.01
+    assert scheduler.tokens < 1
+
+
+def test_orders_go_ahead_of_queued_balance_refreshes():
+    scheduler = RateLimitScheduler('sim:1', rate=5, capacity=1)
+    scheduler.acquire('create_order')
+    served = []
+
+    def call(endpoint):
+        scheduler.acquire(endpoint)
+        served.append(endpoint)
+
+    balance = threading.Thread(target=call, args=('fetch_balance',))
+    balance.start()
+    wait_for_waiters(scheduler, 1)
+    order = threading.Thread(target=call, args=('create_order',))
+    order.start()
+    wait_for_waiters(scheduler, 2)
+    balance.join(5)
+    order.join(5)
+
+    assert served == ['create_order', 'fetch_balance']
+
+
+def test_registry_shares_one_scheduler_per_api_key():
+    registry = RateLimitRegistry()
+    scheduler = registry.get('sim', 'secret-key', 50)
+    assert registry.get('sim', 'secret-key', 50) is scheduler
+    assert registry.get('sim', 'other-key', 50) is not scheduler
+    assert scheduler.rate == 20
+    assert 'secret-key' not in scheduler.name
+
+    registry.release('sim', 'secret-key')
+    assert registry.get('sim', 'secret-key', 50) is not scheduler
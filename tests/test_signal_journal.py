@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from flask import Flask
+
+from classes.models import Signals
+from classes.signal_journal import MAX_PAYLOAD_LENGTH, SignalJournal
+
+
+def make_bot(bot_id):
+    return SimpleNamespace(id=bot_id, exchange_id=1, symbol='BTC/USDT:USDT', user_id=1)
+
+
+@pytest.fixture
+def journal(app):
+    journal = SignalJournal(max_buffer=5, batch_size=2)
+    journal.app = app
+    # No writer thread, the tests flush themselves
+    journal.stopped.set()
+    return journal
+
+
+def record(journal, bot_id, signal='ENTER-LONG_sim_BTC/USDT:USDT_bot_1h', outcome='queued', **kwargs):
+    journal.record(journal.entry(make_bot(bot_id), signal, b'{"signal": 1}', **kwargs), outcome)
+
+
+def test_flush_writes_the_buffer_in_batches(journal):
+    for bot_id in (1, 1, 2):
+        record(journal, bot_id)
+    assert Signals.query.count() == 0
+
+    assert journal.flush() == 3
+    assert journal.metrics() == {'buffered': 0, 'written': 3, 'dropped': 0}
+    row = Signals.query.filter_by(bot_id=2).one()
+    assert (row.signal_type, row.payload, row.outcome) == ('ENTER-LONG', '{"signal": 1}', 'queued')
+    assert row.latency >= 0
+
+
+def test_full_buffer_drops_the_oldest_rows(journal):
+    for bot_id in range(1, 8):
+        record(journal, bot_id)
+    assert journal.metrics()['dropped'] == 2
+    assert [row['bot_id'] for row in journal.buffer] == [3, 4, 5, 6, 7]
+
+
+def test_long_payloads_are_truncated(journal):
+    entry = journal.entry(make_bot(1), 'EXIT-LONG', 'x' * (MAX_PAYLOAD_LENGTH + 10))
+    assert len(entry['payload']) == MAX_PAYLOAD_LENGTH
+
+
+def test_discard_drops_only_the_bots_rows(journal):
+    for bot_id in (1, 2, 1):
+        record(journal, bot_id)
+    assert journal.discard(1) == 2
+    journal.flush()
+    assert [row.bot_id for row in Signals.query] == [2]
+
+
+def test_failed_flush_keeps_the_rows(journal, app):
+    record(journal, 1)
+    # An app without the database extension fails the insert
+    journal.app = Flask('unconfigured')
+    with pytest.raises(Exception):
+        journal.flush()
+    assert journal.metrics()['buffered'] == 1
+
+    journal.app = app
+    assert journal.flush() == 1
+
+
+def test_sweep_deletes_rows_past_the_retention(journal):
+    record(journal, 1, received_at=datetime.now() - timedelta(days=40))
+    record(journal, 2)
+    journal.flush()
+
+    assert journal.sweep() == 1
+    assert [row.bot_id for row in Signals.query] == [2]
@@ -0,0 +1,66 @@
+import pytest
+
+from classes.simulated_exchange import SimulatedExchange
+
+
+@pytest.fixture
+def exchange():
+    SimulatedExchange.accounts.clear()
+    return SimulatedExchange({'apiKey': 'sim-test', 'options': {'sim': {'spread': 0.001}}})
+
+
+def test_market_buy_fills_at_the_ask_with_the_taker_fee(exchange):
+    order = exchange.create_order('ETH/USDT:USDT', 'market', 'buy', 1)
+
+    assert order['status'] == 'closed'
+    assert order['average'] == pytest.approx(2002)
+    assert order['fee']['cost'] == pytest.approx(2002 * 0.0004)
+    balance = exchange.fetch_balance()
+    assert balance['total']['ETH'] == 1
+    assert balance['free']['USDT'] == pytest.approx(10000 - 2002 * 1.0004)
+
+
+def test_limit_buy_rests_until_the_price_crosses_it(exchange):
+    order = exchange.create_order('ETH/USDT:USDT', 'limit', 'buy', 1, 1900)
+    assert order['status'] == 'open'
+    assert exchange.fetch_balance()['used']['USDT'] == pytest.approx(1900)
+
+    exchange.set_price('ETH/USDT:USDT', 1850)
+    filled = exchange.fetch_order(order['id'])
+    assert filled['status'] == 'closed'
+    assert filled['average'] == 1900
+    balance = exchange.fetch_balance()
+    assert balance['used']['USDT'] == pytest.approx(0)
+    assert balance['free']['USDT'] == pytest.approx(10000 - 1900 * 1.0002)
+
+
+def test_partial_fills_take_several_matching_steps():
+    SimulatedExchange.accounts.clear()
+    exchange = SimulatedExchange({'apiKey': 'sim-partial', 'options': {'sim': {'partial_fill': 0.5}}})
+    order = exchange.create_order('BTC/USDT:USDT', 'market', 'sell', 0.1)
+    assert (order['status'], order['filled']) == ('open', 0.05)
+
+    assert exchange.fetch_order(order['id'])['filled'] == 0.075
+    assert exchange.fetch_open_orders() != []
+
+
+def test_cancel_releases_the_reserved_balance(exchange):
+    order = exchange.create_order('BTC/USDT:USDT', 'limit', 'buy', 0.1, 29000)
+    assert exchange.cancel_order(order['id'])['status'] == 'canceled'
+    balance = exchange.fetch_balance()
+    assert (balance['free']['USDT'], balance['used']['USDT']) == (10000, 0)
+    assert exchange.fetch_open_orders() == []
+
+
+def test_orders_beyond_the_balance_are_rejected(exchange):
+    with pytest.raises(ValueError, match='Insufficient USDT'):
+        exchange.create_order('BTC/USDT:USDT', 'market', 'buy', 1)
+    results = exchange.create_orders([{'symbol': 'BTC/USDT:USDT', 'type': 'market', 'side': 'buy', 'amount': 1}])
+    assert results[0]['status'] == 'rejected'
+
+
+def test_clients_of_one_api_key_share_the_account(exchange):
+    order = exchange.create_order('ETH/USDT:USDT', 'limit', 'buy', 1, 1900)
+    other = SimulatedExchange({'apiKey': 'sim-test'})
+    assert other.fetch_open_orders()[0]['id'] == order['id']
+    assert SimulatedExchange({'apiKey': 'sim-other'}).fetch_open_orders() == []
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import db
+from classes.models import Bots, ExchangeModels, Positions
+from classes.trade_history import TradeHistoryError, decode_cursor, encode_cursor, get_positions_page, \
+    parse_datetime
+
+
+def test_cursor_round_trip():
+    entry_time = datetime(2024, 5, 1, 10, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(entry_time, 42)) == (entry_time, 42)
+
+
+@pytest.mark.parametrize('cursor', ['', 'not-a-cursor', encode_cursor(datetime(2024, 5, 1), 1)[:-3]])
+def test_invalid_cursor(cursor):
+    with pytest.raises(TradeHistoryError):
+        decode_cursor(cursor)
+
+
+def test_parse_datetime_converts_offsets_to_utc():
+    assert parse_datetime('2024-05-01T10:00:00+02:00', 'from') == datetime(2024, 5, 1, 8)
+    assert parse_datetime('2024-05-01T10:00:00Z', 'from') == datetime(2024, 5, 1, 10)
+    assert parse_datetime('2024-05-01', 'from') == datetime(2024, 5, 1)
+    with pytest.raises(TradeHistoryError):
+        parse_datetime('yesterday', 'from')
+
+
+def test_pages_cover_every_position_once(app):
+    db.session.add(ExchangeModels(id=1, name='Simulated Exchange', short='sim'))
+    db.session.add(Bots(id=1, name='bot', enabled=True, order_type='market', base_order_size=10, exchange='sim',
+                        symbol='BTC/USDT:USDT', time_interval='1h', exchange_id=1, account_id=1, user_id=1))
+    start = datetime(2024, 5, 1)
+    for i in range(7):
+        # Pairs of positions share an entry time, the id breaks the tie
+        db.session.add(Positions(bot_id=1, user_id=1, exchange_id=1, symbol='BTC/USDT:USDT', order_id=str(i),
+                                 order_quantity=1, order_type='market', position_type='long', entry_price=100,
+                                 entry_time=start + timedelta(hours=i // 2), status='open'))
+    db.session.commit()
+
+    seen = []
+    cursor = None
+    while True:
+        positions, cursor = get_positions_page(1, {}, limit=3, cursor=cursor)
+        seen.extend(position['id'] for position in positions)
+        if cursor is None:
+            break
+
+    expected = [position.id for position in
+                Positions.query.order_by(Positions.entry_time.desc(), Positions.id.desc())]
+    assert seen == expected
+    assert len(seen) == 7